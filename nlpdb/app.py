@@ -1,26 +1,62 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
-import requests
 import mysql.connector
 from dotenv import load_dotenv
 import os
 import json
+import math
 import time
 from datetime import datetime
 import atexit
 import signal
+import threading
+import contextvars
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+from db_pool import get_pool, drop_pool, close_all_pools, pool_stats
+from schema_introspection import (introspect_schema, fetch_tables, fetch_keys, fetch_fingerprints,
+                                  schema_fingerprint, changed_tables)
+from schema_cache import SchemaCache, ddl_targets
+from schema_store import SchemaStore
+from prompts import build_prompt, prompt_stats
+from translation_cache import TranslationCache
+from llm_client import LLMClient, LLMBusyError, LLM_MAX_CONCURRENCY
+from sql_utils import StatementEndDetector, clean_sql, split_statements, statement_keyword
+from query_guard import check_statements, QUERY_MAX_EXECUTION_MS
+from wire_format import requested_format, format_from, is_columnar, rows_payload, make_response, compress_response
+from result_cache import ResultCache, is_cacheable
+from result_pages import ResultCursor, CachedResult, ResultCursorStore, page_size_from, RESULT_PAGE_SIZE
+from session_context import SessionStore, SESSION_HEADER
+from table_stats import TableStats, quote_identifier
+from jobs import JobManager, JOB_MAX_ITEMS
+from schema_graph import get_schema_graph, get_graph_stats, GRAPH_MAX_DEPTH, GRAPH_PAGE_SIZE, GRAPH_MAX_PAGE_SIZE
+from metrics import REGISTRY, span, start_trace, current_trace, observe_request
 
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app)  
 
-db_context = {
-    "current_database": None,
-    "tables": {},
-    "last_query": None,
-    "last_result": None
-}
+@app.after_request
+def compress(response):
+    """gzip/brotli for large responses, as accepted by the client"""
+    return compress_response(request.headers.get('Accept-Encoding'), response)
+
+@app.before_request
+def begin_trace():
+    start_trace()
+
+@app.after_request
+def record_request(response):
+    """Request latency by route, plus the stage timings as a Server-Timing header"""
+    trace = current_trace()
+    if trace is not None:
+        # Streamed responses are measured up to their first byte
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        observe_request(route, request.method, response.status_code, trace.to_dict()["total_seconds"])
+        if trace.stages:
+            response.headers['Server-Timing'] = trace.server_timing()
+    return response
 
 DB_CONFIG = {
     "host": "localhost",
@@ -28,39 +64,37 @@ DB_CONFIG = {
     "password": "rambok"
 }
 
-# Add these at the top with other imports
+# Written by earlier versions, moved into SCHEMA_STORE at startup
 DB_CACHE_FILE = 'database_cache.json'
-DB_CACHE = {}
+SCHEMA_WARMUP = os.getenv("SCHEMA_WARMUP", "0").lower() in ('1', 'true', 'yes')
+DB_CACHE = SchemaCache()
+# Introspected schemas survive restarts and are shared by worker processes
+SCHEMA_STORE = SchemaStore()
+TRANSLATION_CACHE = TranslationCache()
+LLM_CLIENT = LLMClient()
+# The paged statement carries MAX_EXECUTION_TIME, close its cursor before the server kills it
+RESULT_CURSORS = ResultCursorStore(max_age=QUERY_MAX_EXECUTION_MS / 1000)
+RESULT_CACHE = ResultCache()
+SESSIONS = SessionStore()
+# Background exact counts check out their own connections
+TABLE_STATS = TableStats(lambda database: get_db_connection(database))
+JOBS = JobManager()
 
-def clear_db_cache():
-    """Clear the database cache file"""
-    try:
-        if os.path.exists(DB_CACHE_FILE):
-            os.remove(DB_CACHE_FILE)
-        global DB_CACHE
-        DB_CACHE = {}
-    except Exception as e:
-        print(f"Error clearing database cache: {e}")
-
-def load_db_cache():
-    """Load database cache from file"""
-    global DB_CACHE
-    if os.path.exists(DB_CACHE_FILE):
-        try:
-            with open(DB_CACHE_FILE, 'r') as f:
-                DB_CACHE = json.load(f)
-        except json.JSONDecodeError:
-            DB_CACHE = {}
-    return DB_CACHE
-
-def save_db_cache():
-    """Save database cache to file"""
-    with open(DB_CACHE_FILE, 'w') as f:
-        json.dump(DB_CACHE, f, indent=2)
+def persist_stale_tables(database, tables):
+    """Record tables marked for re-reading in the stored schema of a database"""
+    # The memory entry may have been evicted, the stored one still needs the marks
+    entry = DB_CACHE.peek(database) or SCHEMA_STORE.get(database)
+    if entry is not None:
+        SCHEMA_STORE.put(database, {**entry, 'stale_tables': sorted(set(entry['stale_tables']) | set(tables))})
 
 def cleanup():
     """Cleanup function to be called when the application exits"""
-    clear_db_cache()
+    RESULT_CURSORS.close_all()
+    TABLE_STATS.shutdown()
+    JOBS.shutdown()
+    close_all_pools()
+    LLM_CLIENT.close()
+    SCHEMA_STORE.close()
 
 # Register cleanup function
 atexit.register(cleanup)
@@ -73,129 +107,132 @@ def signal_handler(signum, frame):
 signal.signal(signal.SIGTERM, signal_handler)
 signal.signal(signal.SIGINT, signal_handler)
 
-# Clear cache on startup
-clear_db_cache()
+SCHEMA_STORE.import_json(DB_CACHE_FILE)
 
-def update_database_info(database):
-    """Update database information in cache"""
+def update_database_info(database, previous=None):
+    """Update database information in cache, re-reading only tables whose fingerprint changed"""
     try:
         connection = get_db_connection(database)
         if not connection:
             return None
 
+        # One lightweight query tells which tables changed since the cached version
         cursor = connection.cursor()
-        
-        # Get all tables
-        cursor.execute("SHOW TABLES")
-        tables = [row[0] for row in cursor.fetchall()]
-        
-        # Clear the entire cache and create new entry
-        global DB_CACHE
-        DB_CACHE = {
-            database: {
-                'last_updated': datetime.now().isoformat(),
-                'tables': {}
-            }
+        try:
+            fingerprints, update_times = fetch_fingerprints(cursor, database)
+        finally:
+            cursor.close()
+        extra = {
+            'fingerprints': fingerprints,
+            'fingerprint': schema_fingerprint(fingerprints),
+            'update_times': update_times
         }
         
-        # Get table information
-        for table in tables:
-            # Get table structure
-            cursor.execute(f"DESCRIBE {table}")
-            columns = cursor.fetchall()
-            
-            # Get primary keys
-            cursor.execute(f"""
-                SELECT COLUMN_NAME
-                FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE
-                WHERE TABLE_SCHEMA = '{database}'
-                AND TABLE_NAME = '{table}'
-                AND CONSTRAINT_NAME = 'PRIMARY'
-            """)
-            primary_keys = [row[0] for row in cursor.fetchall()]
+        if previous is None or previous['fingerprint'] != extra['fingerprint']:
+            # Another worker, or an earlier run, may have read this schema already
+            stored = SCHEMA_STORE.get(database)
+            if stored is not None:
+                if (stored['fingerprint'] == extra['fingerprint'] and not stored['stale_tables']
+                        and not (previous and previous['stale_tables'])):
+                    return DB_CACHE.set(database, stored['tables'], **extra)
+                if previous is None:
+                    # Diff against the stored version so only changed tables are read
+                    DB_CACHE.load({database: stored})
+                    previous = DB_CACHE.peek(database)
+        
+        if not previous or 'fingerprints' not in previous:
+            # Read the whole schema in a constant number of queries
+            entry = DB_CACHE.set(database, introspect_schema(connection, database), **extra)
+        else:
+            changed, removed = changed_tables(previous['fingerprints'], fingerprints)
+            # Tables invalidated by DDL from /query are re-read even if their fingerprint looks the same
+            stale = previous['stale_tables']
+            changed = sorted(set(changed) | {table for table in stale if table in fingerprints})
+            removed += [table for table in stale if table not in fingerprints]
             
-            # Get foreign keys
-            cursor.execute(f"""
-                SELECT 
-                    COLUMN_NAME,
-                    REFERENCED_TABLE_NAME,
-                    REFERENCED_COLUMN_NAME
-                FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE
-                WHERE TABLE_SCHEMA = '{database}'
-                AND TABLE_NAME = '{table}'
-                AND REFERENCED_TABLE_NAME IS NOT NULL
-            """)
-            foreign_keys = cursor.fetchall()
+            if not changed and not removed:
+                return DB_CACHE.touch(database, update_times=update_times)
             
-            # Store table information
-            DB_CACHE[database]['tables'][table] = {
-                'columns': [{
-                    'name': col[0],
-                    'type': col[1],
-                    'null': col[2],
-                    'key': col[3],
-                    'default': col[4],
-                    'extra': col[5]
-                } for col in columns],
-                'primary_keys': primary_keys,
-                'foreign_keys': [{
-                    'column': fk[0],
-                    'referenced_table': fk[1],
-                    'referenced_column': fk[2]
-                } for fk in foreign_keys]
-            }
+            table_info = introspect_schema(connection, database, changed) if changed else {}
+            removed += [table for table in changed if table not in table_info]
+            entry = DB_CACHE.update_tables(database, table_info, removed=removed, **extra)
         
-        # Save cache
-        save_db_cache()
-        return DB_CACHE[database]
+        # Save this database's record
+        SCHEMA_STORE.put(database, entry)
+        return entry
         
     except mysql.connector.Error as err:
         print(f"Error updating database info: {err}")
         return None
     finally:
-        if 'cursor' in locals():
-            cursor.close()
-        if 'connection' in locals():
+        if 'connection' in locals() and connection:
             connection.close()
 
 def get_database_info(database):
     """Get database information from cache or update if needed"""
-    # Load cache if not loaded
-    if not DB_CACHE:
-        load_db_cache()
-    
-    # Check if database info exists and is recent (within last 5 minutes)
-    if database in DB_CACHE:
-        last_updated = datetime.fromisoformat(DB_CACHE[database]['last_updated'])
-        if (datetime.now() - last_updated).total_seconds() < 300:  # 5 minutes
-            return DB_CACHE[database]
+    entry = DB_CACHE.get(database)
+    if entry and not entry['stale_tables']:
+        return entry
     
-    # Update database info
-    return update_database_info(database)
-
-def update_db_context(database=None, table_info=None, query=None, result=None):
-    """Update the database context with new information"""
-    global db_context
-    if database:
-        db_context["current_database"] = database
-    if table_info:
-        db_context["tables"].update(table_info)
-    if query:
-        db_context["last_query"] = query
-    if result:
-        db_context["last_result"] = result
+    # Only one thread refreshes a database, the others wait and reuse its result
+    with DB_CACHE.loading(database):
+        entry = DB_CACHE.get(database, record=False)
+        if entry and not entry['stale_tables']:
+            return entry
+        # Past its TTL the cached entry is validated by fingerprint instead of being re-read
+        return update_database_info(database, previous=DB_CACHE.peek(database))
+
+def invalidate_schema_cache(database, statements):
+    """Invalidate cached schema information affected by executed DDL statements"""
+    stale = set()
+    dropped = set()
+    for statement in statements:
+        tables = ddl_targets(statement)
+        if tables is None:
+            continue
+        if tables:
+            DB_CACHE.invalidate(database, tables)
+            stale.update(tables)
+        else:
+            DB_CACHE.invalidate(database)
+            dropped.add(database)
+            # CREATE/DROP DATABASE may target another database than the selected one
+            words = statement.split()
+            if len(words) >= 3 and words[1].lower() in ('database', 'schema'):
+                target = words[-1].strip('`;')
+                dropped.add(target)
+                DB_CACHE.invalidate(target)
+                RESULT_CACHE.clear(target)
+                TABLE_STATS.invalidate(target)
+                if words[0].lower() == 'drop':
+                    drop_pool(target)
+                    SESSIONS.forget_database(target)
+    # Persist the stale marks too, fingerprints alone can miss some DDL
+    for target in dropped:
+        SCHEMA_STORE.delete(target)
+    if stale and database not in dropped:
+        persist_stale_tables(database, stale)
+
+def session_context(session_id):
+    """Context of the session a request belongs to"""
+    return SESSIONS.get(session_id)
+
+def request_session():
+    """Session of the current Flask request, by header or JSON body"""
+    body = request.get_json(silent=True) if request.is_json else None
+    return session_context(request.headers.get(SESSION_HEADER) or (body or {}).get('session_id'))
 
 def get_db_connection(database=None):
+    """Check out a pooled connection; close() hands it back to the pool"""
     try:
-        config = DB_CONFIG.copy()
-        if database:
-            config["database"] = database
-        connection = mysql.connector.connect(**config)
-        return connection
+        with span('db_connect'):
+            return get_pool(DB_CONFIG, database).acquire()
     except mysql.connector.Error as err:
         print(f"Error connecting to MySQL: {err}")
         return None
 
+SYSTEM_DATABASES = ['information_schema', 'performance_schema', 'mysql', 'sys']
+
 def get_databases():
     """Fetch list of all databases"""
     try:
@@ -205,7 +242,7 @@ def get_databases():
         
         cursor = connection.cursor()
         cursor.execute("SHOW DATABASES")
-        databases = [db[0] for db in cursor.fetchall() if db[0] not in ['information_schema', 'performance_schema', 'mysql', 'sys']]
+        databases = [db[0] for db in cursor.fetchall() if db[0] not in SYSTEM_DATABASES]
         cursor.close()
         connection.close()
         return databases
@@ -270,56 +307,8 @@ def get_table_structure(connection, table_name):
 
 def clean_sql_response(response_text):
     """Clean up the SQL response from the model"""
-    # Convert to lowercase for case-insensitive matching
-    text = response_text.lower()
-    
-    # Remove any explanatory text before the SQL query
-    if "output:" in text:
-        # Split on "output:" and take the last part
-        parts = response_text.split("output:")
-        if len(parts) > 1:
-            response_text = parts[-1].strip()
-    
-    # Remove any remaining explanatory text
-    if "to describe" in text:
-        response_text = response_text.split("to describe")[-1].strip()
-    if "you can use" in text:
-        response_text = response_text.split("you can use")[-1].strip()
-    if "as follows" in text:
-        response_text = response_text.split("as follows")[-1].strip()
-    
-    # Remove comments (both single-line and multi-line)
-    lines = response_text.split('\n')
-    cleaned_lines = []
-    in_comment = False
-    
-    for line in lines:
-        # Handle multi-line comments
-        if '/*' in line:
-            in_comment = True
-            line = line.split('/*')[0]
-        if '*/' in line:
-            in_comment = False
-            line = line.split('*/')[-1]
-        if in_comment:
-            continue
-            
-        # Handle single-line comments
-        if '--' in line:
-            line = line.split('--')[0]
-            
-        # Clean up the line
-        line = line.strip()
-        if line:  # Only add non-empty lines
-            cleaned_lines.append(line)
-    
-    # Join lines with proper spacing
-    response_text = ' '.join(cleaned_lines)
-    
-    # Remove any remaining newlines and extra spaces
-    response_text = ' '.join(response_text.split())
-    
-    return response_text
+    # Single tokenizer pass: skips prose around the SQL, drops comments, collapses whitespace
+    return clean_sql(response_text)
 
 def get_table_relationships(connection, database):
     """Get relationships between tables in the database"""
@@ -327,42 +316,17 @@ def get_table_relationships(connection, database):
         cursor = connection.cursor()
         relationships = []
         
-        # Get all tables in the database
-        cursor.execute(f"USE {database}")
-        cursor.execute("SHOW TABLES")
-        tables = [row[0] for row in cursor.fetchall()]
+        # Get all tables and their foreign keys in two queries
+        tables = fetch_tables(cursor, database)
+        _, foreign_keys = fetch_keys(cursor, database)
         
-        # For each table, get its foreign keys and primary keys
         for table in tables:
-            # Get primary key information
-            cursor.execute(f"""
-                SELECT COLUMN_NAME
-                FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE
-                WHERE TABLE_SCHEMA = '{database}'
-                AND TABLE_NAME = '{table}'
-                AND CONSTRAINT_NAME = 'PRIMARY'
-            """)
-            primary_keys = [row[0] for row in cursor.fetchall()]
-            
-            # Get foreign key information
-            cursor.execute(f"""
-                SELECT 
-                    COLUMN_NAME,
-                    REFERENCED_TABLE_NAME,
-                    REFERENCED_COLUMN_NAME
-                FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE
-                WHERE TABLE_SCHEMA = '{database}'
-                AND TABLE_NAME = '{table}'
-                AND REFERENCED_TABLE_NAME IS NOT NULL
-            """)
-            
-            foreign_keys = cursor.fetchall()
-            for fk in foreign_keys:
+            for fk in foreign_keys.get(table, []):
                 relationships.append({
                     'source': table,
-                    'target': fk[1],
-                    'source_column': fk[0],
-                    'target_column': fk[2]
+                    'target': fk['referenced_table'],
+                    'source_column': fk['column'],
+                    'target_column': fk['referenced_column']
                 })
         
         # If no relationships found, create nodes for all tables
@@ -382,154 +346,104 @@ def get_table_relationships(connection, database):
     finally:
         cursor.close()
 
-def convert_to_sql(natural_language):
+SQL_STOP_SEQUENCES = ["\nInput:", "\nExplanation:", "\nNote:", "\n\n\n"]
+
+def build_sql_payload(prompt, stream=False):
+    """Chat completions payload for a prompt"""
+    return {
+        "messages": [
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ],
+        "temperature": 0.05,
+        "max_tokens": 500,
+        "stream": stream,
+        # The examples in the prompt continue with "Input:", cut the model off if it goes on
+        "stop": SQL_STOP_SEQUENCES,
+        "top_p": 0.1,
+        "frequency_penalty": 0.5,
+        "presence_penalty": 0.5
+    }
+
+def prepare_translation(current_db, natural_language, db_info=None):
+    """Schema fingerprint plus either a cached translation or the prompt to send to the model"""
+    if not current_db:
+        raise Exception("No database selected")
+
+    # Get database information from cache, unless the caller already has it
+    if not db_info:
+        with span('schema'):
+            db_info = get_database_info(current_db)
+    if not db_info:
+        raise Exception("Could not get database information")
+
+    # Repeated questions against an unchanged schema skip the model entirely
+    fingerprint = db_info.get('fingerprint') or str(db_info.get('version'))
+    with span('translation_cache'):
+        cached_sql = TRANSLATION_CACHE.get(current_db, fingerprint, natural_language)
+    if cached_sql:
+        return fingerprint, cached_sql, None
+
+    # Splice the question into the schema text rendered for this schema version
+    with span('prompt'):
+        prompt = build_prompt(current_db, db_info, natural_language)
+    return fingerprint, None, prompt
+
+def extract_sql(model_output):
+    """Clean up and validate the SQL query produced by the model"""
+    # Clean up the SQL query, prefixes like "Output:" are dropped with the other prose
+    sql_query = clean_sql_response(model_output)
+    
+    # Basic SQL validation
+    valid_commands = ('select', 'insert', 'create', 'update', 'delete', 'show', 'use', 'drop', 'describe', 'alter')
+    if not any(sql_query.lower().startswith(cmd) for cmd in valid_commands):
+        raise Exception("Generated query is not a valid SQL command")
+    return sql_query
+
+def finish_translation(current_db, fingerprint, natural_language, detector, generated):
+    """Extract the SQL from streamed model output and remember the translation"""
+    # Prefixes and prose before the statement are still handled by extract_sql
+    with span('extract'):
+        sql_query = extract_sql(detector.output or generated)
+    TRANSLATION_CACHE.set(current_db, fingerprint, natural_language, sql_query)
+    return sql_query
+
+def convert_to_sql(current_db, natural_language, db_info=None):
     """Convert natural language to SQL using LM Studio"""
-    try:
-        # Get current database
-        current_db = db_context["current_database"]
-        if not current_db:
-            raise Exception("No database selected")
+    # Stream internally so generation stops as soon as the statement is complete
+    for event, value in stream_sql(current_db, natural_language, db_info):
+        if event == 'sql':
+            return value
+    raise Exception("Error converting to SQL: LM Studio returned no SQL")
 
-        # Get database information from cache
-        db_info = get_database_info(current_db)
-        if not db_info:
-            raise Exception("Could not get database information")
-
-        # Prepare detailed context information
-        context_info = f"Current database: {current_db}\n\n"
-        context_info += "Available tables:\n"
-        for table in db_info['tables']:
-            context_info += f"- {table}\n"
-        
-        context_info += "\nDetailed table structures:\n"
-        for table, info in db_info['tables'].items():
-            context_info += f"\nTable: {table}\n"
-            context_info += "Columns:\n"
-            for col in info['columns']:
-                context_info += f"- {col['name']} ({col['type']})"
-                if col['key']:
-                    context_info += f" [{col['key']}]"
-                context_info += "\n"
-            
-            if info['primary_keys']:
-                context_info += f"Primary keys: {', '.join(info['primary_keys'])}\n"
-            
-            if info['foreign_keys']:
-                context_info += "Foreign keys:\n"
-                for fk in info['foreign_keys']:
-                    context_info += f"- {fk['column']} references {fk['referenced_table']}.{fk['referenced_column']}\n"
-
-        # Prepare the request payload
-        payload = {
-            "messages": [
-                {
-                    "role": "user",
-                    "content": f"""You are a SQL expert. Convert the following natural language request into a valid SQL query.
-                    CRITICAL: Return ONLY the raw SQL query without ANY text, prefixes, comments, or explanations.
-                    
-                    Current Database Context:
-                    {context_info}
-                    
-                    Rules:
-                    1. Return ONLY the SQL query - no prefixes, no comments, no explanations
-                    2. Do not include words like 'Output:', 'Query:', or any other text
-                    3. Use proper SQL syntax
-                    4. CRITICAL: Use ONLY the column names that exist in the tables as shown above
-                    5. For SELECT queries:
-                       - Use EXACT column names from the table structures
-                       - For joins, use the correct column names from both tables
-                       - For conditions, use the exact column names shown above
-                    6. CRITICAL TABLE NAME RULES:
-                       - Use EXACT table names as specified in the request
-                       - DO NOT add 's' to table names unless explicitly specified
-                       - DO NOT modify table names in any way
-                    7. For showing tables:
-                       - If the request is to show all tables, use 'SHOW TABLES'
-                       - If the request is to show a specific table, use 'SHOW TABLES LIKE table_name'
-                       - If the request is to describe a table, use 'DESCRIBE table_name'
-                    8. For relationships between tables:
-                        - Use the exact column names from the table structures
-                        - Ensure the join conditions use the correct column names
-                        - Check the table structures above for the correct column names to join on
-                        - Use the relationships information provided above for JOIN conditions
-                    9. CRITICAL: Do not include any comments in the SQL query
-                    10. CRITICAL: Do not use table aliases unless explicitly requested
-                    11. For queries involving multiple tables:
-                        - Always use the relationships information provided above
-                        - Join tables using the correct foreign key relationships
-                        - Use the exact column names for join conditions
-                        - Ensure the query follows the logical flow of relationships
-                    12. CRITICAL JOIN RULES:
-                        - Use ONLY the foreign key relationships shown in the context
-                        - For each table, check its foreign keys in the context
-                        - Use the exact column names from the foreign key relationships
-                        - DO NOT assume column names - use only what's shown in the context
-                        - The customer table has a car_id column that references the cars table's id column
-                        - When joining customer and cars tables, use customer.car_id = cars.id
-                    
-                    Examples:
-                    Input: "show all tables" or "show tables" or "list tables" or "show table"
-                    Output: SHOW TABLES;
-                    
-                    Input: "describe the table products"
-                    Output: DESCRIBE products;
-                    
-                    Input: "delete the table orders"
-                    Output: DROP TABLE orders;
-                    
-                    Input: "find the name of customer who owns a ford car"
-                    Output: SELECT customer.name FROM customer JOIN cars ON customer.car_id = cars.id WHERE cars.brand = 'ford';
-                    
-                    Now convert this request: {natural_language}"""
-                }
-            ],
-            "temperature": 0.05,
-            "max_tokens": 500,
-            "stream": False,
-            "top_p": 0.1,
-            "frequency_penalty": 0.5,
-            "presence_penalty": 0.5
-        }
+def stream_sql(current_db, natural_language, db_info=None):
+    """Convert natural language to SQL, yielding ('token', text) events and finally ('sql', query).
+
+    Generation is cut off as soon as the model has produced a complete
+    statement followed by anything that does not start another one.
+    """
+    try:
+        fingerprint, cached_sql, prompt = prepare_translation(current_db, natural_language, db_info)
+        if cached_sql:
+            yield 'sql', cached_sql
+            return
         
-        response = requests.post(
-            "http://127.0.0.1:1234/v1/chat/completions",
-            headers={
-                "Content-Type": "application/json",
-                "Accept": "application/json"
-            },
-            json=payload
-        )
-        
-        if response.status_code != 200:
-            raise Exception(f"LM Studio API returned status code {response.status_code}. Response: {response.text}")
-            
-        response_data = response.json()
-        if 'choices' not in response_data or not response_data['choices']:
-            raise Exception("Invalid response from LM Studio API")
-            
-        # Get the SQL query and clean it up
-        sql_query = response_data["choices"][0]["message"]["content"].strip()
-        
-        # Remove any prefixes like "Output:", "Query:", etc.
-        prefixes_to_remove = ["output:", "query:", "sql:", "result:"]
-        for prefix in prefixes_to_remove:
-            if sql_query.lower().startswith(prefix):
-                sql_query = sql_query[len(prefix):].strip()
-        
-        # Clean up the SQL query
-        sql_query = clean_sql_response(sql_query)
-        
-        # Basic SQL validation
-        valid_commands = ('select', 'insert', 'create', 'update', 'delete', 'show', 'use', 'drop', 'describe', 'alter')
-        if not any(sql_query.lower().startswith(cmd) for cmd in valid_commands):
-            raise Exception("Generated query is not a valid SQL command")
-            
-        return sql_query
+        generated = ''
+        detector = StatementEndDetector()
+        # Closing the token stream drops the HTTP response, which stops generation
+        with span('llm'), closing(LLM_CLIENT.stream_chat_completion(build_sql_payload(prompt, stream=True))) as tokens:
+            for token in tokens:
+                yield 'token', token
+                generated += token
+                if detector.feed(token):
+                    break
         
-    except requests.exceptions.RequestException as e:
-        raise Exception(f"Failed to connect to LM Studio API: {str(e)}")
-    except json.JSONDecodeError:
-        raise Exception("Invalid JSON response from LM Studio API")
+        yield 'sql', finish_translation(current_db, fingerprint, natural_language, detector, generated)
+        
+    except LLMBusyError:
+        raise
     except Exception as e:
         raise Exception(f"Error converting to SQL: {str(e)}")
 
@@ -575,7 +489,7 @@ def create_database():
             
             # If use_now is True, update the current database context
             if use_now:
-                update_db_context(database=db_name)
+                request_session().update(database=db_name)
                 response["message"] += f" Now using database '{db_name}'."
             
             return jsonify(response)
@@ -589,6 +503,343 @@ def create_database():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def run_statements(cursor, connection, statements):
+    """Execute each statement exactly once, capturing its result set and timing"""
+    results = []
+    for statement in statements:
+        start = time.perf_counter()
+        cursor.execute(statement)
+        
+        result = {"sql": statement, "columns": None, "rows": None, "row_count": cursor.rowcount}
+        if cursor.with_rows:
+            result["rows"] = cursor.fetchall()
+            result["columns"] = [desc[0] for desc in cursor.description]
+            result["row_count"] = len(result["rows"])
+        connection.commit()
+        
+        result["seconds"] = time.perf_counter() - start
+        results.append(result)
+    return results
+
+def statement_message(statement, table_existed=True):
+    """Response type and message for a statement that returns no rows"""
+    query_type = statement.strip().split()[0].upper()
+    if query_type == "CREATE":
+        if "TABLE" in statement.upper():
+            return "create", "Table created successfully."
+        if "DATABASE" in statement.upper():
+            return "create", "Database created successfully."
+    elif query_type == "UPDATE":
+        return "update", "Data updated successfully."
+    elif query_type == "DELETE":
+        return "delete", "Data deleted successfully."
+    elif query_type == "ALTER":
+        return "alter", "Table structure modified successfully."
+    elif query_type == "DROP":
+        if "TABLE" in statement.upper():
+            if not table_existed:
+                table_name = statement.lower().split('drop table')[1].replace('if exists', '').strip()
+                return "drop", f"Table '{table_name}' does not exist."
+            return "drop", "Table dropped successfully."
+        if "DATABASE" in statement.upper():
+            return "drop", "Database dropped successfully."
+    return "other", "Query executed successfully."
+
+def format_timings(results):
+    return [{
+        "sql": result["sql"],
+        "seconds": round(result["seconds"], 6),
+        "row_count": result["row_count"]
+    } for result in results]
+
+# Statements whose rows can be paged in from an open cursor
+PAGED_STATEMENTS = ('select', 'with')
+
+def execute_paged(connection, cursor, selected_database, statements, sql_query, page_size, cached=None):
+    """Run the statements, returning only the first page of the last one's rows.
+
+    The last statement runs on an unbuffered cursor, or is paged from a
+    result cache entry when cached is given. Returns (response,
+    handed_off); when handed_off is true the connection belongs to the
+    result cursor, which is parked under the next_page token if rows remain,
+    and cursor has been closed.
+    """
+    if cached is not None:
+        result = CachedResult(cached["columns"], cached["rows"], statements[-1])
+        rows, next_page = RESULT_CURSORS.page(result, page_size)
+        response = {
+            "sql": sql_query,
+            "columns": result.columns,
+            "rows": rows,
+            "next_page": next_page,
+            "message": f"Query returned {len(rows)} row(s)." if next_page is None
+                       else f"Showing the first {len(rows)} row(s).",
+            "type": "select",
+            "loading": True,
+            "timings": format_timings([{"sql": statements[-1], "row_count": len(rows), "seconds": 0.0}])
+        }
+        return response, False
+
+    results = run_statements(cursor, connection, statements[:-1])
+    invalidate_schema_cache(selected_database, statements[:-1])
+    RESULT_CACHE.invalidate_writes(selected_database, statements[:-1])
+    # Paging may hand the connection back to the pool, nothing may use it after that
+    cursor.close()
+
+    start = time.perf_counter()
+    unbuffered = connection.cursor(buffered=False)  # Rows stay on the server until paged in
+    unbuffered.execute(statements[-1])
+
+    if not unbuffered.with_rows:
+        # e.g. SELECT ... INTO @variable
+        unbuffered.close()
+        connection.commit()
+        results.append({"sql": statements[-1], "row_count": unbuffered.rowcount,
+                        "seconds": time.perf_counter() - start})
+        response = {
+            "sql": sql_query,
+            "message": "Query executed successfully.",
+            "type": "other",
+            "loading": True,
+            "timings": format_timings(results)
+        }
+        return response, False
+
+    result = ResultCursor(connection, unbuffered, statements[-1])
+    rows, next_page = RESULT_CURSORS.page(result, page_size)
+    results.append({"sql": statements[-1], "row_count": len(rows), "seconds": time.perf_counter() - start})
+    response = {
+        "sql": sql_query,
+        "columns": result.columns,
+        "rows": rows,
+        "next_page": next_page,
+        "message": f"Query returned {len(rows)} row(s)." if next_page is None
+                   else f"Showing the first {len(rows)} row(s).",
+        "type": "select",
+        "loading": True,
+        "timings": format_timings(results)
+    }
+    return response, True
+
+def add_guard_report(response, guard, row_count=None):
+    """Attach the pre-execution plan check to a response"""
+    response["guard"] = guard
+    if guard["limit"] and row_count == guard["limit"]:
+        response["message"] += f" Results are limited to {guard['limit']} rows."
+    return response
+
+def execute_query(selected_database, sql_query, multi_result=False, page_size=None, confirmed=False,
+                  columnar=False, session=None, connection=None):
+    """Execute generated SQL and build the /query response, returns (response, status code).
+
+    Every statement runs once. The response describes the last statement;
+    with multi_result the result set of every statement is included as well.
+    With page_size, a SELECT's rows come back in columnar pages instead
+    (see execute_paged). Expensive plans only run when confirmed. Rows
+    come as a list of dicts, or as columns plus row arrays when columnar.
+    Tables seen and queries run are recorded in the session context.
+    A connection passed in by the caller is left open.
+    """
+    # Execute SQL query
+    shared = connection is not None
+    if not shared:
+        connection = get_db_connection(selected_database)
+    if not connection:
+        return {"error": "Could not connect to MySQL database"}, 500
+
+    cursor = connection.cursor(buffered=True)  # Use buffered cursor
+    handed_off = False
+
+    try:
+        # Split multiple statements if present, ';' inside string literals is not a separator
+        statements = split_statements(sql_query)
+
+        if not statements:
+            return {"error": "No valid SQL statements found"}, 400
+
+        # For CREATE TABLE, verify the table doesn't exist first
+        if statements[0].lower().startswith('create table'):
+            table_name = statements[0].lower().split('create table')[1].split('(')[0].strip()
+            current_tables = get_current_tables(connection)
+            if table_name in current_tables:
+                return {
+                    "sql": sql_query,
+                    "error": f"Table '{table_name}' already exists in the database."
+                }, 400
+
+        # For DROP TABLE, use IF EXISTS to handle non-existent tables gracefully
+        table_existed = True
+        if statements[0].lower().startswith('drop table'):
+            table_name = statements[0].lower().split('drop table')[1].replace('if exists', '').strip()
+            # Remember whether there was anything to drop for the response message
+            table_existed = table_name in get_current_tables(connection)
+            # Modify the statement to include IF EXISTS
+            statements[0] = f"DROP TABLE IF EXISTS {table_name}"
+            sql_query = '; '.join(statements) + ';'
+
+        paged = (page_size and not multi_result and not shared
+                 and statement_keyword(statements[-1]) in PAGED_STATEMENTS)
+
+        # Repeated read-only queries are answered from the result cache
+        cache_statement = statements[0] if len(statements) == 1 and is_cacheable(statements[0]) else None
+        cached = RESULT_CACHE.get(selected_database, cache_statement) if cache_statement else None
+        if paged and cached is not None and cached["guard"]["limit"] == len(cached["rows"]):
+            # Cut off by the automatic LIMIT, a paged read returns every row
+            cached = None
+        snapshot = None
+        if cache_statement and cached is None:
+            snapshot = RESULT_CACHE.snapshot(selected_database, cache_statement)
+
+        if cached is not None:
+            guard = cached["guard"]
+        else:
+            # Explain the plan, add row limits and time limits before anything runs
+            with span('explain'):
+                statements, guard = check_statements(cursor, statements, confirmed, paged)
+            if guard["verdict"] == "reject":
+                return {
+                    "sql": sql_query,
+                    "error": f"Query rejected: it would scan about {guard['estimated_rows']:,} rows.",
+                    "guard": guard
+                }, 400
+            if guard["verdict"] == "confirm":
+                return {
+                    "sql": sql_query,
+                    "message": f"This query would scan about {guard['estimated_rows']:,} rows. Run it anyway?",
+                    "type": "confirm",
+                    "confirm_required": True,
+                    "guard": guard
+                }, 409
+            # Results read while these statements run must not be cached
+            RESULT_CACHE.invalidate_writes(selected_database, statements)
+            TABLE_STATS.invalidate_writes(selected_database, statements)
+
+        if paged:
+            with span('execute'):
+                response, handed_off = execute_paged(connection, cursor, selected_database,
+                                                     statements, sql_query, page_size, cached)
+            if snapshot is not None and "rows" in response and response["next_page"] is None:
+                RESULT_CACHE.set(selected_database, cache_statement, response["columns"], response["rows"],
+                                 snapshot, guard=guard)
+            response["cached"] = cached is not None
+            if session:
+                session.update(query=sql_query, result=response)
+            return add_guard_report(response, guard), 200
+
+        if cached is not None:
+            results = [{"sql": statements[0], "columns": cached["columns"], "rows": cached["rows"],
+                        "row_count": len(cached["rows"]), "seconds": 0.0}]
+        else:
+            # Execute each statement once, keeping every result set
+            with span('execute'):
+                results = run_statements(cursor, connection, statements)
+
+            # Re-read the schema of tables changed by DDL on the next request
+            invalidate_schema_cache(selected_database, statements)
+            RESULT_CACHE.invalidate_writes(selected_database, statements)
+
+            if snapshot is not None and results[-1]["rows"] is not None:
+                RESULT_CACHE.set(selected_database, cache_statement, results[-1]["columns"], results[-1]["rows"],
+                                 snapshot, guard=guard)
+
+        last = results[-1]
+        last_statement = statements[-1]
+        if last["rows"] is not None:
+            columns = last["columns"]
+
+            # Special handling for SHOW TABLES
+            if last_statement.lower().strip() == 'show tables':
+                current_tables = [row[0] for row in last["rows"]]
+                # Update context with actual table list
+                tables = {table: None for table in current_tables}
+                if session:
+                    session.update(table_info=tables)
+                response = {
+                    "sql": sql_query,
+                    **rows_payload(["Tables_in_" + selected_database], [[table] for table in current_tables],
+                                   columnar),
+                    "message": f"Found {len(current_tables)} table(s) in the database.",
+                    "type": "show_tables",
+                    "loading": True
+                }
+            # Special handling for DESCRIBE
+            elif last_statement.lower().startswith('describe'):
+                table_name = last_statement.lower().split('describe')[1].strip()
+                # Update context with the structure DESCRIBE just returned
+                table_structure = {row[0]: row[1] for row in last["rows"]}
+                if table_structure and session:
+                    session.update(table_info={table_name: table_structure})
+                response = {
+                    "sql": sql_query,
+                    **rows_payload(columns, last["rows"], columnar),
+                    "message": f"Table structure retrieved successfully.",
+                    "type": "describe",
+                    "loading": True
+                }
+            else:
+                response = {
+                    "sql": sql_query,
+                    **rows_payload(columns, last["rows"], columnar),
+                    "message": f"Query returned {len(last['rows'])} row(s).",
+                    "type": "select",
+                    "loading": True
+                }
+        else:
+            # Determine query type and create appropriate message
+            query_type, message = statement_message(last_statement, table_existed or len(statements) > 1)
+            response = {
+                "sql": sql_query,
+                "message": message,
+                "type": query_type,
+                "loading": True
+            }
+
+        if session:
+            session.update(query=sql_query, result=response)
+        response["timings"] = format_timings(results)
+        response["cached"] = cached is not None
+        add_guard_report(response, guard, len(last["rows"]) if last["rows"] is not None else None)
+
+        if multi_result:
+            response["results"] = [{
+                "sql": result["sql"],
+                "columns": result["columns"],
+                **(rows_payload(result["columns"], result["rows"], columnar)
+                   if result["rows"] is not None else {"output": None}),
+                "row_count": result["row_count"]
+            } for result in results]
+
+    except mysql.connector.Error as err:
+        return {
+            "sql": sql_query,
+            "error": f"MySQL Error: {str(err)}"
+        }, 400
+    finally:
+        # A handed off connection may already be back in the pool, serving another request
+        if not handed_off:
+            cursor.close()
+            if not shared:
+                connection.close()
+
+    return response, 200
+
+def add_trace(response, body):
+    """Stage timings of this request, when the client asked for them with "trace": true"""
+    trace = current_trace()
+    if body.get('trace') and trace is not None:
+        response["trace"] = trace.to_dict()
+    return response
+
+def query_options(body, query_format=None, accept=None):
+    """Response format and execute_query options requested in a /query body"""
+    fmt = format_from(body, query_format, accept)
+    return fmt, {
+        "multi_result": bool(body.get('multi_result')),
+        "page_size": page_size_from(body.get('page_size')),
+        "confirmed": bool(body.get('confirm')),
+        "columnar": is_columnar(fmt)
+    }
+
 @app.route('/query', methods=['POST'])
 def query():
     try:
@@ -600,276 +851,402 @@ def query():
                 "error": "No database selected. Please select a database first."
             }), 400
         
-        # Update context with current database
-        update_db_context(database=selected_database)
+        # Update this session's context with the current database
+        session = request_session()
+        session.update(database=selected_database)
         
         # Convert natural language to SQL
-        sql_query = convert_to_sql(user_input)
+        sql_query = convert_to_sql(selected_database, user_input)
         
-        # Execute SQL query
-        connection = get_db_connection(selected_database)
-        if not connection:
-            return jsonify({"error": "Could not connect to MySQL database"}), 500
+        fmt, options = query_options(request.json, request.args.get('format'), request.headers.get('Accept'))
+        if fmt == 'ndjson':
+            return ndjson_response(selected_database, sql_query, options["confirmed"], session)
         
-        cursor = connection.cursor(buffered=True)  # Use buffered cursor
-        
-        try:
-            # Split multiple statements if present
-            statements = [stmt.strip() for stmt in sql_query.split(';') if stmt.strip()]
-            
-            if not statements:
-                return jsonify({"error": "No valid SQL statements found"}), 400
-            
-            # For CREATE TABLE, verify the table doesn't exist first
-            if statements[0].lower().startswith('create table'):
-                table_name = statements[0].lower().split('create table')[1].split('(')[0].strip()
-                current_tables = get_current_tables(connection)
-                if table_name in current_tables:
-                    return jsonify({
-                        "sql": sql_query,
-                        "error": f"Table '{table_name}' already exists in the database."
-                    }), 400
-            
-            # For DROP TABLE, use IF EXISTS to handle non-existent tables gracefully
-            if statements[0].lower().startswith('drop table'):
-                table_name = statements[0].lower().split('drop table')[1].strip().rstrip(';')
-                # Modify the statement to include IF EXISTS
-                statements[0] = f"DROP TABLE IF EXISTS {table_name}"
-                sql_query = '; '.join(statements) + ';'
-            
-            # Execute each statement separately
-            for statement in statements:
-                cursor.execute(statement)
-                connection.commit()
-                
-                # Fetch any results to prevent "Unread result found" error
-                if cursor.with_rows:
-                    cursor.fetchall()
-            
-            # Execute the last statement again to get its results
-            cursor.execute(statements[-1])
-            
-            # Get the result from the last statement
-            if cursor.with_rows:
-                result = cursor.fetchall()
-                columns = [desc[0] for desc in cursor.description]
-                formatted_result = [dict(zip(columns, row)) for row in result]
-                
-                # Special handling for SHOW TABLES
-                if statements[-1].lower().strip() == 'show tables':
-                    # Get current tables from database
-                    current_tables = get_current_tables(connection)
-                    # Update context with actual table list
-                    tables = {table: None for table in current_tables}
-                    update_db_context(table_info=tables)
-                    response = {
-                        "sql": sql_query,
-                        "output": [{"Tables_in_" + selected_database: table} for table in current_tables],
-                        "message": f"Found {len(current_tables)} table(s) in the database.",
-                        "type": "show_tables",
-                        "loading": True
-                    }
-                # Special handling for DESCRIBE
-                elif statements[-1].lower().startswith('describe'):
-                    table_name = statements[-1].lower().split('describe')[1].strip()
-                    # Update context with table structure
-                    table_structure = get_table_structure(connection, table_name)
-                    if table_structure:
-                        update_db_context(table_info={table_name: table_structure})
-                    response = {
-                        "sql": sql_query,
-                        "output": formatted_result,
-                        "message": f"Table structure retrieved successfully.",
-                        "type": "describe",
-                        "loading": True
-                    }
-                else:
-                    response = {
-                        "sql": sql_query,
-                        "output": formatted_result,
-                        "message": f"Query returned {len(result)} row(s).",
-                        "type": "select",
-                        "loading": True
-                    }
-            else:
-                # Determine query type and create appropriate message
-                query_type = statements[-1].strip().split()[0].upper()
-                if query_type == "CREATE":
-                    if "TABLE" in statements[-1].upper():
-                        response = {
-                            "sql": sql_query,
-                            "message": "Table created successfully.",
-                            "type": "create",
-                            "loading": True
-                        }
-                    elif "DATABASE" in statements[-1].upper():
-                        response = {
-                            "sql": sql_query,
-                            "message": "Database created successfully.",
-                            "type": "create",
-                            "loading": True
-                        }
-                elif query_type == "UPDATE":
-                    response = {
-                        "sql": sql_query,
-                        "message": "Data updated successfully.",
-                        "type": "update",
-                        "loading": True
-                    }
-                elif query_type == "DELETE":
-                    response = {
-                        "sql": sql_query,
-                        "message": "Data deleted successfully.",
-                        "type": "delete",
-                        "loading": True
-                    }
-                elif query_type == "ALTER":
-                    response = {
-                        "sql": sql_query,
-                        "message": "Table structure modified successfully.",
-                        "type": "alter",
-                        "loading": True
-                    }
-                elif query_type == "DROP":
-                    if "TABLE" in statements[-1].upper():
-                        # Check if the table was actually dropped
-                        table_name = statements[-1].lower().split('drop table')[1].strip().rstrip(';')
-                        if 'if exists' in statements[-1].lower():
-                            current_tables = get_current_tables(connection)
-                            if table_name in current_tables:
-                                response = {
-                                    "sql": sql_query,
-                                    "message": "Table dropped successfully.",
-                                    "type": "drop",
-                                    "loading": True
-                                }
-                            else:
-                                response = {
-                                    "sql": sql_query,
-                                    "message": f"Table '{table_name}' does not exist.",
-                                    "type": "drop",
-                                    "loading": True
-                                }
-                        else:
-                            response = {
-                                "sql": sql_query,
-                                "message": "Table dropped successfully.",
-                                "type": "drop",
-                                "loading": True
-                            }
-                    elif "DATABASE" in statements[-1].upper():
-                        response = {
-                            "sql": sql_query,
-                            "message": "Database dropped successfully.",
-                            "type": "drop",
-                            "loading": True
-                        }
-                else:
-                    response = {
-                        "sql": sql_query,
-                        "message": "Query executed successfully.",
-                        "type": "other",
-                        "loading": True
-                    }
-                
-                # Update context with query and result
-                update_db_context(query=sql_query, result=response)
-                
-        except mysql.connector.Error as err:
-            return jsonify({
-                "sql": sql_query,
-                "error": f"MySQL Error: {str(err)}"
-            }), 400
-        finally:
-            cursor.close()
-            connection.close()
-            
-        return jsonify(response)
+        response, status = execute_query(selected_database, sql_query, session=session, **options)
+        return make_response(app, add_trace(response, request.json), status, fmt)
         
+    except LLMBusyError as e:
+        return jsonify({"sql": None, "error": str(e)}), 503
     except Exception as e:
         return jsonify({
             "sql": sql_query if 'sql_query' in locals() else None,
             "error": str(e)
         }), 500
 
+def ndjson_response(selected_database, sql_query, confirmed=False, session=None):
+    """Stream a query's rows as newline delimited JSON.
+
+    The first line holds the columns, then every line holds a batch of rows
+    as arrays, and a final line reports the row count. Statements that do
+    not return rows get the usual JSON response.
+    """
+    response, status = execute_query(selected_database, sql_query, page_size=RESULT_PAGE_SIZE,
+                                     confirmed=confirmed, session=session)
+    if "rows" not in response:
+        return jsonify(response), status
+    
+    def generate():
+        rows = response.pop("rows")
+        token = response.pop("next_page")
+        message = response.pop("message")
+        yield app.json.dumps(response) + "\n"
+        if rows:
+            yield app.json.dumps({"rows": rows}) + "\n"
+        row_count = len(rows)
+        
+        result = RESULT_CURSORS.take(token) if token else None
+        if result is not None:
+            try:
+                for batch in result.iter_batches(RESULT_PAGE_SIZE):
+                    row_count += len(batch)
+                    yield app.json.dumps({"rows": batch}) + "\n"
+                message = f"Query returned {row_count} row(s)."
+            except mysql.connector.Error as err:
+                yield app.json.dumps({"error": f"MySQL Error: {str(err)}"}) + "\n"
+                return
+            finally:
+                result.close()
+        yield app.json.dumps({"done": True, "row_count": row_count, "message": message}) + "\n"
+    
+    return Response(generate(), mimetype='application/x-ndjson')
+
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", 100))
+# Leave model slots free for interactive users while a batch runs
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", max(1, LLM_MAX_CONCURRENCY // 2)))
+
+def timed_translation(current_db, natural_language, db_info):
+    start = time.perf_counter()
+    sql_query = convert_to_sql(current_db, natural_language, db_info)
+    return sql_query, time.perf_counter() - start
+
+@app.route('/query/batch', methods=['POST'])
+def query_batch():
+    """Translate and run a list of questions against one database.
+
+    The schema is looked up once for the whole batch. Questions are
+    translated in parallel, at most BATCH_LLM_CONCURRENCY at a time, and
+    their SQL runs in question order over one connection as soon as each
+    translation is ready. Every question gets its own result and timings.
+    """
+    data = request.get_json(silent=True) or {}
+    selected_database = data.get('database')
+    questions = data.get('questions')
+    
+    if not selected_database:
+        return jsonify({"error": "No database selected. Please select a database first."}), 400
+    if (not isinstance(questions, list) or not questions
+            or not all(isinstance(question, str) and question.strip() for question in questions)):
+        return jsonify({"error": "questions must be a non-empty list of questions"}), 400
+    if len(questions) > BATCH_MAX_QUESTIONS:
+        return jsonify({"error": f"A batch can hold at most {BATCH_MAX_QUESTIONS} questions"}), 400
+    
+    session = request_session()
+    session.update(database=selected_database)
+    fmt, options = query_options(data, request.args.get('format'), request.headers.get('Accept'))
+    # Every result comes back whole, there is no cursor to page from
+    options["page_size"] = None
+    
+    start = time.perf_counter()
+    db_info = get_database_info(selected_database)
+    if not db_info:
+        return jsonify({"error": "Could not get database information"}), 500
+    schema_seconds = time.perf_counter() - start
+    
+    results = []
+    connection = None
+    with ThreadPoolExecutor(max_workers=min(BATCH_LLM_CONCURRENCY, len(questions))) as translators:
+        # Each translation runs in a copy of this context, so its spans land in this request's trace
+        translations = [translators.submit(contextvars.copy_context().run, timed_translation,
+                                           selected_database, question, db_info)
+                        for question in questions]
+        try:
+            for question, translation in zip(questions, translations):
+                item = {"question": question}
+                results.append(item)
+                try:
+                    sql_query, item["translate_seconds"] = translation.result()
+                except LLMBusyError as e:
+                    item.update({"sql": None, "error": str(e), "status": 503})
+                    continue
+                except Exception as e:
+                    item.update({"sql": None, "error": str(e), "status": 500})
+                    continue
+                
+                execute_start = time.perf_counter()
+                if connection is None:
+                    connection = get_db_connection(selected_database)
+                if connection is None:
+                    item.update({"sql": sql_query, "error": "Could not connect to MySQL database", "status": 500})
+                    continue
+                try:
+                    response, status = execute_query(selected_database, sql_query, session=session,
+                                                     connection=connection, **options)
+                except Exception as e:
+                    response, status = {"sql": sql_query, "error": str(e)}, 500
+                item.update(response)
+                item["status"] = status
+                item["execute_seconds"] = time.perf_counter() - execute_start
+                # A lost connection would fail every remaining question, check out a new one
+                if status >= 400 and not connection.is_connected():
+                    connection.close()
+                    connection = None
+        finally:
+            if connection is not None:
+                connection.close()
+    
+    failed = sum(1 for item in results if item["status"] >= 400)
+    return make_response(app, add_trace({
+        "database": selected_database,
+        "results": results,
+        "succeeded": len(results) - failed,
+        "failed": failed,
+        "schema_seconds": schema_seconds,
+        "seconds": time.perf_counter() - start
+    }, data), 200, fmt)
+
+@app.route('/query/page', methods=['GET'])
+def query_page():
+    """Next page of a paginated SELECT, by the next_page token of the previous page"""
+    token = request.args.get('token')
+    result = RESULT_CURSORS.take(token) if token else None
+    if result is None:
+        return jsonify({"error": "This result is no longer available. Please run the query again."}), 404
+    
+    page_size = page_size_from(request.args.get('page_size')) or RESULT_PAGE_SIZE
+    try:
+        rows, next_page = RESULT_CURSORS.page(result, page_size)
+    except mysql.connector.Error as err:
+        return jsonify({"error": f"MySQL Error: {str(err)}"}), 400
+    return jsonify({
+        "columns": result.columns,
+        "rows": rows,
+        "next_page": next_page,
+        "rows_read": result.rows_read
+    })
+
+def sse_event(event, data):
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {app.json.dumps(data)}\n\n"
+
+@app.route('/query/stream', methods=['POST'])
+def query_stream():
+    """Like /query, but streams model tokens, the final SQL and the result as server-sent events"""
+    user_input = request.json.get('message')
+    selected_database = request.json.get('database')
+    _, options = query_options(request.json, request.args.get('format'), request.headers.get('Accept'))
+    
+    if not user_input or not selected_database:
+        return jsonify({
+            "error": "No database selected. Please select a database first."
+            if not selected_database else "Message is required"
+        }), 400
+    
+    # Update this session's context with the current database
+    session = request_session()
+    session.update(database=selected_database)
+    
+    def generate():
+        sql_query = None
+        try:
+            for event, value in stream_sql(selected_database, user_input):
+                if event == 'token':
+                    yield sse_event('token', {"text": value})
+                else:
+                    sql_query = value
+                    yield sse_event('sql', {"sql": sql_query})
+            
+            response, status = execute_query(selected_database, sql_query, session=session, **options)
+            response["status"] = status
+            yield sse_event('result', add_trace(response, request.json))
+        except Exception as e:
+            yield sse_event('error', {"sql": sql_query, "error": str(e)})
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def forget_dropped_database(database):
+    """Drop everything cached about a database that no longer exists"""
+    drop_pool(database)
+    DB_CACHE.invalidate(database)
+    TRANSLATION_CACHE.clear(database)
+    RESULT_CACHE.clear(database)
+    TABLE_STATS.invalidate(database)
+    SESSIONS.forget_database(database)
+    SCHEMA_STORE.delete(database)
+
+def drop_database(database, stage):
+    """Job operation: drop a database on a pooled server connection"""
+    connection = get_db_connection()
+    if not connection:
+        raise Exception("Could not connect to MySQL server")
+    try:
+        cursor = connection.cursor()
+        try:
+            cursor.execute(f"DROP DATABASE IF EXISTS {quote_identifier(database)}")
+        finally:
+            cursor.close()
+        connection.commit()
+    finally:
+        connection.close()
+    forget_dropped_database(database)
+    return {"dropped": True}
+
+def warm_database(database, stage):
+    """Job operation: load a database's schema and relationship graph into the caches"""
+    stage('schema')
+    db_info = get_database_info(database)
+    if not db_info:
+        raise Exception("Could not analyze database structure")
+    stage('graph')
+    schema_graph(database)
+    return {"tables": len(db_info['tables']), "last_updated": db_info['last_updated']}
+
+def refresh_table_stats(database, stage):
+    """Job operation: re-read row estimates and sample rows of every table"""
+    stage('schema')
+    db_info = get_database_info(database)
+    if not db_info:
+        raise Exception("Could not analyze database structure")
+    stage('stats')
+    TABLE_STATS.invalidate(database)
+    connection = get_db_connection(database)
+    if not connection:
+        raise Exception(f"Could not connect to {database}")
+    try:
+        details = TABLE_STATS.details(connection, database, list(db_info['tables']))
+    finally:
+        connection.close()
+    return {"tables": len(details)}
+
+JOB_OPERATIONS = {'drop': drop_database, 'warm': warm_database, 'stats': refresh_table_stats}
+JOB_EVENT_HEARTBEAT = 15
+
 @app.route('/delete_databases', methods=['POST'])
 def delete_databases():
-    """Endpoint to delete multiple databases"""
+    """Endpoint to delete multiple databases, returns the drop job; progress via /jobs/<id>"""
     try:
         data = request.json
         databases = data.get('databases', [])
         
         if not databases:
             return jsonify({"error": "No databases selected for deletion"}), 400
+        if any(db_name in SYSTEM_DATABASES for db_name in databases):
+            return jsonify({"error": "System databases cannot be deleted"}), 400
+        if len(databases) > JOB_MAX_ITEMS:
+            return jsonify({"error": f"At most {JOB_MAX_ITEMS} databases per job"}), 400
             
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({"error": "Could not connect to MySQL server"}), 500
-            
-        cursor = connection.cursor()
-        deleted_dbs = []
-        errors = []
-        
-        try:
-            for db_name in databases:
-                try:
-                    # Drop database
-                    cursor.execute(f"DROP DATABASE IF EXISTS `{db_name}`")
-                    deleted_dbs.append(db_name)
-                except mysql.connector.Error as err:
-                    errors.append(f"Error deleting database '{db_name}': {str(err)}")
-            
-            connection.commit()
-            
-            if errors:
-                return jsonify({
-                    "message": f"Successfully deleted {len(deleted_dbs)} database(s).",
-                    "deleted": deleted_dbs,
-                    "errors": errors
-                })
-            else:
-                return jsonify({
-                    "message": f"Successfully deleted {len(deleted_dbs)} database(s).",
-                    "deleted": deleted_dbs
-                })
-            
-        except mysql.connector.Error as err:
-            return jsonify({"error": f"MySQL Error: {str(err)}"}), 400
-        finally:
-            cursor.close()
-            connection.close()
+        # Answer right away, waiting here could queue this worker behind a long warm-up job
+        job = JOBS.submit('drop', databases, drop_database)
+        response = job.to_dict()
+        response["message"] = f"Deleting {len(job.items)} database(s), follow /jobs/{job.id} for progress."
+        return jsonify(response), 202
             
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-def get_table_details(connection, table_name):
-    """Get detailed information about a table"""
-    try:
-        cursor = connection.cursor()
-        
-        # Get column information
-        cursor.execute(f"DESCRIBE {table_name}")
-        columns = cursor.fetchall()
-        
-        # Get row count
-        cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
-        row_count = cursor.fetchone()[0]
-        
-        # Get sample data (first 5 rows)
-        cursor.execute(f"SELECT * FROM {table_name} LIMIT 5")
-        sample_data = cursor.fetchall()
-        column_names = [desc[0] for desc in cursor.description]
-        
-        return {
-            'columns': [{'field': col[0], 'type': col[1], 'null': col[2], 'key': col[3], 'default': col[4], 'extra': col[5]} for col in columns],
-            'row_count': row_count,
-            'sample_data': [dict(zip(column_names, row)) for row in sample_data]
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """Start a drop, warm or stats job over many databases; progress via /jobs/<id>"""
+    data = request.get_json(silent=True) or {}
+    kind = data.get('kind')
+    databases = data.get('databases')
+    
+    if kind not in JOB_OPERATIONS:
+        return jsonify({"error": f"kind must be one of {', '.join(JOB_OPERATIONS)}"}), 400
+    if not isinstance(databases, list) or not databases or not all(isinstance(db, str) and db for db in databases):
+        return jsonify({"error": "databases must be a non-empty list of database names"}), 400
+    if len(databases) > JOB_MAX_ITEMS:
+        return jsonify({"error": f"At most {JOB_MAX_ITEMS} databases per job"}), 400
+    if kind == 'drop' and any(db_name in SYSTEM_DATABASES for db_name in databases):
+        return jsonify({"error": "System databases cannot be deleted"}), 400
+    
+    job = JOBS.submit(kind, databases, JOB_OPERATIONS[kind])
+    return jsonify(job.to_dict()), 202
+
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    """Running and recently finished jobs, without per database details"""
+    return jsonify({"jobs": [job.to_dict(items=False) for job in JOBS.list()]})
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Progress of a job and the outcome for each database"""
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Progress of a job as server-sent events, one per change, ending with 'done'"""
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    
+    def generate():
+        state = job.to_dict()
+        yield sse_event('progress', state)
+        while state["status"] not in ('done', 'failed', 'cancelled'):
+            if job.wait(state["version"], timeout=JOB_EVENT_HEARTBEAT) == state["version"]:
+                # Nothing changed, keep proxies from closing the connection
+                yield ": keep-alive\n\n"
+                continue
+            state = job.to_dict()
+            yield sse_event('progress', state)
+        yield sse_event('done', state)
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Skip the databases a job has not started yet"""
+    job = JOBS.cancel(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/job_stats', methods=['GET'])
+def get_job_stats():
+    """Job worker pool usage"""
+    return jsonify(JOBS.get_stats())
+
+def get_table_details(connection, database, tables, columnar=False, exact=False):
+    """Columns, row count and sample rows of each table, as columnar blocks if asked.
+
+    Columns come from the schema cache and row counts are InnoDB's
+    estimates unless exact is set (see table_stats.py). Tables that do
+    not exist are left out of the result.
+    """
+    db_info = get_database_info(database)
+    if not db_info:
+        return {}
+    tables = [table for table in dict.fromkeys(tables) if table in db_info['tables']]
+    stats = TABLE_STATS.details(connection, database, tables, exact)
+    
+    details = {}
+    for table in tables:
+        columns = [(col['name'], col['type'], col['null'], col['key'], col['default'], col['extra'])
+                   for col in db_info['tables'][table]['columns']]
+        table_stats = stats[table]
+        counts = {
+            'row_count': table_stats['row_count'],
+            'row_count_exact': table_stats['row_count_exact'],
+            'row_count_pending': table_stats['row_count_pending']
         }
-    except mysql.connector.Error as err:
-        print(f"Error getting table details: {err}")
-        return None
-    finally:
-        cursor.close()
+        if columnar:
+            details[table] = {
+                'columns': rows_payload(['field', 'type', 'null', 'key', 'default', 'extra'], columns, True),
+                **counts,
+                'sample_data': rows_payload(table_stats['sample_columns'], table_stats['sample_rows'], True)
+            }
+        else:
+            details[table] = {
+                'columns': [{'field': col[0], 'type': col[1], 'null': col[2], 'key': col[3], 'default': col[4], 'extra': col[5]} for col in columns],
+                **counts,
+                'sample_data': [dict(zip(table_stats['sample_columns'], row)) for row in table_stats['sample_rows']]
+            }
+    return details
 
 @app.route('/visualize')
 def visualize():
@@ -897,6 +1274,72 @@ def get_relationships():
         if 'connection' in locals():
             connection.close()
 
+def schema_graph(database):
+    """Laid out foreign key graph of a database, None if its schema cannot be read"""
+    db_info = get_database_info(database)
+    if not db_info:
+        return None
+    with span('graph'):
+        return get_schema_graph(database, db_info)
+
+def graph_page_size(args):
+    return max(1, min(args.get('limit', GRAPH_PAGE_SIZE, type=int), GRAPH_MAX_PAGE_SIZE))
+
+@app.route('/api/graph', methods=['GET'])
+def get_graph():
+    """Size, bounds and components of the schema graph, for the overview"""
+    database = request.args.get('database')
+    if not database:
+        return jsonify({"error": "Database name is required"}), 400
+    try:
+        graph = schema_graph(database)
+        if graph is None:
+            return jsonify({"error": "Could not analyze database structure"}), 500
+        return jsonify({"database": database, **graph.summary()})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/graph/neighborhood', methods=['GET'])
+def get_graph_neighborhood():
+    """Tables within a few foreign key hops of one table"""
+    database = request.args.get('database')
+    table = request.args.get('table')
+    if not database or not table:
+        return jsonify({"error": "Database and table names are required"}), 400
+    depth = max(0, min(request.args.get('depth', 1, type=int), GRAPH_MAX_DEPTH))
+    try:
+        graph = schema_graph(database)
+        if graph is None:
+            return jsonify({"error": "Could not analyze database structure"}), 500
+        if table not in graph.adjacency:
+            return jsonify({"error": f"Table {table} does not exist"}), 404
+        return jsonify(graph.neighborhood(table, depth, graph_page_size(request.args)))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/graph/viewport', methods=['GET'])
+def get_graph_viewport():
+    """Tables positioned inside the visible rectangle, busiest first, paged by offset"""
+    database = request.args.get('database')
+    bounds = [request.args.get(name, type=float) for name in ('x0', 'y0', 'x1', 'y1')]
+    if not database or None in bounds:
+        return jsonify({"error": "Database name and x0, y0, x1, y1 are required"}), 400
+    if not all(math.isfinite(value) for value in bounds):
+        return jsonify({"error": "x0, y0, x1, y1 must be finite numbers"}), 400
+    offset = max(0, request.args.get('offset', 0, type=int))
+    try:
+        graph = schema_graph(database)
+        if graph is None:
+            return jsonify({"error": "Could not analyze database structure"}), 500
+        return jsonify(graph.viewport(*bounds, limit=graph_page_size(request.args), offset=offset))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/graph_stats', methods=['GET'])
+def graph_stats():
+    """Schema graph cache usage"""
+    return jsonify(get_graph_stats())
+
 @app.route('/api/table_details', methods=['GET'])
 def get_table_info():
     """Get detailed information about a specific table"""
@@ -911,18 +1354,136 @@ def get_table_info():
         if not connection:
             return jsonify({"error": "Could not connect to MySQL database"}), 500
             
-        details = get_table_details(connection, table)
-        if details is None:
+        fmt = requested_format(request)
+        exact = request.args.get('exact') in ('1', 'true')
+        details = get_table_details(connection, database, [table], is_columnar(fmt), exact)
+        if table not in details:
             return jsonify({"error": f"Could not get details for table {table}"}), 404
             
-        return jsonify(details)
+        return make_response(app, details[table], 200, fmt)
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     finally:
-        if 'connection' in locals():
+        if 'connection' in locals() and connection:
             connection.close()
 
+TABLE_DETAILS_BATCH_MAX = int(os.getenv("TABLE_DETAILS_BATCH_MAX", 500))
+
+@app.route('/api/table_details/batch', methods=['POST'])
+def get_tables_info():
+    """Details of many tables in one request, e.g. every node on screen in visualize.html"""
+    data = request.get_json(silent=True) or {}
+    database = data.get('database')
+    tables = data.get('tables')
+    
+    if not database or not isinstance(tables, list) or not all(isinstance(table, str) for table in tables):
+        return jsonify({"error": "A database and a list of table names are required"}), 400
+    if len(tables) > TABLE_DETAILS_BATCH_MAX:
+        return jsonify({"error": f"At most {TABLE_DETAILS_BATCH_MAX} tables per request"}), 400
+    
+    connection = get_db_connection(database)
+    if not connection:
+        return jsonify({"error": "Could not connect to MySQL database"}), 500
+    try:
+        fmt = requested_format(request)
+        details = get_table_details(connection, database, tables, is_columnar(fmt), bool(data.get('exact')))
+        return make_response(app, {
+            "tables": details,
+            "missing": [table for table in tables if table not in details]
+        }, 200, fmt)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        connection.close()
+
+@app.route('/api/table_details_stats', methods=['GET'])
+def get_table_details_stats():
+    """Row count and sample cache usage"""
+    return jsonify(TABLE_STATS.get_stats())
+
+@app.route('/api/cache_stats', methods=['GET'])
+def get_cache_stats():
+    """Schema cache usage, in memory and in the persistent store"""
+    return jsonify({**DB_CACHE.get_stats(), "store": SCHEMA_STORE.get_stats()})
+
+@app.route('/api/prompt_stats', methods=['GET'])
+def get_prompt_stats():
+    """Rendered prompt sizes and build times"""
+    return jsonify(prompt_stats())
+
+@app.route('/api/translation_cache_stats', methods=['GET'])
+def get_translation_cache_stats():
+    """NL to SQL translation cache usage"""
+    return jsonify(TRANSLATION_CACHE.get_stats())
+
+@app.route('/api/llm_stats', methods=['GET'])
+def get_llm_stats():
+    """LM Studio client usage"""
+    return jsonify(LLM_CLIENT.get_stats())
+
+@app.route('/api/result_cache_stats', methods=['GET'])
+def get_result_cache_stats():
+    """Read-only query result cache usage"""
+    return jsonify(RESULT_CACHE.get_stats())
+
+@app.route('/api/result_cursor_stats', methods=['GET'])
+def get_result_cursor_stats():
+    """Open paginated result cursors"""
+    return jsonify(RESULT_CURSORS.get_stats())
+
+@app.route('/api/session', methods=['GET'])
+def get_session():
+    """Selected database, tables seen and recent queries of the calling session"""
+    return jsonify(request_session().to_dict())
+
+@app.route('/api/session_stats', methods=['GET'])
+def get_session_stats():
+    """Active session contexts and evictions"""
+    return jsonify(SESSIONS.get_stats())
+
+@REGISTRY.collector
+def collect_stats():
+    """Cache, pool, model client and session counters, read on every /metrics scrape"""
+    caches = {"schema": DB_CACHE.get_stats(), "translation": TRANSLATION_CACHE.get_stats(),
+              "result": RESULT_CACHE.get_stats(), "table_stats": TABLE_STATS.get_stats(), "graph": get_graph_stats(),
+              "schema_store": SCHEMA_STORE.get_stats()}
+    cache_events = [({"cache": name, "event": event}, value) for name, stats in caches.items()
+                    for event, value in stats.items()
+                    if event in ('hits', 'disk_hits', 'misses', 'expired', 'stores', 'evictions', 'invalidations')]
+    pools = pool_stats()["pools"]
+    llm = LLM_CLIENT.get_stats()
+    return [
+        ("nlpdb_cache_events_total", "counter", "Cache hits, misses, evictions and invalidations", cache_events),
+        ("nlpdb_cache_entries", "gauge", "Entries held by each cache",
+         [({"cache": name}, stats["entries"]) for name, stats in caches.items()]),
+        ("nlpdb_result_cache_bytes", "gauge", "Estimated memory held by cached results",
+         [({}, caches["result"]["bytes"])]),
+        ("nlpdb_db_connections", "gauge", "Pooled MySQL connections by state",
+         [({"database": pool["database"] or "", "state": state}, pool[state])
+          for pool in pools for state in ('in_use', 'idle')]),
+        ("nlpdb_db_pool_events_total", "counter", "Connection pool events",
+         [({"database": pool["database"] or "", "event": event}, pool[event]) for pool in pools
+          for event in ('created', 'reused', 'discarded', 'waits', 'checkout_timeouts', 'health_check_failures')]),
+        ("nlpdb_llm_in_flight", "gauge", "Completions in flight at LM Studio", [({}, llm["in_flight"])]),
+        ("nlpdb_llm_events_total", "counter", "LM Studio requests, retries, failures and rejections",
+         [({"event": event}, llm[event]) for event in ('requests', 'retries', 'failures', 'rejected')]),
+        ("nlpdb_open_result_cursors", "gauge", "Paginated results holding a connection",
+         [({}, RESULT_CURSORS.get_stats()["open"])]),
+        ("nlpdb_sessions", "gauge", "Session contexts in memory", [({}, SESSIONS.get_stats()["sessions"])]),
+        ("nlpdb_jobs_active", "gauge", "Bulk database jobs queued or running", [({}, JOBS.get_stats()["active"])]),
+    ]
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics"""
+    return Response(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/pool_stats', methods=['GET'])
+def get_pool_stats():
+    """Connection pool usage, for sizing DB_POOL_SIZE"""
+    return jsonify(pool_stats())
+
 @app.route('/select_database', methods=['POST'])
 def select_database():
     """Endpoint to select a database and analyze its structure"""
@@ -933,8 +1494,8 @@ def select_database():
         if not database:
             return jsonify({"error": "Database name is required"}), 400
         
-        # Update database context
-        update_db_context(database=database)
+        # Update this session's context
+        request_session().update(database=database)
         
         # Get database information
         db_info = get_database_info(database)
@@ -951,5 +1512,32 @@ def select_database():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+_warmup = {"status": "disabled", "job": None}
+
+def start_schema_warmup():
+    """Introspect every database in the background with a warm job, requests are served meanwhile"""
+    def run():
+        databases = get_databases()
+        # Databases saved by earlier runs first, most recent first, they only need validating
+        cached = [database for database in SCHEMA_STORE.databases() if database in databases]
+        databases = (cached + [database for database in databases if database not in cached])[:DB_CACHE.max_entries]
+        if not databases:
+            _warmup["status"] = 'done'
+            return
+        _warmup["job"] = JOBS.submit('warm', databases, warm_database)
+        print(f"Warming the schema cache for {len(databases)} database(s), job {_warmup['job'].id}")
+    _warmup["status"] = 'starting'
+    threading.Thread(target=run, name="schema-warmup", daemon=True).start()
+
+@app.route('/api/warmup', methods=['GET'])
+def get_warmup():
+    """Progress of the startup warm-up, also listed under /jobs"""
+    if _warmup["job"] is None:
+        return jsonify({"status": _warmup["status"]})
+    return jsonify(_warmup["job"].to_dict(items=False))
+
+if SCHEMA_WARMUP:
+    start_schema_warmup()
+
 if __name__ == '__main__':
     app.run(port=5000, debug=True) 
\ No newline at end of file
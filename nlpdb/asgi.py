@@ -0,0 +1,278 @@
+"""ASGI entry point: NL queries run on asyncio, every other route on the Flask app.
+
+/query and /query/stream wait for LM Studio through AsyncLLMClient, so a
+request waiting on the model holds no thread. Schema lookups and SQL
+execution use the blocking MySQL driver and run on a bounded thread
+pool. All other routes (and NDJSON exports) go to the Flask app through
+asgiref's WsgiToAsgi adapter.
+
+    pip install asgiref httpx uvicorn
+    uvicorn asgi:application --port 5000
+"""
+import asyncio
+import contextvars
+import functools
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from asgiref.wsgi import WsgiToAsgi
+
+from app import (app, prepare_translation, build_sql_payload, finish_translation, execute_query,
+                 query_options, session_context, sse_event, add_trace)
+from llm_client import AsyncLLMClient, LLMBusyError
+from metrics import span, start_trace, observe_request
+from session_context import SESSION_HEADER
+from sql_utils import StatementEndDetector
+from wire_format import make_response, compress_response
+
+ASGI_DB_THREADS = int(os.getenv("ASGI_DB_THREADS", 32))
+
+DB_EXECUTOR = ThreadPoolExecutor(max_workers=ASGI_DB_THREADS, thread_name_prefix="nlpdb-db")
+ASYNC_LLM_CLIENT = AsyncLLMClient()
+wsgi_application = WsgiToAsgi(app)
+
+# The Flask app allows any origin (flask-cors defaults), keep that for the async routes
+CORS_HEADERS = [(b"access-control-allow-origin", b"*")]
+
+
+async def run_sync(func, *args, **kwargs):
+    """Run blocking MySQL work on the database thread pool, in this request's trace"""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(DB_EXECUTOR, functools.partial(context.run, func, *args, **kwargs))
+
+
+async def stream_sql(current_db, natural_language):
+    """Async version of app.stream_sql: ('token', text) events, then ('sql', query)"""
+    try:
+        fingerprint, cached_sql, prompt = await run_sync(prepare_translation, current_db, natural_language)
+        if cached_sql:
+            yield 'sql', cached_sql
+            return
+
+        generated = ''
+        detector = StatementEndDetector()
+        tokens = ASYNC_LLM_CLIENT.stream_chat_completion(build_sql_payload(prompt, stream=True))
+        try:
+            with span('llm'):
+                async for token in tokens:
+                    yield 'token', token
+                    generated += token
+                    if detector.feed(token):
+                        break
+        finally:
+            # Closing the token stream drops the HTTP response, which stops generation
+            await tokens.aclose()
+
+        # Stores the translation in the cache, whose SQLite writes must not block the event loop
+        yield 'sql', await run_sync(finish_translation, current_db, fingerprint, natural_language, detector, generated)
+
+    except LLMBusyError:
+        raise
+    except Exception as e:
+        raise Exception(f"Error converting to SQL: {str(e)}")
+
+
+async def convert_to_sql(current_db, natural_language):
+    events = stream_sql(current_db, natural_language)
+    try:
+        async for event, value in events:
+            if event == 'sql':
+                return value
+    finally:
+        await events.aclose()
+    raise Exception("Error converting to SQL: LM Studio returned no SQL")
+
+
+def _header(scope, name):
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+async def read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return body
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+def replay_body(body, receive):
+    """receive callable that hands an already read body to the WSGI adapter"""
+    sent = False
+
+    async def replay():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()
+    return replay
+
+
+async def send_response(scope, send, response):
+    """Send a buffered Flask response object"""
+    response = compress_response(_header(scope, b"accept-encoding"), response)
+    body = response.get_data()
+    headers = [(key.lower().encode("latin-1"), value.encode("latin-1")) for key, value in response.headers.items()]
+    await send({"type": "http.response.start", "status": response.status_code, "headers": headers + CORS_HEADERS})
+    await send({"type": "http.response.body", "body": body})
+
+
+def _session(scope, data):
+    return session_context(_header(scope, SESSION_HEADER.lower().encode()) or data.get('session_id'))
+
+
+def _parse_request(body):
+    try:
+        data = json.loads(body or b"{}")
+    except ValueError:
+        return None, {"error": "Request body must be JSON"}
+    if not isinstance(data, dict):
+        return None, {"error": "Request body must be JSON"}
+    if not data.get('database'):
+        return None, {"error": "No database selected. Please select a database first."}
+    if not data.get('message'):
+        return None, {"error": "Message is required"}
+    return data, None
+
+
+async def query(scope, body, receive, send):
+    """Async /query, returns False to hand the request to the Flask route instead"""
+    data, error = _parse_request(body)
+    if error:
+        await send_response(scope, send, make_response(app, error, 400))
+        return True
+
+    query_format = parse_qs(scope.get("query_string", b"").decode()).get("format", [None])[0]
+    fmt, options = query_options(data, query_format, _header(scope, b"accept"))
+    if fmt == 'ndjson':
+        # Exports stream from a blocking cursor, leave them to the WSGI app
+        return False
+
+    selected_database = data['database']
+    session = _session(scope, data)
+    session.update(database=selected_database)
+    sql_query = None
+    try:
+        sql_query = await convert_to_sql(selected_database, data['message'])
+        response, status = await run_sync(execute_query, selected_database, sql_query, session=session, **options)
+        result = make_response(app, add_trace(response, data), status, fmt)
+    except LLMBusyError as e:
+        result = make_response(app, {"sql": None, "error": str(e)}, 503)
+    except Exception as e:
+        result = make_response(app, {"sql": sql_query, "error": str(e)}, 500)
+    await send_response(scope, send, result)
+    return True
+
+
+async def query_stream(scope, body, receive, send):
+    """Async /query/stream, same server-sent events as the Flask route"""
+    data, error = _parse_request(body)
+    if error:
+        await send_response(scope, send, make_response(app, error, 400))
+        return True
+
+    _, options = query_options(data, None, _header(scope, b"accept"))
+    selected_database = data['database']
+    session = _session(scope, data)
+    session.update(database=selected_database)
+
+    # Stop generating as soon as the browser goes away
+    disconnected = asyncio.Event()
+
+    async def watch_disconnect():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        disconnected.set()
+    watcher = asyncio.create_task(watch_disconnect())
+
+    async def emit(text):
+        await send({"type": "http.response.body", "body": text.encode(), "more_body": True})
+
+    await send({"type": "http.response.start", "status": 200, "headers": [
+        (b"content-type", b"text/event-stream; charset=utf-8"),
+        (b"cache-control", b"no-cache"),
+        (b"x-accel-buffering", b"no"),
+    ] + CORS_HEADERS})
+
+    sql_query = None
+    events = stream_sql(selected_database, data['message'])
+    try:
+        async for event, value in events:
+            if disconnected.is_set():
+                return True
+            if event == 'token':
+                await emit(sse_event('token', {"text": value}))
+            else:
+                sql_query = value
+                await emit(sse_event('sql', {"sql": sql_query}))
+
+        response, status = await run_sync(execute_query, selected_database, sql_query, session=session,
+                                          **options)
+        response["status"] = status
+        await emit(sse_event('result', add_trace(response, data)))
+    except Exception as e:
+        await emit(sse_event('error', {"sql": sql_query, "error": str(e)}))
+    finally:
+        await events.aclose()
+        watcher.cancel()
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+    return True
+
+
+async def llm_stats(scope, body, receive, send):
+    stats = {"llm": ASYNC_LLM_CLIENT.get_stats(), "db_threads": ASGI_DB_THREADS}
+    await send_response(scope, send, make_response(app, stats))
+    return True
+
+
+ROUTES = {
+    ("POST", "/query"): query,
+    ("POST", "/query/stream"): query_stream,
+    ("GET", "/api/async_llm_stats"): llm_stats,
+}
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await ASYNC_LLM_CLIENT.aclose()
+            DB_EXECUTOR.shutdown(wait=False)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+
+    route = ROUTES.get((scope.get("method"), scope.get("path"))) if scope["type"] == "http" else None
+    if route is None:
+        await wsgi_application(scope, receive, send)
+        return
+
+    trace = start_trace()
+
+    async def send_and_record(message):
+        if message["type"] == "http.response.start":
+            # Streamed responses are measured up to their first byte, like the Flask routes
+            observe_request(scope["path"], scope["method"], message["status"], trace.to_dict()["total_seconds"])
+            if trace.stages:
+                message["headers"] = list(message["headers"]) + [(b"server-timing", trace.server_timing().encode())]
+        await send(message)
+
+    body = await read_body(receive)
+    if not await route(scope, body, receive, send_and_record):
+        await wsgi_application(scope, replay_body(body, receive), send)
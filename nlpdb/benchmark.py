@@ -0,0 +1,154 @@
+"""Load test the app against the stub LLM server and an in-process fake MySQL.
+
+    python benchmark.py --tables 10,200,2000 --concurrency 8 --requests 200
+    python benchmark.py --llm-latency 0.5 --db-latency 0.001 --routes query
+
+For every schema size a synthetic database is seeded (fake_mysql.py), the
+app is served on a local port in a background thread and each route is
+hit by concurrent clients. Latency percentiles and throughput are printed
+per route, and written as JSON with --output to compare runs.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from fake_mysql import FakeServer, SyntheticSchema, install
+from stub_llm_server import start_stub_server
+
+ROUTES = ('select_database', 'query', 'relationships', 'table_details')
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def route_request(route, database, tables, i, distinct_questions):
+    """(method, path, requests kwargs) for the i-th request to a route"""
+    if route == 'select_database':
+        return 'POST', '/select_database', {"json": {"database": database}}
+    if route == 'query':
+        table = tables[i % len(tables)]
+        return 'POST', '/query', {"json": {
+            "message": f"show the rows of {table} ({i % distinct_questions})",
+            "database": database,
+            "session_id": f"benchmark-session-{i % 32:02d}"
+        }}
+    if route == 'relationships':
+        return 'GET', '/api/relationships', {"params": {"database": database}}
+    return 'GET', '/api/table_details', {"params": {"database": database, "table": tables[i % len(tables)]}}
+
+
+def run_route(base_url, route, database, tables, args):
+    """Send args.requests requests from args.concurrency clients, returns the measurements"""
+    local = threading.local()
+
+    def send(i):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        method, path, kwargs = route_request(route, database, tables, i, args.distinct_questions)
+        start = time.perf_counter()
+        try:
+            response = local.session.request(method, base_url + path, timeout=args.timeout, **kwargs)
+            response.content
+            ok = response.status_code < 400
+        except requests.RequestException:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as clients:
+        list(clients.map(send, range(args.warmup)))
+        start = time.perf_counter()
+        results = list(clients.map(send, range(args.warmup, args.warmup + args.requests)))
+        elapsed = time.perf_counter() - start
+
+    latencies = [seconds for seconds, ok in results if ok]
+    return {
+        "route": route,
+        "requests": len(results),
+        "errors": sum(1 for _, ok in results if not ok),
+        "throughput": len(results) / elapsed if elapsed else 0.0,
+        "p50_ms": (percentile(latencies, 0.50) or 0) * 1000,
+        "p95_ms": (percentile(latencies, 0.95) or 0) * 1000,
+        "p99_ms": (percentile(latencies, 0.99) or 0) * 1000
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the NL-SQL app with a stub model and fake MySQL")
+    parser.add_argument("--tables", default="10,200,2000", help="comma separated schema sizes")
+    parser.add_argument("--routes", default=",".join(ROUTES), help=f"comma separated, from {', '.join(ROUTES)}")
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per route")
+    parser.add_argument("--warmup", type=int, default=10, help="unmeasured requests per route")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds before the model answers")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="seconds between streamed chunks")
+    parser.add_argument("--db-latency", type=float, default=0.0005, help="seconds per MySQL round trip")
+    parser.add_argument("--distinct-questions", type=int, default=50,
+                        help="questions cycled through by the query route, repeats hit the translation cache")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.tables.split(',')]
+    routes = [route for route in args.routes.split(',') if route]
+    output = os.path.abspath(args.output) if args.output else None
+
+    server = install(FakeServer(latency=args.db_latency))
+    for size in sizes:
+        server.add_database(f"bench_{size}", SyntheticSchema(size, seed=args.seed))
+
+    def reply(payload):
+        # A SELECT on a table named in the question, so execution has something to do
+        question = payload["messages"][-1]["content"].rsplit("Now convert this request:", 1)[-1]
+        table = next((word for word in question.split() if '_' in word and word[-4:].isdigit()), None)
+        return f"SELECT * FROM {table};" if table else "SHOW TABLES;"
+    stub = start_stub_server(latency=args.llm_latency, token_latency=args.token_latency, reply=reply)
+    os.environ["LLM_API_URL"] = stub.url
+
+    # The app keeps its schema cache file in the working directory, keep it out of the checkout
+    os.chdir(tempfile.mkdtemp(prefix="nlpdb-benchmark-"))
+    from werkzeug.serving import make_server
+    from app import app
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    http = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=http.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{http.server_port}"
+
+    print(f"{'tables':>6}  {'route':<16}{'requests':>9}{'errors':>7}{'req/s':>9}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    report = []
+    for size in sizes:
+        database = f"bench_{size}"
+        tables = sorted(server.databases[database].tables)
+        for route in routes:
+            result = run_route(base_url, route, database, tables, args)
+            result["tables"] = size
+            report.append(result)
+            print(f"{size:>6}  {route:<16}{result['requests']:>9}{result['errors']:>7}{result['throughput']:>9.1f}"
+                  f"{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}{result['p99_ms']:>9.1f}")
+
+    print(f"\nLLM requests: {stub.requests_served}, MySQL queries: {server.queries}")
+    if output:
+        with open(output, 'w') as f:
+            json.dump({"args": vars(args), "results": report}, f, indent=2)
+    http.shutdown()
+    stub.shutdown()
+
+
+if __name__ == '__main__':
+    main()
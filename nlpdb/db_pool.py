@@ -0,0 +1,319 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+import mysql.connector
+
+# Pool sizing, all overridable through the environment (.env is loaded by app.py)
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+POOL_MAX_POOLS = int(os.getenv("DB_POOL_MAX_POOLS", 32))
+POOL_CHECKOUT_TIMEOUT = float(os.getenv("DB_POOL_CHECKOUT_TIMEOUT", 10))
+POOL_IDLE_TIMEOUT = float(os.getenv("DB_POOL_IDLE_TIMEOUT", 300))
+POOL_HEALTH_CHECK_INTERVAL = float(os.getenv("DB_POOL_HEALTH_CHECK_INTERVAL", 30))
+# Open connections across all pools, below MySQL's default max_connections of 151
+POOL_MAX_CONNECTIONS = int(os.getenv("DB_POOL_MAX_CONNECTIONS", 100))
+
+
+class PoolExhaustedError(mysql.connector.Error):
+    """Raised when no pooled connection becomes available in time"""
+
+
+# Every open connection counts, idle or checked out, including those of evicted pools
+_budget = threading.Condition()
+_budget_used = 0
+
+
+def _reserve_connection(pool, deadline):
+    """Count a new connection against POOL_MAX_CONNECTIONS, closing idle ones of other pools to make room"""
+    global _budget_used
+    while True:
+        with _budget:
+            if _budget_used < POOL_MAX_CONNECTIONS:
+                _budget_used += 1
+                return
+        if _close_idle_elsewhere(pool):
+            continue
+        with _budget:
+            if _budget_used < POOL_MAX_CONNECTIONS:
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise PoolExhaustedError(
+                    msg=f"Connection limit reached ({POOL_MAX_CONNECTIONS} connections open across all pools)"
+                )
+            # Woken when a connection closes or goes back to an idle queue
+            _budget.wait(remaining)
+
+
+def _release_connection(count=1):
+    global _budget_used
+    if count:
+        with _budget:
+            _budget_used -= count
+            _budget.notify_all()
+
+
+def _close_idle_elsewhere(pool):
+    """Close the oldest idle connection of the least recently used other pool, True if one was closed"""
+    with _pools_lock:
+        pools = [other for other in _pools.values() if other is not pool]
+    for other in pools:
+        connection = other.take_idle()
+        if connection is not None:
+            try:
+                connection.close()
+            except Exception:
+                pass
+            _release_connection()
+            return True
+    return False
+
+
+class PooledConnection:
+    """Wrapper around a MySQL connection that returns it to its pool on close()"""
+
+    def __init__(self, pool, connection):
+        self._pool = pool
+        self._connection = connection
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def close(self):
+        if not self._released:
+            self._released = True
+            self._pool.release(self._connection)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class ConnectionPool:
+    """Bounded pool of connections to a single schema (or to the server when database is None)"""
+
+    def __init__(self, config, database=None, size=POOL_SIZE):
+        self.config = config
+        self.database = database
+        self.size = size
+        self._idle = deque()  # (connection, last_used, last_checked)
+        self._in_use = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self.stats = {
+            "created": 0,
+            "reused": 0,
+            "discarded": 0,
+            "evicted_idle": 0,
+            "health_check_failures": 0,
+            "checkout_timeouts": 0,
+            "waits": 0,
+        }
+
+    def _connect(self, deadline):
+        config = self.config.copy()
+        if self.database:
+            config["database"] = self.database
+        _reserve_connection(self, deadline)
+        try:
+            connection = mysql.connector.connect(**config)
+        except Exception:
+            _release_connection()
+            raise
+        with self._condition:
+            self.stats["created"] += 1
+        return connection
+
+    def _is_healthy(self, connection, last_checked):
+        """Ping connections that have been idle longer than the health check interval"""
+        if time.monotonic() - last_checked < POOL_HEALTH_CHECK_INTERVAL:
+            return True
+        try:
+            connection.ping(reconnect=False)
+            return True
+        except Exception:
+            with self._condition:
+                self.stats["health_check_failures"] += 1
+            return False
+
+    def _discard(self, connection):
+        with self._condition:
+            self.stats["discarded"] += 1
+        try:
+            connection.close()
+        except Exception:
+            pass
+        _release_connection()
+
+    def take_idle(self):
+        """Remove the oldest idle connection for closing elsewhere, None when there is none"""
+        with self._condition:
+            if not self._idle:
+                return None
+            self.stats["evicted_idle"] += 1
+            return self._idle.popleft()[0]
+
+    def evict_idle(self):
+        """Close connections that have sat idle longer than the idle timeout"""
+        now = time.monotonic()
+        expired = []
+        with self._condition:
+            while self._idle and now - self._idle[0][1] > POOL_IDLE_TIMEOUT:
+                expired.append(self._idle.popleft()[0])
+            self.stats["evicted_idle"] += len(expired)
+        for connection in expired:
+            try:
+                connection.close()
+            except Exception:
+                pass
+        _release_connection(len(expired))
+        return len(expired)
+
+    def acquire(self, timeout=POOL_CHECKOUT_TIMEOUT):
+        self.evict_idle()
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._condition:
+                candidate = None
+                if self._idle:
+                    # Most recently used connection first, so idle ones at the left can age out
+                    candidate = self._idle.pop()
+                    self._in_use += 1
+                elif self._in_use < self.size:
+                    self._in_use += 1
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.stats["checkout_timeouts"] += 1
+                        raise PoolExhaustedError(
+                            msg=f"Connection pool for '{self.database or '<server>'}' exhausted "
+                                f"({self.size} connections in use)"
+                        )
+                    self.stats["waits"] += 1
+                    self._condition.wait(remaining)
+                    continue
+
+            # Health checks and handshakes happen outside the lock
+            try:
+                if candidate:
+                    connection, _, last_checked = candidate
+                    if self._is_healthy(connection, last_checked):
+                        with self._condition:
+                            self.stats["reused"] += 1
+                        return PooledConnection(self, connection)
+                    self._discard(connection)
+                return PooledConnection(self, self._connect(deadline))
+            except Exception:
+                with self._condition:
+                    self._in_use -= 1
+                    self._condition.notify()
+                raise
+
+    def release(self, connection):
+        """Reset a connection's session state and put it back in the idle queue.
+
+        Connections released to a closed pool, e.g. one evicted past
+        POOL_MAX_POOLS while they were checked out, are closed instead.
+        """
+        healthy = True
+        try:
+            if connection.in_transaction:
+                connection.rollback()
+            # Generated SQL may have switched schemas with USE, switch back before reuse
+            if self.database:
+                connection.cmd_init_db(self.database)
+        except Exception:
+            healthy = False
+
+        with self._condition:
+            self._in_use -= 1
+            keep = healthy and not self._closed
+            if keep:
+                now = time.monotonic()
+                self._idle.append((connection, now, now))
+            self._condition.notify()
+        if not keep:
+            self._discard(connection)
+        else:
+            # A pool waiting for room may close this idle connection now
+            with _budget:
+                _budget.notify_all()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            idle = [entry[0] for entry in self._idle]
+            self._idle.clear()
+        for connection in idle:
+            try:
+                connection.close()
+            except Exception:
+                pass
+        _release_connection(len(idle))
+
+    def get_stats(self):
+        with self._condition:
+            return {
+                "database": self.database,
+                "size": self.size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                **self.stats,
+            }
+
+
+_pools = OrderedDict()
+_pools_lock = threading.Lock()
+
+
+def get_pool(config, database=None):
+    """Get (or create) the pool for a schema, closing the least recently used pool past the limit"""
+    with _pools_lock:
+        pool = _pools.get(database)
+        if pool is None:
+            pool = ConnectionPool(config, database)
+            _pools[database] = pool
+        _pools.move_to_end(database)
+
+        stale = []
+        while len(_pools) > POOL_MAX_POOLS:
+            _, oldest = _pools.popitem(last=False)
+            stale.append(oldest)
+    for oldest in stale:
+        oldest.close()
+    return pool
+
+
+def drop_pool(database):
+    """Close the pool of a schema, e.g. after the database has been dropped"""
+    with _pools_lock:
+        pool = _pools.pop(database, None)
+    if pool:
+        pool.close()
+
+
+def close_all_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+def pool_stats():
+    """Usage statistics of every pool, for sizing DB_POOL_SIZE"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    with _budget:
+        open_connections = _budget_used
+    return {
+        "pool_size": POOL_SIZE,
+        "max_pools": POOL_MAX_POOLS,
+        "max_connections": POOL_MAX_CONNECTIONS,
+        "open_connections": open_connections,
+        "pools": [pool.get_stats() for pool in pools],
+    }
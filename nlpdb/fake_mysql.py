@@ -0,0 +1,255 @@
+"""In-process stand-in for MySQL, used by the benchmarks.
+
+Answers the statements the app issues (INFORMATION_SCHEMA introspection,
+SHOW TABLES, DESCRIBE, COUNT(*), sample rows, EXPLAIN and simple SELECTs)
+from synthetic schemas, so the app can be load tested without a MySQL
+server. install() replaces mysql.connector.connect for the process.
+"""
+import datetime
+import json
+import random
+import re
+import threading
+import time
+import zlib
+
+import mysql.connector
+
+_COLUMN_TYPES = ['varchar(64)', 'varchar(255)', 'int', 'bigint', 'decimal(10,2)', 'datetime', 'date',
+                 'tinyint(1)', 'text']
+_WORDS = ['customer', 'order', 'product', 'invoice', 'payment', 'shipment', 'supplier', 'employee',
+          'account', 'address', 'category', 'review', 'warehouse', 'stock', 'region', 'contract']
+_FIELDS = ['name', 'status', 'amount', 'created_at', 'updated_at', 'price', 'quantity', 'email',
+           'phone', 'code', 'description', 'total', 'notes', 'city', 'country', 'rating']
+SYSTEM_DATABASES = ['information_schema', 'mysql', 'performance_schema', 'sys']
+
+
+class SyntheticSchema:
+    """A database of generated tables linked by foreign keys"""
+
+    def __init__(self, tables=100, seed=0, max_rows=100000):
+        rng = random.Random(seed)
+        self.tables = {}
+        names = []
+        for i in range(tables):
+            name = f"{_WORDS[i % len(_WORDS)]}_{i:04d}"
+            columns = [('id', 'int', 'NO', 'PRI', None, 'auto_increment')]
+            foreign_keys = []
+            # Most tables reference one or two earlier ones, like a typical OLTP schema
+            for referenced in rng.sample(names, min(len(names), rng.choice([0, 1, 1, 2]))):
+                column = f"{referenced}_id"
+                columns.append((column, 'int', 'YES', 'MUL', None, ''))
+                foreign_keys.append((column, referenced, 'id'))
+            for field in rng.sample(_FIELDS, rng.randint(2, 10)):
+                columns.append((field, rng.choice(_COLUMN_TYPES), 'YES', '', None, ''))
+            self.tables[name] = {
+                'columns': columns,
+                'foreign_keys': foreign_keys,
+                'rows': rng.randint(0, max_rows),
+                'created': datetime.datetime(2024, 1, 1) + datetime.timedelta(minutes=i)
+            }
+            names.append(name)
+
+    def sample_rows(self, table, limit):
+        info = self.tables[table]
+        rows = []
+        for row_id in range(1, min(limit, info['rows']) + 1):
+            row = []
+            for name, col_type, *_ in info['columns']:
+                if name == 'id' or name.endswith('_id'):
+                    row.append(row_id)
+                elif col_type.startswith(('int', 'bigint', 'tinyint')):
+                    row.append(row_id % 100)
+                elif col_type.startswith('decimal'):
+                    row.append(row_id * 1.5)
+                elif col_type.startswith('date'):
+                    row.append(info['created'] + datetime.timedelta(days=row_id))
+                else:
+                    row.append(f"{name} {row_id}")
+            rows.append(tuple(row))
+        return rows
+
+
+class FakeServer:
+    """Databases the fake connections see, and the simulated round trip time"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.databases = {}
+        self.queries = 0
+        self._lock = threading.Lock()
+
+    def add_database(self, name, schema):
+        self.databases[name] = schema
+
+    def count(self):
+        with self._lock:
+            self.queries += 1
+
+
+_SELECT_FROM = re.compile(r"\bfrom\s+`?(\w+)`?(?:\s|;|$)", re.I)
+_LIMIT = re.compile(r"\blimit\s+(\d+)", re.I)
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.description = None
+        self.with_rows = False
+        self.rowcount = -1
+        self.lastrowid = None
+        self._rows = []
+
+    def _result(self, columns, rows):
+        self.description = [(column,) for column in columns]
+        self.with_rows = True
+        self._rows = list(rows)
+        self.rowcount = len(self._rows)
+
+    def execute(self, statement, params=None):
+        server = self.connection.server
+        server.count()
+        if server.latency:
+            time.sleep(server.latency)
+        self.description = None
+        self.with_rows = False
+        self._rows = []
+        self.rowcount = 0
+        self._dispatch(' '.join(statement.split()), list(params or []))
+
+    def _schema(self, name=None):
+        name = name or self.connection.database
+        schema = self.connection.server.databases.get(name)
+        if schema is None:
+            raise mysql.connector.ProgrammingError(msg=f"Unknown database '{name}'", errno=1049)
+        return schema
+
+    def _table(self, name):
+        schema = self._schema()
+        if name not in schema.tables:
+            raise mysql.connector.ProgrammingError(
+                msg=f"Table '{self.connection.database}.{name}' doesn't exist", errno=1146)
+        return schema.tables[name]
+
+    def _dispatch(self, sql, params):
+        lower = sql.lower()
+        if lower.startswith('show databases'):
+            self._result(['Database'], [(name,) for name in SYSTEM_DATABASES + sorted(self.connection.server.databases)])
+        elif lower.startswith('show tables like'):
+            name = sql.split("'")[1]
+            self._result(['Tables'], [(name,)] if name in self._schema().tables else [])
+        elif lower.startswith('show tables'):
+            self._result([f"Tables_in_{self.connection.database}"], [(name,) for name in sorted(self._schema().tables)])
+        elif lower.startswith(('describe ', 'desc ')):
+            self._result(['Field', 'Type', 'Null', 'Key', 'Default', 'Extra'], self._table(sql.split()[1].strip('`;'))['columns'])
+        elif 'information_schema' in lower:
+            self._information_schema(lower, params)
+        elif lower.startswith('explain'):
+            table = _SELECT_FROM.search(sql)
+            rows = self._table(table.group(1))['rows'] if table else 1
+            plan = {"query_block": {"cost_info": {"query_cost": str(rows * 0.1)},
+                                    "table": {"rows_examined_per_scan": rows, "rows_produced_per_join": rows}}}
+            self._result(['EXPLAIN'], [(json.dumps(plan),)])
+        elif lower.startswith('select count(*) from'):
+            self._result(['COUNT(*)'], [(self._table(sql.split()[3].strip('`;'))['rows'],)])
+        elif lower.startswith(('select', 'with')):
+            table = _SELECT_FROM.search(sql)
+            if not table:
+                self._result(['1'], [(1,)])
+                return
+            info = self._table(table.group(1))
+            limit = _LIMIT.search(sql)
+            rows = self._schema().sample_rows(table.group(1), int(limit.group(1)) if limit else info['rows'])
+            self._result([column[0] for column in info['columns']], rows)
+        elif lower.startswith(('create database', 'drop database')):
+            name = sql.split()[-1].strip('`;')
+            if lower.startswith('create') and name not in self.connection.server.databases:
+                self.connection.server.add_database(name, SyntheticSchema(0))
+            elif lower.startswith('drop'):
+                self.connection.server.databases.pop(name, None)
+        # Anything else (DML, DDL) succeeds without changing the synthetic data
+
+    def _information_schema(self, sql, params):
+        schema = self._schema(params[0] if params else None)
+        wanted = set(params[1:]) if len(params) > 1 and 'table_name in' in sql else None
+        tables = [name for name in sorted(schema.tables) if wanted is None or name in wanted]
+        if 'column_checksum' in sql:
+            rows = []
+            for name in tables:
+                info = schema.tables[name]
+                column_checksum = sum(zlib.crc32(':'.join(map(str, column)).encode()) for column in info['columns'])
+                key_checksum = sum(zlib.crc32(':'.join(fk).encode()) for fk in info['foreign_keys'])
+                rows.append((name, info['created'], None, len(info['columns']), column_checksum, key_checksum))
+            self._result(['TABLE_NAME', 'CREATE_TIME', 'UPDATE_TIME', 'column_count', 'column_checksum',
+                          'key_checksum'], rows)
+        elif 'from information_schema.columns' in sql:
+            self._result(['TABLE_NAME', 'COLUMN_NAME', 'COLUMN_TYPE', 'IS_NULLABLE', 'COLUMN_KEY',
+                          'COLUMN_DEFAULT', 'EXTRA'],
+                         [(name,) + column for name in tables for column in schema.tables[name]['columns']])
+        elif 'from information_schema.key_column_usage' in sql:
+            rows = []
+            for name in tables:
+                rows.append((name, 'id', 'PRIMARY', None, None))
+                rows.extend((name, column, f"fk_{name}_{column}", referenced, referenced_column)
+                            for column, referenced, referenced_column in schema.tables[name]['foreign_keys'])
+            self._result(['TABLE_NAME', 'COLUMN_NAME', 'CONSTRAINT_NAME', 'REFERENCED_TABLE_NAME',
+                          'REFERENCED_COLUMN_NAME'], rows)
+        elif 'from information_schema.tables' in sql and 'table_rows' in sql:
+            self._result(['TABLE_NAME', 'TABLE_ROWS'], [(name, schema.tables[name]['rows']) for name in tables])
+        elif 'from information_schema.tables' in sql:
+            self._result(['TABLE_NAME'], [(name,) for name in tables])
+        else:
+            raise mysql.connector.ProgrammingError(msg=f"fake_mysql cannot answer: {sql[:200]}")
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchmany(self, size=1):
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def close(self):
+        self._rows = []
+
+
+class FakeConnection:
+    def __init__(self, server, database=None):
+        self.server = server
+        self.database = database
+        self.in_transaction = False
+        self._connected = True
+
+    def cursor(self, *args, **kwargs):
+        return FakeCursor(self)
+
+    def cmd_init_db(self, database):
+        self.database = database
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def ping(self, reconnect=False):
+        if not self._connected:
+            raise mysql.connector.InterfaceError(msg="Connection closed")
+
+    def is_connected(self):
+        return self._connected
+
+    def close(self):
+        self._connected = False
+
+
+def install(server):
+    """Route every mysql.connector.connect() in this process to the fake server"""
+    mysql.connector.connect = lambda **config: FakeConnection(server, config.get('database'))
+    return server
@@ -0,0 +1,195 @@
+"""Background jobs that run one operation over many databases.
+
+Every database of a job is a separate task on one shared, bounded worker
+pool, so a bulk drop or warm-up runs several databases at once without
+opening more connections than the pool allows. Jobs record per database
+progress, which clients poll or follow as server-sent events.
+"""
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 4))
+JOB_MAX_ITEMS = int(os.getenv("JOB_MAX_ITEMS", 1000))
+JOB_MAX_JOBS = int(os.getenv("JOB_MAX_JOBS", 100))
+JOB_RETENTION = float(os.getenv("JOB_RETENTION", 3600))
+
+FINISHED = ('done', 'failed', 'cancelled')
+
+
+class Job:
+    """One operation over a list of databases, with the progress of each"""
+
+    def __init__(self, kind, databases):
+        self.id = secrets.token_urlsafe(12)
+        self.kind = kind
+        self.status = 'queued'
+        self.created = time.time()
+        self.finished = None
+        self.items = OrderedDict((database, {"status": "queued", "stage": None, "result": None,
+                                             "error": None, "seconds": None})
+                                 for database in dict.fromkeys(databases))
+        self.version = 0
+        self._cancelled = False
+        self._changed = threading.Condition()
+
+    def _update(self, database=None, **fields):
+        with self._changed:
+            if database is not None:
+                self.items[database].update(fields)
+            counts = self._counts()
+            if self.status == 'queued' and counts["running"]:
+                self.status = 'running'
+            if counts["queued"] == 0 and counts["running"] == 0 and self.status not in FINISHED:
+                self.status = 'cancelled' if self._cancelled else ('failed' if counts["failed"] else 'done')
+                self.finished = time.time()
+            self.version += 1
+            self._changed.notify_all()
+
+    def _counts(self):
+        counts = {"queued": 0, "running": 0, "done": 0, "failed": 0, "cancelled": 0}
+        for item in self.items.values():
+            counts[item["status"]] += 1
+        return counts
+
+    def cancel(self):
+        """Skip the databases not started yet, running ones finish"""
+        with self._changed:
+            self._cancelled = True
+            for item in self.items.values():
+                if item["status"] == 'queued':
+                    item["status"] = 'cancelled'
+        self._update()
+
+    def wait(self, version=None, timeout=None):
+        """Block until the job changes after version, or finishes; returns the current version"""
+        with self._changed:
+            self._changed.wait_for(
+                lambda: self.status in FINISHED or (version is not None and self.version != version), timeout)
+            return self.version
+
+    @property
+    def done(self):
+        return self.status in FINISHED
+
+    def to_dict(self, items=True):
+        with self._changed:
+            counts = self._counts()
+            job = {
+                "id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "total": len(self.items),
+                "completed": counts["done"] + counts["failed"] + counts["cancelled"],
+                "succeeded": counts["done"],
+                "failed": counts["failed"],
+                "running": counts["running"],
+                "created": self.created,
+                "finished": self.finished,
+                "version": self.version
+            }
+            if items:
+                job["items"] = {database: dict(item) for database, item in self.items.items()}
+            return job
+
+
+class JobManager:
+    """Runs jobs on a shared worker pool and keeps finished ones for a while"""
+
+    def __init__(self, workers=JOB_WORKERS, max_jobs=JOB_MAX_JOBS, retention=JOB_RETENTION):
+        self.workers = workers
+        self.max_jobs = max_jobs
+        self.retention = retention
+        self._jobs = OrderedDict()
+        self._executor = None
+        self._lock = threading.Lock()
+        self.stats = {"submitted": 0, "items_done": 0, "items_failed": 0, "cancelled": 0}
+
+    def submit(self, kind, databases, operation):
+        """Start operation(database, stage) for every database, returns the Job.
+
+        stage(name) lets the operation report what it is doing. Its return
+        value is kept as the database's result, an exception marks the
+        database as failed without stopping the others.
+        """
+        job = Job(kind, databases)
+        with self._lock:
+            self._evict()
+            self._jobs[job.id] = job
+            self.stats["submitted"] += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+            executor = self._executor
+        for database in job.items:
+            executor.submit(self._run, job, database, operation)
+        return job
+
+    def _run(self, job, database, operation):
+        with job._changed:
+            # Cancelled before a worker got to it
+            if job.items[database]["status"] != 'queued':
+                return
+            job.items[database]["status"] = 'running'
+        start = time.perf_counter()
+        job._update()
+        try:
+            result = operation(database, lambda stage: job._update(database, stage=stage))
+        except Exception as e:
+            print(f"Job {job.kind} failed for {database}: {e}")
+            job._update(database, status='failed', error=str(e), seconds=time.perf_counter() - start)
+            with self._lock:
+                self.stats["items_failed"] += 1
+            return
+        job._update(database, status='done', stage=None, result=result, seconds=time.perf_counter() - start)
+        with self._lock:
+            self.stats["items_done"] += 1
+
+    def _evict(self):
+        # Finished jobs past their retention first, then the oldest finished ones over the limit
+        now = time.time()
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.done and now - job.finished > self.retention]:
+            del self._jobs[job_id]
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        while len(self._jobs) >= self.max_jobs and finished:
+            del self._jobs[finished.pop(0)]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            self._evict()
+            return list(self._jobs.values())
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None and not job.done:
+            job.cancel()
+            with self._lock:
+                self.stats["cancelled"] += 1
+        return job
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            if not job.done:
+                job.cancel()
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def get_stats(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+            return {
+                "jobs": len(jobs),
+                "active": sum(1 for job in jobs if not job.done),
+                "workers": self.workers,
+                "max_jobs": self.max_jobs,
+                **self.stats
+            }
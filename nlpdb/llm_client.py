@@ -0,0 +1,294 @@
+"""HTTP client for the LM Studio (OpenAI compatible) chat completions API.
+
+A single keep-alive session is shared by all Flask threads. Calls have
+connect/read timeouts, bounded retries with exponential backoff for
+connection failures and 5xx replies, and a concurrency limit so a slow
+model cannot tie up every worker thread. AsyncLLMClient does the same
+on asyncio for the ASGI entry point, where a waiting request holds no
+thread at all.
+"""
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx  # only needed by AsyncLLMClient
+except ImportError:
+    httpx = None
+
+LLM_API_URL = os.getenv("LLM_API_URL", "http://127.0.0.1:1234/v1/chat/completions")
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", 3))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", 120))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 2))
+LLM_RETRY_BACKOFF = float(os.getenv("LLM_RETRY_BACKOFF", 0.5))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 4))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", 30))
+
+RETRY_STATUS_CODES = (502, 503, 504)
+
+
+class LLMError(Exception):
+    """The completions API could not produce an answer"""
+
+
+class LLMBusyError(LLMError):
+    """Too many completions are already in flight"""
+
+
+class _ClientStats:
+    def __init__(self):
+        self._stats_lock = threading.Lock()
+        self._in_flight = 0
+        self.stats = {"requests": 0, "retries": 0, "failures": 0, "rejected": 0, "total_seconds": 0.0}
+
+    def _count(self, name, value=1):
+        with self._stats_lock:
+            self.stats[name] += value
+
+    def _busy_error(self):
+        self._count("rejected")
+        return LLMBusyError(
+            f"LM Studio is busy ({self.max_concurrency} requests in flight), please try again later"
+        )
+
+    def _backoff_delay(self, attempt):
+        # Exponential backoff with jitter so retries from several clients do not line up
+        return self.backoff * (2 ** attempt) * (0.5 + random.random() / 2)
+
+    def get_stats(self):
+        with self._stats_lock:
+            return {
+                "url": self.url,
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self._in_flight,
+                **self.stats
+            }
+
+
+STREAM_DONE = object()
+
+
+def _parse_stream_line(line):
+    """Content delta of one server-sent events line, None to skip it, STREAM_DONE at the end"""
+    if not line or not line.startswith("data:"):
+        return None
+    data = line[len("data:"):].strip()
+    if data == "[DONE]":
+        return STREAM_DONE
+    try:
+        chunk = json.loads(data)
+    except ValueError:
+        raise LLMError("Invalid JSON chunk in LM Studio stream")
+    choices = chunk.get("choices") or []
+    if not choices:
+        return None
+    return (choices[0].get("delta") or {}).get("content") or None
+
+
+class LLMClient(_ClientStats):
+    def __init__(self, url=LLM_API_URL, connect_timeout=LLM_CONNECT_TIMEOUT, read_timeout=LLM_READ_TIMEOUT,
+                 max_retries=LLM_MAX_RETRIES, backoff=LLM_RETRY_BACKOFF,
+                 max_concurrency=LLM_MAX_CONCURRENCY, queue_timeout=LLM_QUEUE_TIMEOUT):
+        super().__init__()
+        self.url = url
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "Content-Type": "application/json",
+            "Accept": "application/json"
+        })
+
+    def _acquire(self):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise self._busy_error()
+        with self._stats_lock:
+            self._in_flight += 1
+
+    def _release(self):
+        with self._stats_lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def _sleep_before_retry(self, attempt):
+        time.sleep(self._backoff_delay(attempt))
+
+    def post(self, payload, stream=False):
+        """POST a payload, retrying connection failures and 5xx replies.
+
+        The caller must hold a concurrency slot. Read timeouts are not
+        retried: a model that stalled once would most likely stall again.
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.post(self.url, json=payload, timeout=self.timeout, stream=stream)
+            except requests.exceptions.ReadTimeout:
+                self._count("failures")
+                raise LLMError(f"LM Studio API did not answer within {self.timeout[1]:g} seconds")
+            except (requests.exceptions.ConnectionError, requests.exceptions.ConnectTimeout) as e:
+                if attempt == self.max_retries:
+                    self._count("failures")
+                    raise LLMError(f"Failed to connect to LM Studio API: {str(e)}")
+                self._count("retries")
+                self._sleep_before_retry(attempt)
+                continue
+
+            if response.status_code in RETRY_STATUS_CODES and attempt < self.max_retries:
+                response.close()
+                self._count("retries")
+                self._sleep_before_retry(attempt)
+                continue
+            if response.status_code != 200:
+                self._count("failures")
+                raise LLMError(
+                    f"LM Studio API returned status code {response.status_code}. Response: {response.text}"
+                )
+            return response
+
+    def stream_chat_completion(self, payload):
+        """Run a streaming chat completion, yielding content deltas as they arrive.
+
+        The concurrency slot is held until the generator is exhausted or
+        closed; closing it early drops the connection, which makes LM Studio
+        stop generating.
+        """
+        self._acquire()
+        start = time.perf_counter()
+        response = None
+        try:
+            self._count("requests")
+            response = self.post(payload, stream=True)
+            if response.encoding is None:
+                response.encoding = 'utf-8'
+            for line in response.iter_lines(decode_unicode=True):
+                try:
+                    content = _parse_stream_line(line)
+                except LLMError:
+                    self._count("failures")
+                    raise
+                if content is STREAM_DONE:
+                    break
+                if content:
+                    yield content
+        except requests.exceptions.RequestException as e:
+            self._count("failures")
+            raise LLMError(f"LM Studio stream interrupted: {str(e)}")
+        finally:
+            if response is not None:
+                response.close()
+            self._count("total_seconds", time.perf_counter() - start)
+            self._release()
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncLLMClient(_ClientStats):
+    """asyncio version of LLMClient built on httpx, used by the ASGI entry point"""
+
+    def __init__(self, url=LLM_API_URL, connect_timeout=LLM_CONNECT_TIMEOUT, read_timeout=LLM_READ_TIMEOUT,
+                 max_retries=LLM_MAX_RETRIES, backoff=LLM_RETRY_BACKOFF,
+                 max_concurrency=LLM_MAX_CONCURRENCY, queue_timeout=LLM_QUEUE_TIMEOUT):
+        if httpx is None:
+            raise ImportError("The async LLM client needs httpx: pip install httpx")
+        super().__init__()
+        self.url = url
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self._slots = None  # created on the event loop that uses it
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+            headers={"Content-Type": "application/json", "Accept": "application/json"}
+        )
+
+    async def _acquire(self):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise self._busy_error()
+        with self._stats_lock:
+            self._in_flight += 1
+
+    def _release(self):
+        with self._stats_lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    async def post(self, payload, stream=False):
+        """POST a payload with the same retry rules as LLMClient.post"""
+        for attempt in range(self.max_retries + 1):
+            request = self.client.build_request("POST", self.url, json=payload)
+            try:
+                response = await self.client.send(request, stream=stream)
+            except httpx.ReadTimeout:
+                self._count("failures")
+                raise LLMError(f"LM Studio API did not answer within {self.read_timeout:g} seconds")
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError) as e:
+                if attempt == self.max_retries:
+                    self._count("failures")
+                    raise LLMError(f"Failed to connect to LM Studio API: {str(e)}")
+                self._count("retries")
+                await asyncio.sleep(self._backoff_delay(attempt))
+                continue
+
+            if response.status_code in RETRY_STATUS_CODES and attempt < self.max_retries:
+                await response.aclose()
+                self._count("retries")
+                await asyncio.sleep(self._backoff_delay(attempt))
+                continue
+            if response.status_code != 200:
+                text = (await response.aread()).decode(errors="replace")
+                await response.aclose()
+                self._count("failures")
+                raise LLMError(f"LM Studio API returned status code {response.status_code}. Response: {text}")
+            return response
+
+    async def stream_chat_completion(self, payload):
+        """Async generator of content deltas; aclose() it to stop generation early"""
+        await self._acquire()
+        start = time.perf_counter()
+        response = None
+        try:
+            self._count("requests")
+            response = await self.post(payload, stream=True)
+            async for line in response.aiter_lines():
+                try:
+                    content = _parse_stream_line(line)
+                except LLMError:
+                    self._count("failures")
+                    raise
+                if content is STREAM_DONE:
+                    break
+                if content:
+                    yield content
+        except httpx.HTTPError as e:
+            self._count("failures")
+            raise LLMError(f"LM Studio stream interrupted: {str(e)}")
+        finally:
+            if response is not None:
+                await response.aclose()
+            self._count("total_seconds", time.perf_counter() - start)
+            self._release()
+
+    async def aclose(self):
+        await self.client.aclose()
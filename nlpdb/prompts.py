@@ -0,0 +1,196 @@
+"""Prompt templates for the NL to SQL conversion.
+
+The schema part of a prompt is rendered once per schema version and cached,
+so a request only has to splice the user question into pre-built text.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from schema_retrieval import select_tables, estimate_tokens
+
+PROMPT_CACHE_MAX_SCHEMAS = int(os.getenv("PROMPT_CACHE_MAX_SCHEMAS", 32))
+
+SQL_PROMPT_TEMPLATE = """You are a SQL expert. Convert the following natural language request into a valid SQL query.
+                    CRITICAL: Return ONLY the raw SQL query without ANY text, prefixes, comments, or explanations.
+                    
+                    Current Database Context:
+                    {context_info}
+                    
+                    Rules:
+                    1. Return ONLY the SQL query - no prefixes, no comments, no explanations
+                    2. Do not include words like 'Output:', 'Query:', or any other text
+                    3. Use proper SQL syntax
+                    4. CRITICAL: Use ONLY the column names that exist in the tables as shown above
+                    5. For SELECT queries:
+                       - Use EXACT column names from the table structures
+                       - For joins, use the correct column names from both tables
+                       - For conditions, use the exact column names shown above
+                    6. CRITICAL TABLE NAME RULES:
+                       - Use EXACT table names as specified in the request
+                       - DO NOT add 's' to table names unless explicitly specified
+                       - DO NOT modify table names in any way
+                    7. For showing tables:
+                       - If the request is to show all tables, use 'SHOW TABLES'
+                       - If the request is to show a specific table, use 'SHOW TABLES LIKE table_name'
+                       - If the request is to describe a table, use 'DESCRIBE table_name'
+                    8. For relationships between tables:
+                        - Use the exact column names from the table structures
+                        - Ensure the join conditions use the correct column names
+                        - Check the table structures above for the correct column names to join on
+                        - Use the relationships information provided above for JOIN conditions
+                    9. CRITICAL: Do not include any comments in the SQL query
+                    10. CRITICAL: Do not use table aliases unless explicitly requested
+                    11. For queries involving multiple tables:
+                        - Always use the relationships information provided above
+                        - Join tables using the correct foreign key relationships
+                        - Use the exact column names for join conditions
+                        - Ensure the query follows the logical flow of relationships
+                    12. CRITICAL JOIN RULES:
+                        - Use ONLY the foreign key relationships shown in the context
+                        - For each table, check its foreign keys in the context
+                        - Use the exact column names from the foreign key relationships
+                        - DO NOT assume column names - use only what's shown in the context
+                        - The customer table has a car_id column that references the cars table's id column
+                        - When joining customer and cars tables, use customer.car_id = cars.id
+                    
+                    Examples:
+                    Input: "show all tables" or "show tables" or "list tables" or "show table"
+                    Output: SHOW TABLES;
+                    
+                    Input: "describe the table products"
+                    Output: DESCRIBE products;
+                    
+                    Input: "delete the table orders"
+                    Output: DROP TABLE orders;
+                    
+                    Input: "find the name of customer who owns a ford car"
+                    Output: SELECT customer.name FROM customer JOIN cars ON customer.car_id = cars.id WHERE cars.brand = 'ford';
+                    
+                    Now convert this request: {natural_language}"""
+
+# Split once at import so rendering is a plain join of three literals and two values
+_PROMPT_HEAD, _rest = SQL_PROMPT_TEMPLATE.split("{context_info}")
+_PROMPT_MIDDLE, _PROMPT_TAIL = _rest.split("{natural_language}")
+
+PROMPT_STATS = {
+    "prompts_built": 0,
+    "schema_renders": 0,
+    "schema_cache_hits": 0,
+    "last_prompt_chars": 0,
+    "last_prompt_tokens": 0,
+    "max_prompt_chars": 0,
+    "total_prompt_chars": 0,
+    "last_build_seconds": 0.0,
+    "total_build_seconds": 0.0,
+}
+_stats_lock = threading.Lock()
+
+
+def render_table_context(table, info):
+    """Prompt text describing one table"""
+    context_info = f"\nTable: {table}\n"
+    context_info += "Columns:\n"
+    for col in info['columns']:
+        context_info += f"- {col['name']} ({col['type']})"
+        if col['key']:
+            context_info += f" [{col['key']}]"
+        context_info += "\n"
+
+    if info['primary_keys']:
+        context_info += f"Primary keys: {', '.join(info['primary_keys'])}\n"
+
+    if info['foreign_keys']:
+        context_info += "Foreign keys:\n"
+        for fk in info['foreign_keys']:
+            context_info += f"- {fk['column']} references {fk['referenced_table']}.{fk['referenced_column']}\n"
+    return context_info
+
+
+class SchemaPrompt:
+    """Rendered schema text of one database at one schema version"""
+
+    def __init__(self, database, db_info):
+        self.database = database
+        self.db_info = db_info
+        self.blocks = {table: render_table_context(table, info) for table, info in db_info['tables'].items()}
+        self._full_context = None
+
+    def render_block(self, table, info=None):
+        return self.blocks[table]
+
+    def context_info(self, tables):
+        """Database context describing the given tables"""
+        if len(tables) == len(self.blocks) and self._full_context is not None:
+            return self._full_context
+
+        omitted = len(self.blocks) - len(tables)
+        parts = [f"Current database: {self.database}\n\n", "Available tables:\n"]
+        parts.extend(f"- {table}\n" for table in tables)
+        if omitted:
+            parts.append(f"({omitted} other table(s) not relevant to this request are omitted)\n")
+        parts.append("\nDetailed table structures:\n")
+        parts.extend(self.blocks[table] for table in tables)
+        context_info = "".join(parts)
+
+        # The full schema block is the same for every request, keep it
+        if not omitted:
+            self._full_context = context_info
+        return context_info
+
+
+_schema_prompts = OrderedDict()
+_schema_prompts_lock = threading.Lock()
+
+
+def get_schema_prompt(database, db_info):
+    """Rendered schema for a cached schema, re-rendered only when its version changes"""
+    key = (database, db_info.get('fingerprint'), db_info.get('version'))
+    with _schema_prompts_lock:
+        schema_prompt = _schema_prompts.get(key)
+        if schema_prompt is not None:
+            _schema_prompts.move_to_end(key)
+    if schema_prompt is not None:
+        with _stats_lock:
+            PROMPT_STATS["schema_cache_hits"] += 1
+        return schema_prompt
+
+    schema_prompt = SchemaPrompt(database, db_info)
+    with _schema_prompts_lock:
+        _schema_prompts[key] = schema_prompt
+        while len(_schema_prompts) > PROMPT_CACHE_MAX_SCHEMAS:
+            _schema_prompts.popitem(last=False)
+    with _stats_lock:
+        PROMPT_STATS["schema_renders"] += 1
+    return schema_prompt
+
+
+def build_prompt(database, db_info, natural_language):
+    """Full NL to SQL prompt for a request"""
+    start = time.perf_counter()
+    schema_prompt = get_schema_prompt(database, db_info)
+    tables = select_tables(database, db_info, natural_language, schema_prompt.render_block)
+    prompt = "".join((_PROMPT_HEAD, schema_prompt.context_info(tables), _PROMPT_MIDDLE,
+                      natural_language, _PROMPT_TAIL))
+    elapsed = time.perf_counter() - start
+
+    with _stats_lock:
+        PROMPT_STATS["prompts_built"] += 1
+        PROMPT_STATS["last_prompt_chars"] = len(prompt)
+        PROMPT_STATS["last_prompt_tokens"] = estimate_tokens(prompt)
+        PROMPT_STATS["max_prompt_chars"] = max(PROMPT_STATS["max_prompt_chars"], len(prompt))
+        PROMPT_STATS["total_prompt_chars"] += len(prompt)
+        PROMPT_STATS["last_build_seconds"] = elapsed
+        PROMPT_STATS["total_build_seconds"] += elapsed
+    return prompt
+
+
+def prompt_stats():
+    with _stats_lock:
+        stats = dict(PROMPT_STATS)
+    built = stats["prompts_built"] or 1
+    stats["avg_prompt_chars"] = stats["total_prompt_chars"] / built
+    stats["avg_build_seconds"] = stats["total_build_seconds"] / built
+    stats["cached_schemas"] = len(_schema_prompts)
+    return stats
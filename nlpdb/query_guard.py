@@ -0,0 +1,126 @@
+"""Checks on generated SQL before it runs.
+
+Every SELECT, UPDATE and DELETE is explained first (EXPLAIN FORMAT=JSON)
+to estimate how many rows it will scan. Plans above the confirmation
+threshold only run once the user confirms them, plans above the reject
+threshold never run. SELECTs without a LIMIT get one, and SELECTs carry
+a MAX_EXECUTION_TIME hint so a bad plan cannot pin the server. A SELECT
+read a page at a time keeps the hint but gets no LIMIT, its rows are only
+fetched as pages are asked for.
+"""
+import json
+import os
+
+import mysql.connector
+
+from sql_utils import tokenize_sql, statement_keyword
+
+QUERY_AUTO_LIMIT = int(os.getenv("QUERY_AUTO_LIMIT", 1000))  # 0 disables
+QUERY_MAX_EXECUTION_MS = int(os.getenv("QUERY_MAX_EXECUTION_MS", 30000))  # 0 disables
+QUERY_CONFIRM_ROWS = float(os.getenv("QUERY_CONFIRM_ROWS", 1000000))
+QUERY_REJECT_ROWS = float(os.getenv("QUERY_REJECT_ROWS", 100000000))
+
+EXPLAINED_STATEMENTS = ('select', 'with', 'update', 'delete')
+# Clauses a LIMIT cannot simply be appended after
+_NO_LIMIT_WORDS = {'limit', 'into', 'for', 'lock', 'procedure'}
+
+
+def _top_level_words(statement):
+    """Lower case words outside parentheses"""
+    depth = 0
+    words = []
+    for kind, value in tokenize_sql(statement):
+        if value == '(':
+            depth += 1
+        elif value == ')':
+            depth = max(0, depth - 1)
+        elif kind == 'word' and depth == 0:
+            words.append(value.lower())
+    return words
+
+
+def add_limit(statement, limit=QUERY_AUTO_LIMIT):
+    """Append LIMIT to a SELECT that has none, returns (statement, applied)"""
+    if not limit or statement_keyword(statement) not in ('select', 'with'):
+        return statement, False
+    words = _top_level_words(statement)
+    if 'select' not in words or _NO_LIMIT_WORDS & set(words):
+        return statement, False
+    return f"{statement} LIMIT {limit}", True
+
+
+def add_max_execution_time(statement, milliseconds=QUERY_MAX_EXECUTION_MS):
+    """Add a MAX_EXECUTION_TIME optimizer hint after the SELECT keyword"""
+    if not milliseconds or statement_keyword(statement) != 'select':
+        return statement
+    tokens = tokenize_sql(statement)
+    for i, (kind, value) in enumerate(tokens):
+        if kind == 'word':
+            following = [token for token in tokens[i + 1:] if token[0] != 'whitespace']
+            if following and following[0][0] == 'comment' and following[0][1].startswith('/*+'):
+                # Only the first hint comment counts, leave the model's hints alone
+                return statement
+            before = ''.join(token[1] for token in tokens[:i + 1])
+            rest = ''.join(token[1] for token in tokens[i + 1:])
+            return f"{before} /*+ MAX_EXECUTION_TIME({milliseconds}) */{rest}"
+    return statement
+
+
+def estimate_rows(plan):
+    """Rows scanned according to an EXPLAIN FORMAT=JSON plan, summed over its tables"""
+    total = 0
+    if isinstance(plan, dict):
+        table = plan.get('table')
+        if isinstance(table, dict):
+            total += max(float(table.get('rows_examined_per_scan') or 0),
+                         float(table.get('rows_produced_per_join') or 0))
+        for value in plan.values():
+            total += estimate_rows(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            total += estimate_rows(value)
+    return total
+
+
+def explain(cursor, statement):
+    """EXPLAIN FORMAT=JSON a statement, None when the server cannot explain it"""
+    try:
+        cursor.execute(f"EXPLAIN FORMAT=JSON {statement}")
+        row = cursor.fetchone()
+        cursor.fetchall()
+        return json.loads(row[0]) if row else None
+    except (mysql.connector.Error, ValueError, TypeError) as e:
+        # e.g. a table created by an earlier statement of the same query
+        print(f"Could not explain {statement!r}: {e}")
+        return None
+
+
+def check_statements(cursor, statements, confirmed=False, paged=False):
+    """Explain and rewrite statements before they run.
+
+    With paged, the last statement gets no LIMIT. Returns
+    (statements, report). report["verdict"] is "ok", "confirm" when the
+    plan needs the user's confirmation first, or "reject".
+    """
+    report = {"verdict": "ok", "estimated_rows": 0, "query_cost": 0.0, "limit": None}
+    checked = []
+    for i, statement in enumerate(statements):
+        if statement_keyword(statement) in EXPLAINED_STATEMENTS:
+            plan = explain(cursor, statement)
+            if plan is not None:
+                report["estimated_rows"] += estimate_rows(plan)
+                cost = (plan.get('query_block') or {}).get('cost_info', {}).get('query_cost')
+                report["query_cost"] += float(cost or 0)
+            if not (paged and i == len(statements) - 1):
+                statement, limited = add_limit(statement)
+                if limited:
+                    report["limit"] = QUERY_AUTO_LIMIT
+            statement = add_max_execution_time(statement)
+        checked.append(statement)
+
+    report["estimated_rows"] = int(report["estimated_rows"])
+    if report["estimated_rows"] > QUERY_REJECT_ROWS:
+        report["verdict"] = "reject"
+    elif report["estimated_rows"] > QUERY_CONFIRM_ROWS and not confirmed:
+        report["verdict"] = "confirm"
+    return checked, report
@@ -0,0 +1,220 @@
+"""Cache of result sets for read-only queries.
+
+Entries are keyed by (database, normalized SQL) and remember the tables
+the query reads. Any write to one of those tables through /query drops
+them, DDL and DROP DATABASE included; writes made by other clients are
+bounded by the TTL. Memory use is estimated per entry and the least
+recently used entries are evicted past the byte budget.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sql_utils import tokenize_sql, statement_keyword, referenced_tables
+from schema_cache import ddl_targets
+
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", 60))
+RESULT_CACHE_MAX_ROWS = int(os.getenv("RESULT_CACHE_MAX_ROWS", 10000))
+
+READ_KEYWORDS = ('select', 'with', 'show', 'describe', 'desc', 'explain', 'use')
+# Functions whose value changes from one call to the next
+_VOLATILE_FUNCTIONS = {
+    'now', 'sysdate', 'curdate', 'curtime', 'current_date', 'current_time', 'current_timestamp',
+    'localtime', 'localtimestamp', 'utc_date', 'utc_time', 'utc_timestamp', 'unix_timestamp',
+    'rand', 'uuid', 'uuid_short', 'last_insert_id', 'found_rows', 'row_count', 'connection_id',
+    'sleep', 'get_lock', 'release_lock', 'is_free_lock', 'user', 'current_user', 'session_user',
+    'system_user', 'benchmark'
+}
+# Top level words that make a SELECT lock rows or write somewhere
+_NOT_CACHEABLE = {'into', 'for', 'lock', 'insert', 'update', 'delete', 'replace'}
+
+
+def normalize_sql(statement):
+    """Statement text without comments, extra whitespace or a trailing ';'"""
+    parts = []
+    for kind, value in tokenize_sql(statement):
+        if kind in ('whitespace', 'comment'):
+            if parts and parts[-1] != ' ':
+                parts.append(' ')
+            continue
+        parts.append(value)
+    return ''.join(parts).strip().rstrip(';').strip()
+
+
+def _words(statement):
+    return [value.lower() for kind, value in tokenize_sql(statement) if kind == 'word']
+
+
+def is_cacheable(statement):
+    """Whether a statement only reads data and returns the same rows every time"""
+    if statement_keyword(statement) not in ('select', 'with'):
+        return False
+    words = set(_words(statement))
+    if words & _NOT_CACHEABLE or words & _VOLATILE_FUNCTIONS:
+        return False
+    # User variables
+    return not any(kind == 'symbol' and value == '@' for kind, value in tokenize_sql(statement))
+
+
+def written_tables(statement):
+    """Tables a statement may change: None for reads, [] when the whole database may change"""
+    keyword = statement_keyword(statement)
+    if keyword in READ_KEYWORDS and not set(_words(statement)) & {'insert', 'update', 'delete', 'replace'}:
+        return None
+    ddl = ddl_targets(statement)
+    if ddl == []:
+        return []
+    tables = set(ddl or []) | referenced_tables(statement)
+    # CALL, LOAD DATA and friends: no way to tell what they touch
+    return sorted(tables) if tables else []
+
+
+def estimate_size(columns, rows):
+    """Rough memory footprint of a result set in bytes"""
+    size = 64 + sum(len(str(column)) + 49 for column in columns)
+    for row in rows:
+        size += 56 + 8 * len(row)
+        for value in row:
+            size += len(value) + 49 if isinstance(value, (str, bytes, bytearray)) else 32
+    return size
+
+
+class ResultCache:
+    """Size bounded LRU of read-only result sets, invalidated per table"""
+
+    def __init__(self, max_bytes=RESULT_CACHE_MAX_BYTES, ttl=RESULT_CACHE_TTL, max_rows=RESULT_CACHE_MAX_ROWS):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.bytes = 0
+        self._entries = OrderedDict()
+        self._by_table = {}  # (database, table) -> keys of entries reading it
+        # Bumped on every write, so results read before a write are never stored after it
+        self._generations = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "invalidations": 0,
+                      "skipped": 0}
+
+    def _key(self, database, statement):
+        return (database, normalize_sql(statement))
+
+    def _tables(self, statement):
+        return {table.lower() for table in referenced_tables(statement)}
+
+    def _generation(self, database, tables):
+        return (self._epoch, self._generations.get(database, 0),
+                tuple(self._generations.get((database, table), 0) for table in sorted(tables)))
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self.bytes -= entry["size"]
+        for table in entry["tables"]:
+            keys = self._by_table.get((key[0], table))
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[(key[0], table)]
+
+    def snapshot(self, database, statement):
+        """Write generation to take before running a query whose result may be stored"""
+        tables = self._tables(statement)
+        with self._lock:
+            return self._generation(database, tables)
+
+    def get(self, database, statement):
+        key = self._key(database, statement)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and time.monotonic() - entry["cached_at"] <= self.ttl:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry
+            if entry:
+                self._remove(key)
+            self.stats["misses"] += 1
+            return None
+
+    def set(self, database, statement, columns, rows, snapshot, **extra):
+        """Store a result read after snapshot(), unless a write has happened since"""
+        if len(rows) > self.max_rows:
+            with self._lock:
+                self.stats["skipped"] += 1
+            return False
+        key = self._key(database, statement)
+        tables = self._tables(statement)
+        entry = {
+            "columns": list(columns),
+            "rows": [tuple(row) for row in rows],
+            "tables": tables,
+            "size": estimate_size(columns, rows),
+            "cached_at": time.monotonic(),
+            **extra
+        }
+        if entry["size"] > self.max_bytes:
+            with self._lock:
+                self.stats["skipped"] += 1
+            return False
+
+        with self._lock:
+            if self._generation(database, tables) != snapshot:
+                self.stats["skipped"] += 1
+                return False
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self.bytes += entry["size"]
+            for table in tables:
+                self._by_table.setdefault((database, table), set()).add(key)
+            self.stats["stores"] += 1
+            while self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+        return True
+
+    def invalidate(self, database, tables=None):
+        """Drop results reading the given tables, or every result of the database"""
+        with self._lock:
+            if tables is None:
+                self._generations[database] = self._generations.get(database, 0) + 1
+                keys = [key for key in self._entries if key[0] == database]
+            else:
+                keys = set()
+                for table in tables:
+                    table = table.lower()
+                    self._generations[(database, table)] = self._generations.get((database, table), 0) + 1
+                    keys |= self._by_table.get((database, table), set())
+            for key in list(keys):
+                self._remove(key)
+            self.stats["invalidations"] += len(keys)
+
+    def invalidate_writes(self, database, statements):
+        """Invalidate everything the given statements may write to"""
+        for statement in statements:
+            tables = written_tables(statement)
+            if tables is None:
+                continue
+            self.invalidate(database, tables or None)
+
+    def clear(self, database=None):
+        if database is not None:
+            self.invalidate(database)
+            return
+        with self._lock:
+            self._entries.clear()
+            self._by_table.clear()
+            self.bytes = 0
+            self._epoch += 1
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "max_rows": self.max_rows,
+                **self.stats
+            }
@@ -0,0 +1,195 @@
+"""Open result cursors for large SELECTs, read a page at a time.
+
+The last statement of a paginated query runs on an unbuffered cursor, so
+rows stay on the MySQL server until they are asked for. The first page is
+returned with the query's response; when more rows remain, the cursor
+and its pooled connection are parked under a random page token that the
+client sends back to read the next page. Idle cursors are closed after a
+timeout, and cursors older than max_age are closed before the server's
+MAX_EXECUTION_TIME would kill them mid-read. Only a few may be open at
+once since each one holds a connection.
+"""
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+RESULT_PAGE_SIZE = int(os.getenv("RESULT_PAGE_SIZE", 500))
+RESULT_MAX_PAGE_SIZE = int(os.getenv("RESULT_MAX_PAGE_SIZE", 5000))
+RESULT_CURSOR_TTL = float(os.getenv("RESULT_CURSOR_TTL", 120))
+RESULT_MAX_CURSORS = int(os.getenv("RESULT_MAX_CURSORS", 4))
+
+
+def page_size_from(value, default=RESULT_PAGE_SIZE):
+    """Clamp a page size sent by the client, None when it is missing or invalid"""
+    if value is None or value is False:
+        return None
+    if value is True:
+        return default
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return None
+    if size <= 0:
+        return None
+    return min(size, RESULT_MAX_PAGE_SIZE)
+
+
+class ResultCursor:
+    """An executed statement whose rows are read on demand"""
+
+    def __init__(self, connection, cursor, sql):
+        self.connection = connection
+        self.cursor = cursor
+        self.sql = sql
+        self.columns = [desc[0] for desc in cursor.description]
+        self.rows_read = 0
+        self.done = False
+        self.opened = self.last_used = time.monotonic()
+        self._lookahead = None
+        self._lock = threading.Lock()
+
+    def fetch_page(self, size):
+        """Next page of rows as lists; done is set once the result is exhausted"""
+        with self._lock:
+            self.last_used = time.monotonic()
+            rows = []
+            if self._lookahead is not None:
+                rows.append(self._lookahead)
+                self._lookahead = None
+            if not self.done:
+                # One extra row tells whether another page exists without an empty last page
+                rows.extend(self.cursor.fetchmany(size + 1 - len(rows)))
+            if len(rows) > size:
+                self._lookahead = rows.pop()
+            else:
+                self.done = True
+            self.rows_read += len(rows)
+            return [list(row) for row in rows]
+
+    def iter_batches(self, size):
+        """Yield pages until the result is exhausted"""
+        while not self.done:
+            rows = self.fetch_page(size)
+            if rows:
+                yield rows
+
+    def close(self):
+        # Closing with unread rows fails; the pool then discards the connection
+        try:
+            self.cursor.close()
+        except Exception:
+            pass
+        self.connection.close()
+
+
+class CachedResult:
+    """Rows already in memory (from the result cache), paged like a ResultCursor"""
+
+    def __init__(self, columns, rows, sql):
+        self.sql = sql
+        self.columns = list(columns)
+        self.rows_read = 0
+        self.done = not rows
+        self.opened = None  # holds nothing on the server, max_age does not apply
+        self.last_used = time.monotonic()
+        self._rows = rows
+        self._lock = threading.Lock()
+
+    def fetch_page(self, size):
+        with self._lock:
+            self.last_used = time.monotonic()
+            rows = self._rows[self.rows_read:self.rows_read + size]
+            self.rows_read += len(rows)
+            self.done = self.rows_read >= len(self._rows)
+            return [list(row) for row in rows]
+
+    def iter_batches(self, size):
+        while not self.done:
+            rows = self.fetch_page(size)
+            if rows:
+                yield rows
+
+    def close(self):
+        pass
+
+
+class ResultCursorStore:
+    """Open cursors by page token, bounded in number and idle time"""
+
+    def __init__(self, max_cursors=RESULT_MAX_CURSORS, ttl=RESULT_CURSOR_TTL, max_age=None):
+        self.max_cursors = max_cursors
+        self.ttl = ttl
+        self.max_age = max_age
+        self._cursors = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"opened": 0, "pages": 0, "expired": 0, "evicted": 0, "completed": 0}
+
+    def _expired(self):
+        now = time.monotonic()
+        return [token for token, result in self._cursors.items()
+                if now - result.last_used > self.ttl
+                or (self.max_age and result.opened is not None and now - result.opened > self.max_age)]
+
+    def evict_expired(self):
+        with self._lock:
+            stale = [self._cursors.pop(token) for token in self._expired()]
+            self.stats["expired"] += len(stale)
+        for result in stale:
+            result.close()
+        return len(stale)
+
+    def park(self, result):
+        """Keep an open cursor for later pages and return its token"""
+        token = secrets.token_urlsafe(16)
+        self.evict_expired()
+        with self._lock:
+            self._cursors[token] = result
+            self.stats["opened"] += 1
+            evicted = []
+            while len(self._cursors) > self.max_cursors:
+                evicted.append(self._cursors.popitem(last=False)[1])
+            self.stats["evicted"] += len(evicted)
+        for stale in evicted:
+            stale.close()
+        return token
+
+    def take(self, token):
+        """Remove and return the cursor for a token, None if it expired or never existed"""
+        self.evict_expired()
+        with self._lock:
+            return self._cursors.pop(token, None)
+
+    def page(self, result, size):
+        """Read a page from a cursor, parking it again if rows remain; returns (rows, next token)"""
+        try:
+            rows = result.fetch_page(size)
+        except Exception:
+            result.close()
+            raise
+        with self._lock:
+            self.stats["pages"] += 1
+        if result.done:
+            with self._lock:
+                self.stats["completed"] += 1
+            result.close()
+            return rows, None
+        return rows, self.park(result)
+
+    def close_all(self):
+        with self._lock:
+            results = list(self._cursors.values())
+            self._cursors.clear()
+        for result in results:
+            result.close()
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "open": len(self._cursors),
+                "max_cursors": self.max_cursors,
+                "ttl": self.ttl,
+                "max_age": self.max_age,
+                **self.stats
+            }
@@ -0,0 +1,269 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+SCHEMA_CACHE_TTL = float(os.getenv("SCHEMA_CACHE_TTL", 60))
+SCHEMA_CACHE_MAX_ENTRIES = int(os.getenv("SCHEMA_CACHE_MAX_ENTRIES", 64))
+
+# Version of the compact_entry() layout, bump it when the layout changes
+SCHEMA_CACHE_FORMAT = 2
+_COLUMN_FIELDS = ('name', 'type', 'null', 'key', 'default', 'extra')
+_FOREIGN_KEY_FIELDS = ('column', 'referenced_table', 'referenced_column')
+
+
+class SchemaCache:
+    """Thread-safe LRU cache of introspected schemas, one entry per database.
+
+    Entries are replaced rather than mutated, so a dict returned by get()
+    can be read without holding the lock while other threads refresh it.
+    """
+
+    def __init__(self, ttl=SCHEMA_CACHE_TTL, max_entries=SCHEMA_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self._load_locks = {}
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "invalidations": 0}
+
+    def __contains__(self, database):
+        with self._lock:
+            return database in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def _expired(self, entry):
+        return time.time() - entry['cached_at'] > entry.get('ttl', self.ttl)
+
+    def get(self, database, record=True):
+        """Cached entry of a database, or None when missing or past its TTL"""
+        with self._lock:
+            entry = self._entries.get(database)
+            if entry is None:
+                if record:
+                    self.stats["misses"] += 1
+                return None
+            if self._expired(entry):
+                if record:
+                    self.stats["expired"] += 1
+                return None
+            self._entries.move_to_end(database)
+            if record:
+                self.stats["hits"] += 1
+            return entry
+
+    def peek(self, database):
+        """Entry of a database regardless of its age, without touching LRU order or stats"""
+        with self._lock:
+            return self._entries.get(database)
+
+    def set(self, database, tables, ttl=None, **extra):
+        """Store a freshly introspected schema, evicting the least recently used database"""
+        with self._lock:
+            previous = self._entries.get(database)
+            entry = {
+                'last_updated': datetime.now().isoformat(),
+                'cached_at': time.time(),
+                'ttl': ttl if ttl is not None else self.ttl,
+                'version': (previous['version'] + 1) if previous else 1,
+                'tables': tables,
+                'stale_tables': [],
+                **extra
+            }
+            self._entries[database] = entry
+            self._entries.move_to_end(database)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+            return entry
+
+    def update_tables(self, database, tables, removed=(), **extra):
+        """Merge re-read tables into an existing entry and drop removed ones"""
+        with self._lock:
+            previous = self._entries.get(database)
+            if previous is None:
+                return self.set(database, tables, **extra)
+            merged = {name: info for name, info in previous['tables'].items() if name not in removed}
+            merged.update(tables)
+            refreshed = set(tables) | set(removed)
+            extra = {**{k: v for k, v in previous.items()
+                        if k not in ('last_updated', 'cached_at', 'ttl', 'version', 'tables', 'stale_tables')},
+                     **extra}
+            # Tables invalidated while this refresh was running stay stale
+            extra['stale_tables'] = [t for t in previous['stale_tables'] if t not in refreshed]
+            return self.set(database, dict(sorted(merged.items())), ttl=previous['ttl'], **extra)
+
+    def touch(self, database, **extra):
+        """Restart the TTL of an entry that was verified unchanged, keeping its version"""
+        with self._lock:
+            entry = self._entries.get(database)
+            if entry is None:
+                return None
+            entry = {**entry, 'cached_at': time.time(), **extra}
+            self._entries[database] = entry
+            self._entries.move_to_end(database)
+            return entry
+
+    def invalidate(self, database, tables=None):
+        """Drop a database entry, or only mark some of its tables for re-reading"""
+        with self._lock:
+            entry = self._entries.get(database)
+            if entry is None:
+                return
+            self.stats["invalidations"] += 1
+            if tables is None:
+                del self._entries[database]
+                return
+            stale = sorted(set(entry['stale_tables']) | set(tables))
+            self._entries[database] = {**entry, 'stale_tables': stale}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def loading(self, database):
+        """Per-database lock so concurrent requests introspect a schema only once"""
+        with self._lock:
+            return self._load_locks.setdefault(database, threading.Lock())
+
+    def to_dict(self):
+        with self._lock:
+            return dict(self._entries)
+
+    def load(self, data):
+        """Add entries read from disk, see read_entries().
+
+        Loaded entries count as expired, so each is validated by fingerprint
+        on first use instead of being trusted or re-read in full.
+        """
+        entries = read_entries(data)
+        with self._lock:
+            for database, entry in entries.items():
+                entry['cached_at'] = 0
+                entry.setdefault('ttl', self.ttl)
+                entry.setdefault('version', 1)
+                entry.setdefault('stale_tables', [])
+                self._entries[database] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                **self.stats
+            }
+
+
+def compact_entry(entry):
+    """Persisted form of an entry.
+
+    Columns and foreign keys are stored as lists instead of dicts, and
+    each table carries its fingerprint and update time. Runtime fields
+    (cached_at, ttl) are left out.
+    """
+    fingerprints = entry.get('fingerprints', {})
+    update_times = entry.get('update_times', {})
+    return {
+        'version': entry.get('version', 1),
+        'last_updated': entry['last_updated'],
+        'fingerprint': entry.get('fingerprint'),
+        'stale_tables': entry.get('stale_tables', []),
+        'tables': {
+            table: [
+                [[col[field] for field in _COLUMN_FIELDS] for col in info['columns']],
+                info['primary_keys'],
+                [[fk[field] for field in _FOREIGN_KEY_FIELDS] for fk in info['foreign_keys']],
+                fingerprints.get(table),
+                update_times.get(table)
+            ]
+            for table, info in entry['tables'].items()
+        }
+    }
+
+
+def expand_entry(entry):
+    """Entry in memory layout from its compact_entry() form"""
+    tables = {}
+    fingerprints = {}
+    update_times = {}
+    for table, (columns, primary_keys, foreign_keys, fingerprint, update_time) in entry['tables'].items():
+        tables[table] = {
+            'columns': [dict(zip(_COLUMN_FIELDS, col)) for col in columns],
+            'primary_keys': primary_keys,
+            'foreign_keys': [dict(zip(_FOREIGN_KEY_FIELDS, fk)) for fk in foreign_keys]
+        }
+        if fingerprint is not None:
+            fingerprints[table] = fingerprint
+        update_times[table] = update_time
+    return {
+        'version': entry['version'],
+        'last_updated': entry['last_updated'],
+        'fingerprint': entry['fingerprint'],
+        'fingerprints': fingerprints,
+        'update_times': update_times,
+        'stale_tables': entry['stale_tables'],
+        'tables': tables
+    }
+
+
+def read_entries(data):
+    """Entries of a saved cache file: {"format": 2, "databases": {...}} or the older plain dict"""
+    if 'format' not in data:
+        return data
+    if data['format'] == SCHEMA_CACHE_FORMAT:
+        return {database: expand_entry(entry) for database, entry in data['databases'].items()}
+    print(f"Ignoring schema cache in unknown format {data['format']}")
+    return {}
+
+
+_DDL_TABLE_PATTERNS = [
+    re.compile(r"^create\s+(?:temporary\s+)?table\s+(?:if\s+not\s+exists\s+)?([`\w.]+)", re.I),
+    re.compile(r"^alter\s+(?:online\s+|ignore\s+)?table\s+([`\w.]+)", re.I),
+    re.compile(r"^drop\s+(?:temporary\s+)?(?:table|view)\s+(?:if\s+exists\s+)?([`\w.,\s]+?)(?:\s+(?:restrict|cascade))?$", re.I),
+    re.compile(r"^create\s+(?:or\s+replace\s+)?(?:\w+\s*=\s*\S+\s+)*view\s+([`\w.]+)", re.I),
+    re.compile(r"^(?:create|drop)\s+(?:unique\s+|fulltext\s+|spatial\s+)?index\s+\S+\s+on\s+([`\w.]+)", re.I),
+]
+_DDL_KEYWORDS = ('create', 'alter', 'drop', 'rename')
+
+
+def _table_name(identifier):
+    return identifier.strip().split('.')[-1].strip('`')
+
+
+def ddl_targets(statement):
+    """Tables whose structure a statement changes.
+
+    Returns None for statements that are not DDL, an empty list when the
+    statement affects the schema as a whole (CREATE/DROP DATABASE or DDL
+    that cannot be attributed to tables), and the table names otherwise.
+    """
+    statement = statement.strip().rstrip(';').strip()
+    words = statement.split(None, 2)
+    if not words or words[0].lower() not in _DDL_KEYWORDS:
+        return None
+    if len(words) > 1 and words[1].lower() in ('database', 'schema'):
+        return []
+
+    if words[0].lower() == 'rename':
+        # RENAME TABLE a TO b, c TO d
+        pairs = re.findall(r"([`\w.]+)\s+to\s+([`\w.]+)", statement, re.I)
+        return [_table_name(name) for pair in pairs for name in pair]
+
+    for pattern in _DDL_TABLE_PATTERNS:
+        match = pattern.match(statement)
+        if match:
+            tables = [_table_name(name) for name in match.group(1).split(',') if name.strip()]
+            # ALTER TABLE a RENAME TO b also creates b
+            renamed = re.search(r"\brename\s+(?:to\s+|as\s+)?(?!column\b|index\b|key\b)([`\w.]+)", statement, re.I)
+            if words[0].lower() == 'alter' and renamed:
+                tables.append(_table_name(renamed.group(1)))
+            return tables
+    return []
@@ -0,0 +1,286 @@
+"""Foreign key graph of a cached schema, laid out on the server.
+
+The graph is built once per schema version: an adjacency index, the
+connected components and a position for every table. Components are laid
+out separately in rings around their busiest table and packed next to
+each other, tables without foreign keys share a grid. The visualization then asks
+for the tables in its viewport or around one table instead of running a
+simulation over the whole schema in the browser.
+"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+GRAPH_NODE_SPACING = float(os.getenv("GRAPH_NODE_SPACING", 80))
+GRAPH_MAX_DEPTH = int(os.getenv("GRAPH_MAX_DEPTH", 3))
+GRAPH_PAGE_SIZE = int(os.getenv("GRAPH_PAGE_SIZE", 500))
+GRAPH_MAX_PAGE_SIZE = int(os.getenv("GRAPH_MAX_PAGE_SIZE", 2000))
+
+
+def _layout_component(tables, adjacency, spacing):
+    """Positions of one connected component, with its top left corner at (0, 0).
+
+    tables is in breadth first order from the busiest table, which sits in
+    the centre. Every further hop gets a ring wide enough to fit its tables
+    spacing apart, in the order of their parents so neighbours stay close.
+    """
+    if len(tables) == 1:
+        return {tables[0]: (0.0, 0.0)}
+
+    depths = {tables[0]: 0}
+    parents = {}
+    for table in tables:
+        for neighbor in sorted(adjacency[table]):
+            if neighbor not in depths:
+                depths[neighbor] = depths[table] + 1
+                parents[neighbor] = table
+    rings = {}
+    for table in tables:
+        rings.setdefault(depths[table], []).append(table)
+
+    positions = {}
+    angles = {tables[0]: 0.0}
+    radius = 0.0
+    for depth in sorted(rings):
+        ring = rings[depth]
+        if depth:
+            radius = max(radius + spacing, len(ring) * spacing / (2 * math.pi))
+            # Turn the ring so its tables sit on average next to their parents
+            offset = math.atan2(
+                sum(math.sin(angles[parents[table]] - 2 * math.pi * i / len(ring)) for i, table in enumerate(ring)),
+                sum(math.cos(angles[parents[table]] - 2 * math.pi * i / len(ring)) for i, table in enumerate(ring)))
+        else:
+            offset = 0.0
+        for i, table in enumerate(ring):
+            angles[table] = offset + 2 * math.pi * i / len(ring)
+            positions[table] = (radius * math.cos(angles[table]), radius * math.sin(angles[table]))
+
+    min_x = min(x for x, _ in positions.values())
+    min_y = min(y for _, y in positions.values())
+    return {table: (x - min_x, y - min_y) for table, (x, y) in positions.items()}
+
+
+def _pack(blocks, spacing):
+    """Offsets for (width, height) blocks, placed in rows of roughly square total size"""
+    area = sum((width + spacing) * (height + spacing) for width, height in blocks)
+    row_width = max(math.sqrt(area) * 1.2, max((width for width, _ in blocks), default=0))
+    offsets = []
+    x = y = row_height = 0.0
+    for width, height in blocks:
+        if x and x + width > row_width:
+            x, y = 0.0, y + row_height + spacing
+            row_height = 0.0
+        offsets.append((x, y))
+        x += width + spacing
+        row_height = max(row_height, height)
+    return offsets
+
+
+class SchemaGraph:
+    """Adjacency, connected components and positions of the tables of one schema"""
+
+    def __init__(self, tables, spacing=GRAPH_NODE_SPACING):
+        self.spacing = spacing
+        self.tables = sorted(tables)
+        self.adjacency = {table: set() for table in self.tables}
+        self.edges = []
+        self.edges_by_table = {table: [] for table in self.tables}
+        for table in self.tables:
+            for fk in tables[table]['foreign_keys']:
+                target = fk['referenced_table']
+                # References to tables of another database have no node to point to
+                if target not in self.adjacency:
+                    continue
+                self.edges_by_table[table].append(len(self.edges))
+                if target != table:
+                    self.edges_by_table[target].append(len(self.edges))
+                    self.adjacency[table].add(target)
+                    self.adjacency[target].add(table)
+                self.edges.append({
+                    'source': table,
+                    'target': target,
+                    'source_column': fk['column'],
+                    'target_column': fk['referenced_column']
+                })
+
+        self.components = self._find_components()
+        self.component_of = {table: i for i, members in enumerate(self.components) for table in members}
+        self.positions = self._layout()
+        self._build_grid()
+
+    def _find_components(self):
+        """Connected components, largest first, each in breadth first order from its busiest table"""
+        components = []
+        seen = set()
+        for start in sorted(self.tables, key=lambda table: (-len(self.adjacency[table]), table)):
+            if start in seen:
+                continue
+            seen.add(start)
+            order = []
+            queue = deque([start])
+            while queue:
+                table = queue.popleft()
+                order.append(table)
+                for neighbor in sorted(self.adjacency[table]):
+                    if neighbor not in seen:
+                        seen.add(neighbor)
+                        queue.append(neighbor)
+            components.append(order)
+        components.sort(key=lambda members: (-len(members), members[0]))
+        return components
+
+    def _layout(self):
+        linked = [members for members in self.components if len(members) > 1]
+        isolated = sorted(members[0] for members in self.components if len(members) == 1)
+        layouts = [_layout_component(members, self.adjacency, self.spacing) for members in linked]
+        if isolated:
+            columns = math.ceil(math.sqrt(len(isolated)))
+            layouts.append({table: ((i % columns) * self.spacing, (i // columns) * self.spacing)
+                            for i, table in enumerate(isolated)})
+
+        blocks = [(max(x for x, _ in layout.values()), max(y for _, y in layout.values())) for layout in layouts]
+        positions = {}
+        for layout, (offset_x, offset_y) in zip(layouts, _pack(blocks, self.spacing * 2)):
+            for table, (x, y) in layout.items():
+                positions[table] = (round(x + offset_x, 1), round(y + offset_y, 1))
+        return positions
+
+    def _build_grid(self):
+        self.cell = self.spacing * 4
+        self.grid = {}
+        for table, (x, y) in self.positions.items():
+            self.grid.setdefault((int(x // self.cell), int(y // self.cell)), []).append(table)
+
+    def bounds(self):
+        if not self.positions:
+            return {'x0': 0, 'y0': 0, 'x1': 0, 'y1': 0}
+        xs = [x for x, _ in self.positions.values()]
+        ys = [y for _, y in self.positions.values()]
+        return {'x0': min(xs), 'y0': min(ys), 'x1': max(xs), 'y1': max(ys)}
+
+    def node(self, table, **extra):
+        x, y = self.positions[table]
+        return {'id': table, 'x': x, 'y': y, 'degree': len(self.adjacency[table]),
+                'component': self.component_of[table], **extra}
+
+    def edges_between(self, tables):
+        """Edges with both ends among the given tables"""
+        indexes = sorted({i for table in tables for i in self.edges_by_table[table]})
+        return [self.edges[i] for i in indexes
+                if self.edges[i]['source'] in tables and self.edges[i]['target'] in tables]
+
+    def summary(self):
+        """Sizes, bounds and components, enough to draw an overview before loading any table"""
+        components = []
+        for i, members in enumerate(self.components):
+            if len(members) == 1:
+                continue
+            xs = [self.positions[table][0] for table in members]
+            ys = [self.positions[table][1] for table in members]
+            components.append({'id': i, 'size': len(members), 'root': members[0],
+                               'bounds': {'x0': min(xs), 'y0': min(ys), 'x1': max(xs), 'y1': max(ys)}})
+        return {
+            'tables': len(self.tables),
+            'edges': len(self.edges),
+            'bounds': self.bounds(),
+            'components': components,
+            'isolated': sum(1 for members in self.components if len(members) == 1)
+        }
+
+    def neighborhood(self, table, depth=1, limit=GRAPH_PAGE_SIZE):
+        """Tables within depth foreign key hops of a table, nearest first"""
+        depths = {table: 0}
+        queue = deque([table])
+        truncated = False
+        while queue:
+            current = queue.popleft()
+            if depths[current] >= depth:
+                continue
+            for neighbor in sorted(self.adjacency[current]):
+                if neighbor in depths:
+                    continue
+                if len(depths) >= limit:
+                    truncated = True
+                    break
+                depths[neighbor] = depths[current] + 1
+                queue.append(neighbor)
+        return {
+            'table': table,
+            'depth': depth,
+            'nodes': [self.node(name, depth=hops) for name, hops in depths.items()],
+            'edges': self.edges_between(depths),
+            'truncated': truncated
+        }
+
+    def viewport(self, x0, y0, x1, y1, limit=GRAPH_PAGE_SIZE, offset=0):
+        """Tables positioned inside a rectangle, busiest first, one page at a time"""
+        x0, x1 = min(x0, x1), max(x0, x1)
+        y0, y1 = min(y0, y1), max(y0, y1)
+        cells_x = int(x1 // self.cell) - int(x0 // self.cell) + 1
+        cells_y = int(y1 // self.cell) - int(y0 // self.cell) + 1
+        if cells_x * cells_y > len(self.grid):
+            candidates = self.tables
+        else:
+            candidates = [table for cx in range(int(x0 // self.cell), int(x1 // self.cell) + 1)
+                          for cy in range(int(y0 // self.cell), int(y1 // self.cell) + 1)
+                          for table in self.grid.get((cx, cy), ())]
+        inside = [table for table in candidates
+                  if x0 <= self.positions[table][0] <= x1 and y0 <= self.positions[table][1] <= y1]
+        inside.sort(key=lambda table: (-len(self.adjacency[table]), table))
+        page = inside[offset:offset + limit]
+        return {
+            'nodes': [self.node(table) for table in page],
+            'edges': self.edges_between(set(page)),
+            'total': len(inside),
+            'next_offset': offset + limit if offset + limit < len(inside) else None
+        }
+
+
+_graphs = OrderedDict()
+_graphs_lock = threading.Lock()
+_build_locks = {}  # key -> Lock held while that schema version is laid out
+_MAX_GRAPHS = 16
+_stats = {"hits": 0, "builds": 0, "build_seconds": 0.0}
+
+
+def get_schema_graph(database, db_info):
+    """Graph for a cached schema, rebuilt only when the schema version changes"""
+    key = (database, db_info.get('fingerprint'), db_info.get('version'))
+    with _graphs_lock:
+        graph = _graphs.get(key)
+        if graph is not None:
+            _graphs.move_to_end(key)
+            _stats["hits"] += 1
+            return graph
+        build_lock = _build_locks.setdefault(key, threading.Lock())
+    # Laying out a large schema takes a while, build it once rather than in every waiting request.
+    # Only requests for this schema version wait, other databases are served meanwhile.
+    try:
+        with build_lock:
+            with _graphs_lock:
+                graph = _graphs.get(key)
+            if graph is not None:
+                return graph
+            start = time.perf_counter()
+            graph = SchemaGraph(db_info['tables'])
+            seconds = time.perf_counter() - start
+            # Still under the build lock, so the next waiter finds it instead of building it again
+            with _graphs_lock:
+                _graphs[key] = graph
+                while len(_graphs) > _MAX_GRAPHS:
+                    _graphs.popitem(last=False)
+                _stats["builds"] += 1
+                _stats["build_seconds"] += seconds
+    finally:
+        with _graphs_lock:
+            # The graph is published, later requests find it without the lock
+            if key in _graphs or not build_lock.locked():
+                _build_locks.pop(key, None)
+    return graph
+
+
+def get_graph_stats():
+    with _graphs_lock:
+        return {"entries": len(_graphs), "max_entries": _MAX_GRAPHS, **_stats}
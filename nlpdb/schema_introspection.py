@@ -0,0 +1,200 @@
+"""Bulk schema introspection through INFORMATION_SCHEMA.
+
+Every function issues a constant number of queries for the whole schema
+instead of one DESCRIBE / KEY_COLUMN_USAGE lookup per table.
+"""
+import hashlib
+import json
+
+
+def _table_filter(tables):
+    """SQL fragment and parameters restricting a query to the given tables"""
+    if tables is None:
+        return "", []
+    placeholders = ", ".join(["%s"] * len(tables))
+    return f" AND TABLE_NAME IN ({placeholders})", list(tables)
+
+
+def fetch_tables(cursor, database):
+    """Names of all tables and views in the schema, in SHOW TABLES order"""
+    cursor.execute("""
+        SELECT TABLE_NAME
+        FROM INFORMATION_SCHEMA.TABLES
+        WHERE TABLE_SCHEMA = %s
+        ORDER BY TABLE_NAME
+    """, (database,))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def fetch_columns(cursor, database, tables=None):
+    """Columns of every table, in the same shape DESCRIBE returns them"""
+    table_filter, params = _table_filter(tables)
+    cursor.execute(f"""
+        SELECT
+            TABLE_NAME,
+            COLUMN_NAME,
+            COLUMN_TYPE,
+            IS_NULLABLE,
+            COLUMN_KEY,
+            COLUMN_DEFAULT,
+            EXTRA
+        FROM INFORMATION_SCHEMA.COLUMNS
+        WHERE TABLE_SCHEMA = %s{table_filter}
+        ORDER BY TABLE_NAME, ORDINAL_POSITION
+    """, [database] + params)
+
+    columns = {}
+    for table, name, col_type, nullable, key, default, extra in cursor.fetchall():
+        columns.setdefault(table, []).append({
+            'name': name,
+            'type': col_type,
+            'null': nullable,
+            'key': key,
+            'default': default,
+            'extra': extra
+        })
+    return columns
+
+
+def fetch_keys(cursor, database, tables=None):
+    """Primary and foreign keys of every table from a single KEY_COLUMN_USAGE scan"""
+    table_filter, params = _table_filter(tables)
+    cursor.execute(f"""
+        SELECT
+            TABLE_NAME,
+            COLUMN_NAME,
+            CONSTRAINT_NAME,
+            REFERENCED_TABLE_NAME,
+            REFERENCED_COLUMN_NAME
+        FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE
+        WHERE TABLE_SCHEMA = %s{table_filter}
+        AND (CONSTRAINT_NAME = 'PRIMARY' OR REFERENCED_TABLE_NAME IS NOT NULL)
+        ORDER BY TABLE_NAME, CONSTRAINT_NAME, ORDINAL_POSITION
+    """, [database] + params)
+
+    primary_keys = {}
+    foreign_keys = {}
+    for table, column, constraint, ref_table, ref_column in cursor.fetchall():
+        if constraint == 'PRIMARY':
+            primary_keys.setdefault(table, []).append(column)
+        else:
+            foreign_keys.setdefault(table, []).append({
+                'column': column,
+                'referenced_table': ref_table,
+                'referenced_column': ref_column
+            })
+    return primary_keys, foreign_keys
+
+
+def introspect_schema(connection, database, tables=None):
+    """Build the DB_CACHE[database]['tables'] structure in three queries.
+
+    When tables is given only those tables are read, which is used to
+    refresh part of an already cached schema.
+    """
+    cursor = connection.cursor()
+    try:
+        if tables is None:
+            tables = fetch_tables(cursor, database)
+            table_filter = None
+        else:
+            table_filter = tables = list(tables)
+        if not tables:
+            return {}
+
+        columns = fetch_columns(cursor, database, table_filter)
+        primary_keys, foreign_keys = fetch_keys(cursor, database, table_filter)
+
+        # Requested tables without columns no longer exist
+        if table_filter is not None:
+            tables = [table for table in tables if table in columns]
+
+        return {
+            table: {
+                'columns': columns.get(table, []),
+                'primary_keys': primary_keys.get(table, []),
+                'foreign_keys': foreign_keys.get(table, [])
+            }
+            for table in tables
+        }
+    finally:
+        cursor.close()
+
+
+def fetch_fingerprints(cursor, database):
+    """Cheap per-table fingerprints used to detect schema changes in one query.
+
+    Each fingerprint combines the creation time, the column count and
+    checksums over column and key definitions. UPDATE_TIME is returned
+    separately because it moves on every data change, not on DDL.
+    """
+    cursor.execute("""
+        SELECT
+            t.TABLE_NAME,
+            t.CREATE_TIME,
+            t.UPDATE_TIME,
+            c.column_count,
+            c.column_checksum,
+            k.key_checksum
+        FROM INFORMATION_SCHEMA.TABLES t
+        LEFT JOIN (
+            SELECT
+                TABLE_NAME,
+                COUNT(*) AS column_count,
+                SUM(CRC32(CONCAT_WS(':', ORDINAL_POSITION, COLUMN_NAME, COLUMN_TYPE,
+                                    IS_NULLABLE, COLUMN_KEY, COLUMN_DEFAULT, EXTRA))) AS column_checksum
+            FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE TABLE_SCHEMA = %s
+            GROUP BY TABLE_NAME
+        ) c ON c.TABLE_NAME = t.TABLE_NAME
+        LEFT JOIN (
+            SELECT
+                TABLE_NAME,
+                SUM(CRC32(CONCAT_WS(':', CONSTRAINT_NAME, COLUMN_NAME,
+                                    REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME))) AS key_checksum
+            FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE
+            WHERE TABLE_SCHEMA = %s
+            GROUP BY TABLE_NAME
+        ) k ON k.TABLE_NAME = t.TABLE_NAME
+        WHERE t.TABLE_SCHEMA = %s
+    """, (database, database, database))
+
+    fingerprints = {}
+    update_times = {}
+    for table, created, updated, column_count, column_checksum, key_checksum in cursor.fetchall():
+        fingerprints[table] = [
+            created.isoformat() if created else None,
+            int(column_count or 0),
+            int(column_checksum or 0),
+            int(key_checksum or 0)
+        ]
+        update_times[table] = updated.isoformat() if updated else None
+    return fingerprints, update_times
+
+
+def fetch_row_estimates(cursor, database, tables=None):
+    """Approximate row counts (TABLE_ROWS) of every table, None for views.
+
+    InnoDB keeps this estimate in its statistics, so it costs nothing to
+    read but can be off by tens of percent.
+    """
+    table_filter, params = _table_filter(tables)
+    cursor.execute(f"""
+        SELECT TABLE_NAME, TABLE_ROWS
+        FROM INFORMATION_SCHEMA.TABLES
+        WHERE TABLE_SCHEMA = %s{table_filter}
+    """, [database] + params)
+    return {table: int(rows) if rows is not None else None for table, rows in cursor.fetchall()}
+
+
+def schema_fingerprint(fingerprints):
+    """Single digest of all table fingerprints, identifying a schema version"""
+    payload = json.dumps(sorted(fingerprints.items()), separators=(',', ':'))
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def changed_tables(previous, current):
+    """Tables added or altered, and tables removed, between two fingerprint sets"""
+    changed = [table for table, fp in current.items() if previous.get(table) != fp]
+    removed = [table for table in previous if table not in current]
+    return changed, removed
@@ -0,0 +1,158 @@
+"""Select the tables relevant to a question before building the LLM prompt.
+
+An inverted index over table and column name terms is built once per
+schema version; each question is then scored against it and only the
+best tables (plus their foreign key neighbours) that fit in the token
+budget are sent to the model.
+"""
+import math
+import os
+import re
+import threading
+from collections import OrderedDict
+
+SCHEMA_CONTEXT_MAX_TABLES = int(os.getenv("SCHEMA_CONTEXT_MAX_TABLES", 12))
+SCHEMA_CONTEXT_TOKEN_BUDGET = int(os.getenv("SCHEMA_CONTEXT_TOKEN_BUDGET", 2500))
+
+TABLE_NAME_WEIGHT = 3.0
+COLUMN_NAME_WEIGHT = 1.0
+NEIGHBOR_WEIGHT = 0.5
+
+_STOPWORDS = {
+    'a', 'an', 'the', 'of', 'in', 'on', 'for', 'to', 'from', 'with', 'by', 'and', 'or', 'is', 'are',
+    'me', 'all', 'show', 'list', 'get', 'find', 'give', 'what', 'which', 'who', 'whose', 'how',
+    'many', 'much', 'that', 'this', 'there', 'their', 'have', 'has', 'do', 'does', 'please', 'table',
+    'tables', 'record', 'records', 'row', 'rows', 'data', 'each', 'every', 'where', 'than', 'id'
+}
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token for English and SQL)"""
+    return len(text) // 4 + 1
+
+
+def _stem(word):
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) > 4 and word.endswith(('ses', 'xes', 'ches', 'shes')):
+        return word[:-2]
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+def identifier_terms(name):
+    """Split an identifier like orderItems or order_items into stemmed terms"""
+    parts = re.sub(r'([a-z0-9])([A-Z])', r'\1 \2', name)
+    words = re.split(r'[^A-Za-z0-9]+', parts)
+    terms = {_stem(word.lower()) for word in words if word and not word.isdigit()}
+    whole = _stem(name.lower())
+    terms.add(whole)
+    return terms
+
+
+def question_terms(question):
+    words = re.findall(r'[A-Za-z0-9_]+', question)
+    terms = set()
+    for word in words:
+        if word.lower() in _STOPWORDS:
+            continue
+        terms |= identifier_terms(word)
+    return terms - _STOPWORDS
+
+
+class SchemaIndex:
+    """Inverted index from name terms to tables, plus foreign key adjacency"""
+
+    def __init__(self, tables, render_table):
+        self.tables = list(tables)
+        self.postings = {}
+        self.neighbors = {table: set() for table in tables}
+        # Prompt size of every table, measured once per schema version
+        self.sizes = {table: estimate_tokens(render_table(table, info)) for table, info in tables.items()}
+        self.total_tokens = sum(self.sizes.values())
+
+        for table, info in tables.items():
+            for term in identifier_terms(table):
+                self._add(term, table, TABLE_NAME_WEIGHT)
+            for col in info['columns']:
+                for term in identifier_terms(col['name']):
+                    self._add(term, table, COLUMN_NAME_WEIGHT)
+            for fk in info['foreign_keys']:
+                if fk['referenced_table'] in self.neighbors:
+                    self.neighbors[table].add(fk['referenced_table'])
+                    self.neighbors[fk['referenced_table']].add(table)
+        # Fallback order for questions that match no table: the most joined tables first
+        self.central = sorted(self.tables, key=lambda table: (-len(self.neighbors[table]), table))
+
+    def _add(self, term, table, weight):
+        tables = self.postings.setdefault(term, {})
+        tables[table] = max(tables.get(table, 0), weight)
+
+    def score(self, question):
+        """Relevance score per table, terms weighted by inverse document frequency"""
+        total = len(self.tables) or 1
+        scores = {}
+        for term in question_terms(question):
+            matches = self.postings.get(term)
+            if not matches:
+                continue
+            idf = math.log(1 + total / len(matches))
+            for table, weight in matches.items():
+                scores[table] = scores.get(table, 0) + weight * idf
+
+        # Tables joined to a match are likely needed for the JOIN conditions
+        for table, value in list(scores.items()):
+            for neighbor in self.neighbors[table]:
+                scores[neighbor] = max(scores.get(neighbor, 0), value * NEIGHBOR_WEIGHT)
+        return scores
+
+    def rank(self, question):
+        scores = self.score(question)
+        return sorted(scores, key=lambda table: (-scores[table], table))
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+_MAX_INDEXES = 32
+
+
+def get_schema_index(database, db_info, render_table):
+    """Index for a cached schema, rebuilt only when the schema version changes"""
+    key = (database, db_info.get('fingerprint'), db_info.get('version'))
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is not None:
+            _indexes.move_to_end(key)
+            return index
+    index = SchemaIndex(db_info['tables'], render_table)
+    with _indexes_lock:
+        _indexes[key] = index
+        while len(_indexes) > _MAX_INDEXES:
+            _indexes.popitem(last=False)
+    return index
+
+
+def select_tables(database, db_info, question, render_table,
+                  max_tables=SCHEMA_CONTEXT_MAX_TABLES, token_budget=SCHEMA_CONTEXT_TOKEN_BUDGET):
+    """Tables to describe in the prompt, most relevant first, within the token budget.
+
+    render_table(table, info) returns the prompt text for one table and is
+    used to measure its size. Schemas that fit in the budget entirely are
+    returned unchanged so small databases keep the full context. When the
+    question matches no table, the most joined tables that fit are used.
+    """
+    index = get_schema_index(database, db_info, render_table)
+    if index.total_tokens <= token_budget:
+        return index.tables
+
+    selected = []
+    used = 0
+    for table in index.rank(question) or index.central:
+        if len(selected) >= max_tables:
+            break
+        if used + index.sizes[table] > token_budget:
+            continue
+        selected.append(table)
+        used += index.sizes[table]
+    return selected
@@ -0,0 +1,155 @@
+"""Persistent schema cache shared by every worker process.
+
+Each database is one SQLite row holding its schema in the compact layout
+of schema_cache.compact_entry(), compressed. A refresh rewrites only its
+own row in one transaction, so readers never see half a write, and a
+row is never replaced by a schema introspected before it. SQLite's file
+locking lets several processes share the file: a schema one worker has
+read from MySQL is loaded by the others on first use.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from schema_cache import SCHEMA_CACHE_FORMAT, compact_entry, expand_entry, read_entries
+
+SCHEMA_CACHE_DB = os.getenv("SCHEMA_CACHE_DB", "schema_cache.sqlite3")
+SCHEMA_CACHE_DB_TIMEOUT = float(os.getenv("SCHEMA_CACHE_DB_TIMEOUT", 5))
+
+
+class SchemaStore:
+    """Introspected schemas by database in a SQLite file, read lazily one database at a time"""
+
+    def __init__(self, path=SCHEMA_CACHE_DB, timeout=SCHEMA_CACHE_DB_TIMEOUT):
+        self.path = path or None
+        self._db = None
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "stale_writes": 0, "deletes": 0, "errors": 0}
+        if path:
+            self._open(path, timeout)
+
+    def _open(self, path, timeout):
+        try:
+            # timeout is how long to wait for another process holding the write lock
+            self._db = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+            # Readers in other processes are not blocked by a write in progress
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS schemas (
+                    database_name TEXT PRIMARY KEY,
+                    format INTEGER NOT NULL,
+                    fingerprint TEXT,
+                    last_updated TEXT NOT NULL,
+                    saved_at REAL NOT NULL,
+                    data BLOB NOT NULL
+                )
+            """)
+            self._db.commit()
+        except sqlite3.Error as e:
+            print(f"Error opening schema store {path}: {e}")
+            self._db = None
+
+    def get(self, database):
+        """Saved entry of a database, None if there is none in the current format"""
+        if self._db is None:
+            return None
+        with self._lock:
+            try:
+                row = self._db.execute(
+                    "SELECT format, data FROM schemas WHERE database_name = ?", (database,)
+                ).fetchone()
+                entry = expand_entry(json.loads(zlib.decompress(row[1]))) if row and row[0] == SCHEMA_CACHE_FORMAT else None
+            except (sqlite3.Error, zlib.error, ValueError, KeyError, TypeError) as e:
+                print(f"Error reading schema store: {e}")
+                self.stats["errors"] += 1
+                return None
+            self.stats["hits" if entry else "misses"] += 1
+            return entry
+
+    def put(self, database, entry):
+        """Save an entry, unless the row already holds a schema introspected after it"""
+        if self._db is None:
+            return
+        data = zlib.compress(json.dumps(compact_entry(entry), separators=(',', ':'), default=str).encode())
+        with self._lock:
+            try:
+                cursor = self._db.execute("""
+                    INSERT INTO schemas (database_name, format, fingerprint, last_updated, saved_at, data)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (database_name) DO UPDATE SET
+                        format = excluded.format, fingerprint = excluded.fingerprint,
+                        last_updated = excluded.last_updated, saved_at = excluded.saved_at, data = excluded.data
+                    WHERE excluded.last_updated >= schemas.last_updated OR excluded.format != schemas.format
+                """, (database, SCHEMA_CACHE_FORMAT, entry.get('fingerprint'), entry['last_updated'], time.time(), data))
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"Error writing schema store: {e}")
+                self.stats["errors"] += 1
+                return
+            self.stats["stores" if cursor.rowcount else "stale_writes"] += 1
+
+    def delete(self, database):
+        if self._db is None:
+            return
+        with self._lock:
+            try:
+                self._db.execute("DELETE FROM schemas WHERE database_name = ?", (database,))
+                self._db.commit()
+                self.stats["deletes"] += 1
+            except sqlite3.Error as e:
+                print(f"Error deleting from schema store: {e}")
+                self.stats["errors"] += 1
+
+    def databases(self):
+        """Saved databases, most recently saved first"""
+        if self._db is None:
+            return []
+        with self._lock:
+            try:
+                return [row[0] for row in self._db.execute(
+                    "SELECT database_name FROM schemas ORDER BY saved_at DESC")]
+            except sqlite3.Error as e:
+                print(f"Error reading schema store: {e}")
+                return []
+
+    def import_json(self, path):
+        """Move a database_cache.json written by older versions into the store, once"""
+        if self._db is None or not os.path.exists(path):
+            return 0
+        try:
+            with open(path, 'r') as f:
+                entries = read_entries(json.load(f))
+            saved = set(self.databases())
+            imported = 0
+            for database, entry in entries.items():
+                if database not in saved:
+                    self.put(database, entry)
+                    imported += 1
+            os.replace(path, f"{path}.imported")
+            return imported
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Error importing schema cache {path}: {e}")
+            return 0
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def get_stats(self):
+        with self._lock:
+            try:
+                entries = self._db.execute("SELECT COUNT(*) FROM schemas").fetchone()[0] if self._db else 0
+            except sqlite3.Error:
+                entries = 0
+            return {
+                "path": self.path,
+                "persistent": self._db is not None,
+                "entries": entries,
+                **self.stats
+            }
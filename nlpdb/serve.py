@@ -0,0 +1,37 @@
+"""Production launcher, instead of the Flask development server in app.py.
+
+    python serve.py                         # ASGI (uvicorn), async /query and /query/stream
+    python serve.py --mode wsgi --threads 32   # WSGI (waitress), one thread per request
+
+ASGI mode needs asgiref, httpx and uvicorn; WSGI mode needs waitress.
+"""
+import argparse
+import os
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=("asgi", "wsgi"), default=os.getenv("SERVER_MODE", "asgi"))
+    parser.add_argument("--host", default=os.getenv("SERVER_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("SERVER_PORT", 5000)))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("SERVER_WORKERS", 1)),
+                        help="processes (ASGI only); page tokens and caches are per process")
+    parser.add_argument("--threads", type=int, default=int(os.getenv("SERVER_THREADS", 32)),
+                        help="WSGI request threads, or ASGI threads for MySQL work")
+    args = parser.parse_args()
+
+    if args.mode == "asgi":
+        import uvicorn
+        # Read by asgi.py, also in worker processes
+        os.environ["ASGI_DB_THREADS"] = str(args.threads)
+        uvicorn.run("asgi:application", host=args.host, port=args.port, workers=args.workers, lifespan="on")
+    else:
+        from waitress import serve
+        from app import app
+        if args.workers > 1:
+            print("waitress runs a single process, ignoring --workers")
+        serve(app, host=args.host, port=args.port, threads=args.threads)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""Per-user context: selected database, tables seen and recent queries.
+
+Each browser tab sends a session id (X-Session-Id header or "session_id"
+in the JSON body) and gets its own context, so concurrent users working
+on different databases never see each other's state. Requests without a
+session id get a throwaway context. Contexts keep a bounded history and
+are evicted when idle or when there are too many.
+"""
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+
+SESSION_MAX = int(os.getenv("SESSION_MAX", 1000))
+SESSION_TTL = float(os.getenv("SESSION_TTL", 3600))
+SESSION_HISTORY = int(os.getenv("SESSION_HISTORY", 20))
+SESSION_MAX_TABLES = int(os.getenv("SESSION_MAX_TABLES", 256))
+
+SESSION_HEADER = 'X-Session-Id'
+_SESSION_ID = re.compile(r'^[A-Za-z0-9_-]{8,128}$')
+
+
+def valid_session_id(session_id):
+    return isinstance(session_id, str) and bool(_SESSION_ID.match(session_id))
+
+
+class SessionContext:
+    """What one user has selected and run"""
+
+    def __init__(self, session_id=None, history_size=SESSION_HISTORY, max_tables=SESSION_MAX_TABLES):
+        self.session_id = session_id
+        self.current_database = None
+        self.max_tables = max_tables
+        self.tables = OrderedDict()
+        self.history = deque(maxlen=history_size)
+        self.last_used = time.monotonic()
+        self._lock = threading.Lock()
+
+    def update(self, database=None, table_info=None, query=None, result=None):
+        """Update the context with new information"""
+        with self._lock:
+            self.last_used = time.monotonic()
+            if database and database != self.current_database:
+                # Tables belong to the previous database
+                self.current_database = database
+                self.tables.clear()
+            if table_info:
+                self.tables.update(table_info)
+                while len(self.tables) > self.max_tables:
+                    self.tables.popitem(last=False)
+            if query:
+                # Only a summary of the result, rows can be large
+                self.history.append({
+                    "sql": query,
+                    "database": self.current_database,
+                    "type": (result or {}).get("type"),
+                    "message": (result or {}).get("message"),
+                    "at": time.time()
+                })
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "session_id": self.session_id,
+                "current_database": self.current_database,
+                "tables": list(self.tables),
+                "history": list(self.history)
+            }
+
+
+class SessionStore:
+    """Session contexts by id, bounded in number and idle time"""
+
+    def __init__(self, max_sessions=SESSION_MAX, ttl=SESSION_TTL):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"created": 0, "expired": 0, "evicted": 0, "anonymous": 0}
+
+    def get(self, session_id):
+        """Context for a session id, created on first use; a throwaway one for invalid ids"""
+        if not valid_session_id(session_id):
+            with self._lock:
+                self.stats["anonymous"] += 1
+            return SessionContext()
+
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None and now - session.last_used > self.ttl:
+                del self._sessions[session_id]
+                self.stats["expired"] += 1
+                session = None
+            if session is None:
+                session = SessionContext(session_id)
+                self._sessions[session_id] = session
+                self.stats["created"] += 1
+                self._evict(now)
+            else:
+                self._sessions.move_to_end(session_id)
+            session.last_used = now
+            return session
+
+    def _evict(self, now):
+        while self._sessions:
+            session_id, oldest = next(iter(self._sessions.items()))
+            if now - oldest.last_used > self.ttl:
+                self.stats["expired"] += 1
+            elif len(self._sessions) > self.max_sessions:
+                self.stats["evicted"] += 1
+            else:
+                break
+            del self._sessions[session_id]
+
+    def forget_database(self, database):
+        """Unselect a dropped database in every session"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+        for session in sessions:
+            with session._lock:
+                if session.current_database == database:
+                    session.current_database = None
+                    session.tables.clear()
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "ttl": self.ttl,
+                **self.stats
+            }
@@ -0,0 +1,409 @@
+"""Helpers for working with SQL text produced by the model."""
+import re
+
+# Keywords a generated statement can start with
+STATEMENT_KEYWORDS = ('select', 'insert', 'create', 'update', 'delete', 'show', 'use', 'drop',
+                      'describe', 'alter', 'with', 'replace', 'rename', 'truncate', 'explain', 'desc')
+
+_STATEMENT_START = re.compile(r"\b(?:%s)\b" % "|".join(STATEMENT_KEYWORDS), re.I)
+_UPPER_STATEMENT_START = re.compile(r"\b(?:%s)\b" % "|".join(k.upper() for k in STATEMENT_KEYWORDS))
+_WORD = re.compile(r"[A-Za-z_]+")
+
+# Words that can follow a lower case keyword used as SQL, e.g. show TABLES, create TABLE
+_SHOW_OBJECTS = {'tables', 'databases', 'schemas', 'columns', 'fields', 'create', 'index', 'indexes', 'keys',
+                 'full', 'table', 'processlist', 'status', 'variables', 'global', 'session', 'grants',
+                 'triggers', 'warnings', 'errors', 'engines', 'events', 'open', 'character', 'collation',
+                 'procedure', 'function', 'plugins', 'privileges', 'master', 'binary', 'slave', 'replica'}
+_DDL_OBJECTS = {'table', 'database', 'schema', 'index', 'view', 'unique', 'temporary', 'or', 'if',
+                'procedure', 'function', 'trigger', 'user', 'event', 'fulltext', 'spatial', 'definer',
+                'algorithm', 'sql', 'online', 'ignore', 'role'}
+# Prose words that never name a table or column right after a keyword
+_PROSE_WORDS = {'the', 'a', 'an', 'this', 'that', 'these', 'those', 'your', 'my', 'our', 'their', 'its',
+                'which', 'what', 'how', 'following', 'it', 'them', 'some', 'any', 'to', 'in', 'on', 'for',
+                'of', 'and', 'or', 'is', 'are', 'can', 'you', 'we', 'i', 'me', 'us', 'all', 'data'}
+
+
+class StatementEndDetector:
+    """Incrementally detect when streamed model output holds complete SQL.
+
+    Feed chunks of generated text as they arrive. Scanning starts at the
+    first statement keyword so explanatory prose before the query is
+    ignored. A ';' outside quotes, comments and parentheses ends a
+    statement; the output is considered complete once the next word is not
+    the start of another statement, so multi-statement answers are still
+    read in full.
+    """
+
+    def __init__(self):
+        self.text = ''
+        self.output = None  # generated text up to the end of the SQL
+        self.sql = None
+        self._start = None
+        self._start_upper = False
+        self._lower_from = 0  # lower case keywords before this were prose
+        self._reset_scan(None)
+
+    def _reset_scan(self, start):
+        self._start = self._pos = start
+        self._quote = None
+        self._escaped = False
+        self._comment = None
+        self._depth = 0
+        self._end = None
+
+    def _find_start(self):
+        """Locate the statement start, preferring upper case keywords like clean_sql does.
+
+        A lower case keyword only counts when SQL follows it (see
+        starts_statement), so "you can use select ..." starts at select.
+        """
+        if self._start_upper:
+            return
+        match = _UPPER_STATEMENT_START.search(self.text, self._start or 0)
+        # Only trust complete words, "use" may still grow into "user"
+        if match and match.end() < len(self.text):
+            if match.start() != self._start:
+                self._reset_scan(match.start())
+            self._start_upper = True
+            return
+        if self._start is not None:
+            return
+        for match in _STATEMENT_START.finditer(self.text, self._lower_from):
+            if match.group().isupper():
+                continue
+            verdict = starts_statement(tokenize_sql(self.text[match.start():]), 0, complete=False)
+            if verdict is None:
+                # Not enough text yet to tell SQL from prose
+                return
+            if verdict:
+                self._reset_scan(match.start())
+                return
+            self._lower_from = match.end()
+
+    def feed(self, chunk):
+        """Add generated text, returns True once the SQL is complete"""
+        if self.sql is not None:
+            return True
+        self.text += chunk
+
+        self._find_start()
+        if self._start is None:
+            return False
+
+        text = self.text
+        while self._pos < len(text):
+            if self._end is not None:
+                return self._check_after_end()
+
+            char = text[self._pos]
+            following = text[self._pos + 1] if self._pos + 1 < len(text) else ''
+
+            if self._comment == 'line':
+                if char == '\n':
+                    self._comment = None
+            elif self._comment == 'block':
+                if char == '*' and following == '/':
+                    self._comment = None
+                    self._pos += 1
+                elif char == '*' and not following:
+                    # Wait for the next chunk to tell whether this closes the comment
+                    return False
+            elif self._quote:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == self._quote:
+                    self._quote = None
+            elif char in ('-', '/') and not following:
+                # Could be the start of a comment, wait for the next chunk
+                return False
+            elif char == '-' and following == '-':
+                self._comment = 'line'
+            elif char == '/' and following == '*':
+                self._comment = 'block'
+            elif char == "'" and self._pos >= 2 and text[self._pos - 1].isalpha() and text[self._pos - 2].isalnum():
+                # Apostrophe in prose ("customer's"), string literals never directly follow a word
+                pass
+            elif char in ("'", '"', '`'):
+                self._quote = char
+            elif char == '(':
+                self._depth += 1
+            elif char == ')':
+                self._depth = max(0, self._depth - 1)
+            elif char == ';' and self._depth == 0:
+                self._end = self._pos + 1
+            self._pos += 1
+
+        if self._end is not None:
+            return self._check_after_end()
+        return False
+
+    def _check_after_end(self):
+        """Decide whether the text after a terminal ';' continues the SQL"""
+        stripped = self.text[self._end:].lstrip()
+        if not stripped:
+            return False
+
+        word = _WORD.match(stripped)
+        if word is None:
+            return self._complete()
+        if word.end() == len(stripped):
+            # The word may still be growing, wait for the next chunk
+            return False
+        if word.group(0).lower() in STATEMENT_KEYWORDS:
+            # Another statement follows, keep scanning from it
+            self._pos = self._end
+            self._end = None
+            return self.feed('')
+        return self._complete()
+
+    def _complete(self):
+        self.output = self.text[:self._end]
+        self.sql = self.text[self._start:self._end].strip()
+        return True
+
+
+_TOKEN_PATTERN = re.compile(r"""
+    (?P<whitespace>\s+)
+  | (?P<comment>--[^\n]*|\#[^\n]*|/\*.*?(?:\*/|$))
+  | (?P<quoted>'(?:[^'\\]|\\.|'')*(?:'|$)|"(?:[^"\\]|\\.|"")*(?:"|$)|`[^`]*(?:`|$))
+  | (?P<word>[A-Za-z_][A-Za-z0-9_$]+'(?:s|t|ll|re|ve|d|m)(?![\w'])|[A-Za-z_][A-Za-z0-9_$]*)
+  | (?P<number>\d+(?:\.\d+)?)
+  | (?P<symbol>.)
+""", re.X | re.S)
+
+
+def tokenize_sql(text):
+    """Split text into (kind, value) tokens in a single pass.
+
+    Kinds are whitespace, comment, quoted, word, number and symbol. Quoted
+    strings and identifiers are kept whole, so ';' or '--' inside them are
+    not mistaken for statement ends or comments. Contractions in prose
+    around the SQL ("customer's", "don't") are words, not string literals.
+    """
+    return [(match.lastgroup, match.group()) for match in _TOKEN_PATTERN.finditer(text)]
+
+
+def _next_tokens(tokens, i, count):
+    """Up to count significant tokens after tokens[i], and whether the text ran out first"""
+    found = []
+    for j in range(i + 1, len(tokens)):
+        if tokens[j][0] not in ('whitespace', 'comment'):
+            found.append(tokens[j])
+            if len(found) == count:
+                return found, j == len(tokens) - 1
+    return found, True
+
+
+def _is_identifier(token):
+    kind, value = token
+    if kind == 'quoted':
+        return value.startswith('`')
+    return (kind == 'word' and value.lower() not in STATEMENT_KEYWORDS
+            and value.lower() not in _PROSE_WORDS)
+
+
+def starts_statement(tokens, i, complete=True):
+    """Whether the lower case keyword at tokens[i] starts SQL rather than prose.
+
+    Looks at the words after it: select needs a column list, show a
+    SHOW object, create/drop/alter a DDL object, use and describe a name,
+    and so on. With complete false the text is still streaming, and None
+    means more text is needed to tell.
+    """
+    keyword = tokens[i][1].lower()
+    following, at_end = _next_tokens(tokens, i, 3)
+    if not complete and (len(following) < 3 or at_end):
+        # The last word may still be growing, wait for a few complete tokens
+        return None
+    if not following:
+        return False
+    first = following[0]
+    first_word = first[1].lower() if first[0] == 'word' else None
+    second = following[1] if len(following) > 1 else None
+
+    if keyword == 'select':
+        if first[1] in ('*', '(', '@') or first[0] in ('number', 'quoted'):
+            return True
+        if not _is_identifier(first):
+            return False
+        later = [value.lower() for kind, value in tokens[i + 1:] if kind == 'word']
+        return 'from' in later or (second is not None and second[1] in (',', ';', '.', '('))
+    if keyword == 'with':
+        return (first_word == 'recursive'
+                or (_is_identifier(first) and second is not None and second[1].lower() in ('as', '(')))
+    if keyword == 'show':
+        return first_word in _SHOW_OBJECTS
+    if keyword in ('create', 'drop', 'alter'):
+        return first_word in _DDL_OBJECTS
+    if keyword in ('insert', 'replace'):
+        return first_word in ('into', 'ignore', 'low_priority', 'delayed')
+    if keyword == 'delete':
+        return first_word in ('from', 'ignore', 'low_priority', 'quick')
+    if keyword == 'update':
+        return (first_word in ('ignore', 'low_priority')
+                or (_is_identifier(first) and second is not None
+                    and (second[1].lower() == 'set' or second[1] == '.')))
+    if keyword == 'explain':
+        return first_word in STATEMENT_KEYWORDS or first_word in ('format', 'analyze', 'extended')
+    if keyword in ('truncate', 'rename'):
+        return first_word == 'table' or (keyword == 'truncate' and _is_identifier(first))
+    # use, describe, desc: a name, then the end of the statement
+    return _is_identifier(first) and (second is None or second[1] in (';', '.')
+                                      or (keyword != 'use' and _is_identifier(second)))
+
+
+def _statement_start(tokens):
+    """Index of the token where the SQL begins, skipping explanatory prose.
+
+    Models write SQL keywords in upper case and prose in lower case, so an
+    upper case statement keyword wins over an earlier lower case one
+    ("To describe the table use DESCRIBE products"). A lower case keyword
+    only counts when SQL follows it, "you can use select * from cars"
+    starts at select. Failing that, the first keyword is used.
+    """
+    first = None
+    candidate = None
+    for i, (kind, value) in enumerate(tokens):
+        if kind == 'word' and value.lower() in STATEMENT_KEYWORDS:
+            if value.isupper():
+                return i
+            if first is None:
+                first = i
+            if candidate is None and starts_statement(tokens, i):
+                candidate = i
+    return candidate if candidate is not None else first
+
+
+def clean_sql(text):
+    """Extract the SQL from model output.
+
+    Drops prose before the first statement and after the last complete
+    one, removes comments, and collapses whitespace outside quoted strings.
+
+    >>> clean_sql("you can use select * from cars;")
+    'select * from cars;'
+    >>> clean_sql("to show the data you can use select name from users;")
+    'select name from users;'
+    """
+    tokens = tokenize_sql(text)
+    start = _statement_start(tokens)
+    if start is None:
+        return ' '.join(text.split())
+
+    parts = []
+    depth = 0
+    expect_statement = False
+    for kind, value in tokens[start:]:
+        if kind in ('whitespace', 'comment'):
+            if parts and parts[-1] != ' ':
+                parts.append(' ')
+            continue
+        if expect_statement:
+            # Only another statement may follow a terminal ';'
+            if kind != 'word' or value.lower() not in STATEMENT_KEYWORDS:
+                break
+            expect_statement = False
+        parts.append(value)
+        if value == '(':
+            depth += 1
+        elif value == ')':
+            depth = max(0, depth - 1)
+        elif value == ';' and depth == 0:
+            expect_statement = True
+    return ''.join(parts).strip()
+
+
+def split_statements(sql):
+    """Split SQL into statements on ';' outside quotes, comments and parentheses"""
+    statements = []
+    current = []
+    depth = 0
+    for kind, value in tokenize_sql(sql):
+        if kind == 'symbol' and value == ';' and depth == 0:
+            statements.append(''.join(current).strip())
+            current = []
+            continue
+        if value == '(':
+            depth += 1
+        elif value == ')':
+            depth = max(0, depth - 1)
+        current.append(value)
+    statements.append(''.join(current).strip())
+    return [statement for statement in statements if statement]
+
+
+def statement_keyword(statement):
+    """Lower case first keyword of a statement, skipping leading comments"""
+    for kind, value in tokenize_sql(statement):
+        if kind == 'word':
+            return value.lower()
+        if kind not in ('whitespace', 'comment') and value != '(':
+            return None
+    return None
+
+
+# Keywords followed by a table reference
+_TABLE_CLAUSES = {'from', 'join', 'into', 'update', 'table', 'truncate'}
+# Modifiers between such a keyword and the table name
+_TABLE_MODIFIERS = {'if', 'not', 'exists', 'table', 'ignore', 'low_priority', 'quick', 'delayed',
+                    'high_priority', 'only', 'lateral'}
+# Words that can follow a table reference, so they are not its alias
+_AFTER_TABLE = {'where', 'join', 'inner', 'left', 'right', 'cross', 'natural', 'straight_join', 'on',
+                'using', 'group', 'order', 'limit', 'set', 'values', 'value', 'select', 'union', 'having',
+                'window', 'for', 'lock', 'partition', 'full', 'outer', 'into', 'use', 'force', 'ignore',
+                'as', 'with', 'except', 'intersect', 'returning', 'procedure', 'default'}
+
+
+def _read_table_name(tokens, i):
+    """Table name at tokens[i] (qualified or quoted), returns (name, next index)"""
+    while i < len(tokens) and tokens[i][0] == 'word' and tokens[i][1].lower() in _TABLE_MODIFIERS:
+        i += 1
+    if i >= len(tokens):
+        return None, i
+    kind, value = tokens[i]
+    if kind == 'word' and value.lower() not in STATEMENT_KEYWORDS and value.lower() not in _AFTER_TABLE:
+        name = value
+    elif kind == 'quoted' and value.startswith('`'):
+        name = value.strip('`')
+    else:
+        return None, i
+    i += 1
+    # schema.table names the table
+    while i + 1 < len(tokens) and tokens[i][1] == '.' and tokens[i + 1][0] in ('word', 'quoted'):
+        name = tokens[i + 1][1].strip('`')
+        i += 2
+    return name, i
+
+
+def referenced_tables(statement):
+    """Names of the tables a statement reads or writes, subqueries included.
+
+    A lightweight scan for FROM, JOIN, INTO, UPDATE and TABLE clauses, so it
+    may include the odd false positive (EXTRACT(YEAR FROM col)) but does not
+    miss the tables of the statements the model writes.
+    """
+    tokens = [token for token in tokenize_sql(statement) if token[0] not in ('whitespace', 'comment')]
+    tables = set()
+    i = 0
+    while i < len(tokens):
+        kind, value = tokens[i]
+        i += 1
+        if kind != 'word' or value.lower() not in _TABLE_CLAUSES:
+            continue
+        while True:
+            name, i = _read_table_name(tokens, i)
+            if name is None:
+                break
+            tables.add(name)
+            # Skip an alias: FROM orders AS o, FROM orders o
+            if i < len(tokens) and tokens[i][0] == 'word' and tokens[i][1].lower() == 'as':
+                i += 2
+            elif i < len(tokens) and tokens[i][0] in ('word', 'quoted') and tokens[i][1].lower() not in _AFTER_TABLE:
+                i += 1
+            if i < len(tokens) and tokens[i][1] == ',':
+                i += 1
+                continue
+            break
+    return tables
@@ -0,0 +1,106 @@
+"""Minimal OpenAI compatible chat completions server for tests and benchmarks.
+
+Answers every request with a fixed SQL reply after a configurable delay,
+so the app can be exercised without LM Studio:
+
+    python stub_llm_server.py --port 1234 --latency 0.5 --reply "SHOW TABLES;"
+    LLM_API_URL=http://127.0.0.1:1234/v1/chat/completions python app.py
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like LM Studio
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": "invalid JSON"})
+            return
+
+        self.server.requests_served += 1
+        time.sleep(self.server.latency)
+        reply = self.server.reply(payload) if callable(self.server.reply) else self.server.reply
+        if payload.get("stream"):
+            self._send_stream(reply)
+            return
+        self._send_json(200, {
+            "id": f"stub-{self.server.requests_served}",
+            "object": "chat.completion",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": reply},
+                "finish_reason": "stop"
+            }]
+        })
+
+    def _send_stream(self, reply):
+        """Send the reply as server-sent events, a few characters per chunk"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        try:
+            for i in range(0, len(reply), 4):
+                chunk = {"choices": [{"index": 0, "delta": {"content": reply[i:i + 4]}}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+                self.server.tokens_streamed += 1
+                time.sleep(self.server.token_latency)
+            self.wfile.write(b"data: [DONE]\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading, like the app does once the SQL is complete
+            self.server.streams_cancelled += 1
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_stub_server(host="127.0.0.1", port=0, latency=0.0, reply="SHOW TABLES;", token_latency=0.0):
+    """Start the stub in a daemon thread; reply may be a string or a function of the payload"""
+    server = ThreadingHTTPServer((host, port), StubLLMHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.token_latency = token_latency
+    server.reply = reply
+    server.requests_served = 0
+    server.tokens_streamed = 0
+    server.streams_cancelled = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f"http://{host}:{server.server_address[1]}/v1/chat/completions"
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Stub LM Studio chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1234)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait before answering")
+    parser.add_argument("--reply", default="SHOW TABLES;", help="SQL returned for every request")
+    parser.add_argument("--token-latency", type=float, default=0.0,
+                        help="seconds between chunks when streaming")
+    args = parser.parse_args()
+
+    server = start_stub_server(args.host, args.port, args.latency, args.reply, args.token_latency)
+    print(f"Stub LLM server listening on {server.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
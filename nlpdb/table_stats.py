@@ -0,0 +1,185 @@
+"""Row counts and sample rows for /api/table_details.
+
+Row counts come from INFORMATION_SCHEMA.TABLES.TABLE_ROWS, the estimate
+InnoDB keeps in its statistics, so opening a table never scans it. An
+exact COUNT(*) only runs when a client asks for one. It runs on a
+background worker and its result is cached. Sample rows are cached per
+table with a TTL. Column metadata comes from the schema cache.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import mysql.connector
+
+from schema_introspection import fetch_row_estimates
+from result_cache import written_tables
+
+TABLE_STATS_TTL = float(os.getenv("TABLE_STATS_TTL", 300))
+TABLE_EXACT_COUNT_TTL = float(os.getenv("TABLE_EXACT_COUNT_TTL", 3600))
+TABLE_COUNT_WORKERS = int(os.getenv("TABLE_COUNT_WORKERS", 2))
+TABLE_STATS_MAX_ENTRIES = int(os.getenv("TABLE_STATS_MAX_ENTRIES", 4096))
+TABLE_SAMPLE_ROWS = int(os.getenv("TABLE_SAMPLE_ROWS", 5))
+
+
+def quote_identifier(name):
+    return '`' + name.replace('`', '``') + '`'
+
+
+class TableStats:
+    """Cached row estimates, exact counts and sample rows per (database, table)"""
+
+    def __init__(self, connect, ttl=TABLE_STATS_TTL, exact_ttl=TABLE_EXACT_COUNT_TTL,
+                 workers=TABLE_COUNT_WORKERS, max_entries=TABLE_STATS_MAX_ENTRIES, sample_rows=TABLE_SAMPLE_ROWS):
+        self.connect = connect  # database -> pooled connection, for background counts
+        self.ttl = ttl
+        self.exact_ttl = exact_ttl
+        self.workers = workers
+        self.max_entries = max_entries
+        self.sample_rows = sample_rows
+        self._entries = OrderedDict()
+        self._counting = set()
+        self._executor = None
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "estimate_queries": 0, "sample_queries": 0,
+                      "exact_counts": 0, "exact_count_failures": 0, "invalidations": 0}
+
+    def _entry(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = {}
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        else:
+            self._entries.move_to_end(key)
+        return entry
+
+    def _fresh(self, entry, name, ttl):
+        return name in entry and time.monotonic() - entry[name][1] <= ttl
+
+    def details(self, connection, database, tables, exact=False):
+        """Row count and sample rows of each table, reading only what is not cached.
+
+        Returns {table: {"row_count", "row_count_exact", "row_count_pending",
+        "sample_columns", "sample_rows"}}. With exact, tables without a
+        cached exact count get one counted in the background and report
+        row_count_pending until it is ready.
+        """
+        with self._lock:
+            entries = {table: dict(self._entry((database, table))) for table in tables}
+        need_estimates = [table for table, entry in entries.items() if not self._fresh(entry, "estimate", self.ttl)]
+        need_samples = [table for table, entry in entries.items() if not self._fresh(entry, "sample", self.ttl)]
+        with self._lock:
+            self.stats["hits"] += len(tables) - len(set(need_estimates) | set(need_samples))
+            self.stats["misses"] += len(set(need_estimates) | set(need_samples))
+
+        now = time.monotonic()
+        cursor = connection.cursor()
+        try:
+            if need_estimates:
+                # One INFORMATION_SCHEMA query for every table of the request
+                estimates = fetch_row_estimates(cursor, database, need_estimates)
+                for table in need_estimates:
+                    entries[table]["estimate"] = (estimates.get(table), now)
+            for table in need_samples:
+                cursor.execute(f"SELECT * FROM {quote_identifier(table)} LIMIT {self.sample_rows}")
+                rows = cursor.fetchall()
+                entries[table]["sample"] = (([desc[0] for desc in cursor.description], rows), now)
+        finally:
+            cursor.close()
+
+        with self._lock:
+            self.stats["estimate_queries"] += 1 if need_estimates else 0
+            self.stats["sample_queries"] += len(need_samples)
+            for table in set(need_estimates) | set(need_samples):
+                self._entry((database, table)).update(
+                    {name: entries[table][name] for name in ("estimate", "sample") if name in entries[table]})
+
+        details = {}
+        for table, entry in entries.items():
+            exact_fresh = self._fresh(entry, "exact", self.exact_ttl)
+            pending = False
+            if exact and not exact_fresh:
+                pending = self._schedule_count(database, table)
+            (sample_columns, sample_rows), _ = entry["sample"]
+            details[table] = {
+                "row_count": entry["exact"][0] if exact_fresh else entry["estimate"][0],
+                "row_count_exact": exact_fresh,
+                "row_count_pending": pending,
+                "sample_columns": sample_columns,
+                "sample_rows": sample_rows
+            }
+        return details
+
+    def _schedule_count(self, database, table):
+        """Start an exact count unless one is already running, returns True while it runs"""
+        with self._lock:
+            if (database, table) not in self._counting:
+                self._counting.add((database, table))
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="table-count")
+                self._executor.submit(self._count, database, table)
+        return True
+
+    def _count(self, database, table):
+        connection = None
+        try:
+            connection = self.connect(database)
+            if connection is None:
+                raise mysql.connector.Error(msg=f"Could not connect to {database}")
+            cursor = connection.cursor()
+            try:
+                cursor.execute(f"SELECT COUNT(*) FROM {quote_identifier(table)}")
+                count = cursor.fetchone()[0]
+            finally:
+                cursor.close()
+            with self._lock:
+                self._entry((database, table))["exact"] = (count, time.monotonic())
+                self.stats["exact_counts"] += 1
+        except Exception as e:
+            print(f"Error counting rows of {database}.{table}: {e}")
+            with self._lock:
+                self.stats["exact_count_failures"] += 1
+        finally:
+            if connection is not None:
+                connection.close()
+            with self._lock:
+                self._counting.discard((database, table))
+
+    def invalidate(self, database, tables=None):
+        """Forget cached stats of the given tables, or of the whole database"""
+        with self._lock:
+            if tables is None:
+                keys = [key for key in self._entries if key[0] == database]
+            else:
+                names = {table.lower() for table in tables}
+                keys = [key for key in self._entries if key[0] == database and key[1].lower() in names]
+            for key in keys:
+                del self._entries[key]
+            self.stats["invalidations"] += len(keys)
+
+    def invalidate_writes(self, database, statements):
+        """Forget stats of every table the statements may write to"""
+        for statement in statements:
+            tables = written_tables(statement)
+            if tables is not None:
+                self.invalidate(database, tables or None)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "exact_ttl": self.exact_ttl,
+                "counting": len(self._counting),
+                **self.stats
+            }
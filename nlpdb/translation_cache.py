@@ -0,0 +1,179 @@
+"""Cache of NL to SQL translations.
+
+Entries are keyed by (database, schema fingerprint, normalized question),
+so a schema change makes old translations unreachable and they age out.
+An optional SQLite file keeps translations across restarts.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+TRANSLATION_CACHE_SIZE = int(os.getenv("TRANSLATION_CACHE_SIZE", 1024))
+TRANSLATION_CACHE_TTL = float(os.getenv("TRANSLATION_CACHE_TTL", 24 * 3600))
+TRANSLATION_CACHE_DB = os.getenv("TRANSLATION_CACHE_DB")  # e.g. translation_cache.sqlite3
+
+# Polite openings that do not change what is being asked for, only stripped from the start
+_POLITE_PREFIXES = [('can', 'you', 'please'), ('could', 'you', 'please'), ('would', 'you', 'please'),
+                    ('can', 'you'), ('could', 'you'), ('would', 'you'), ('please',), ('kindly',)]
+# Opening verbs the model treats the same way
+_SYNONYMS = {'list': 'show', 'display': 'show'}
+# Quoted literals, words and numbers, then runs of operators and punctuation like >=, != or -
+_TOKEN_PATTERN = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`|[\w.*]+|[^\w\s'\"`]+")
+
+
+def normalize_question(question):
+    """Canonical form of a question: case, spacing, polite openings and the opening verb.
+
+    Quoted literals are kept verbatim since they usually end up in the SQL.
+    Operators, signs and punctuation are kept, only the closing . ? or !
+    is dropped, so "total > 100" and "total < 100" stay different.
+    """
+    words = []
+    for token in _TOKEN_PATTERN.findall(question):
+        if token[0] in '\'"`':
+            words.append(token)
+        elif token[0].isalnum() or token[0] in '_.*':
+            # Sentence punctuation, while keeping qualified names like cars.brand
+            token = token.lower().rstrip('.')
+            if token:
+                words.append(token)
+        else:
+            words.append(token)
+    while words and words[-1].strip('.?!') == '':
+        words.pop()
+    if not words:
+        return ''
+    stripped = True
+    while stripped:
+        stripped = False
+        for prefix in _POLITE_PREFIXES:
+            if tuple(words[:len(prefix)]) == prefix and len(words) > len(prefix):
+                words = words[len(prefix):]
+                stripped = True
+        while words[0] == ',' and len(words) > 1:
+            words = words[1:]
+            stripped = True
+    if len(words) > 1 and words[-1] == 'please':
+        words.pop()
+        while words[-1] == ',' and len(words) > 1:
+            words.pop()
+    if words:
+        words[0] = _SYNONYMS.get(words[0], words[0])
+    return ' '.join(words)
+
+
+class TranslationCache:
+    """In-memory LRU of translations with TTL, optionally backed by SQLite"""
+
+    def __init__(self, max_entries=TRANSLATION_CACHE_SIZE, ttl=TRANSLATION_CACHE_TTL, path=TRANSLATION_CACHE_DB):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        if path:
+            self._open(path)
+
+    def _open(self, path):
+        try:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS translations (
+                    database_name TEXT NOT NULL,
+                    fingerprint TEXT NOT NULL,
+                    question TEXT NOT NULL,
+                    sql_query TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (database_name, fingerprint, question)
+                )
+            """)
+            self._db.execute("DELETE FROM translations WHERE created_at < ?", (time.time() - self.ttl,))
+            self._db.commit()
+        except sqlite3.Error as e:
+            print(f"Error opening translation cache {path}: {e}")
+            self._db = None
+
+    def _key(self, database, fingerprint, question):
+        return (database, fingerprint or '', normalize_question(question))
+
+    def _remember(self, key, sql_query, created_at):
+        self._entries[key] = (sql_query, created_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def get(self, database, fingerprint, question):
+        key = self._key(database, fingerprint, question)
+        now = time.time()
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached and now - cached[1] <= self.ttl:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return cached[0]
+            if cached:
+                del self._entries[key]
+
+            if self._db is not None:
+                try:
+                    row = self._db.execute(
+                        "SELECT sql_query, created_at FROM translations "
+                        "WHERE database_name = ? AND fingerprint = ? AND question = ?", key
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    print(f"Error reading translation cache: {e}")
+                    row = None
+                if row and now - row[1] <= self.ttl:
+                    self._remember(key, row[0], row[1])
+                    self.stats["disk_hits"] += 1
+                    return row[0]
+
+            self.stats["misses"] += 1
+            return None
+
+    def set(self, database, fingerprint, question, sql_query):
+        key = self._key(database, fingerprint, question)
+        now = time.time()
+        with self._lock:
+            self._remember(key, sql_query, now)
+            self.stats["stores"] += 1
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?)", key + (sql_query, now)
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    print(f"Error writing translation cache: {e}")
+
+    def clear(self, database=None):
+        with self._lock:
+            if database is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if key[0] == database]:
+                    del self._entries[key]
+            if self._db is not None:
+                try:
+                    if database is None:
+                        self._db.execute("DELETE FROM translations")
+                    else:
+                        self._db.execute("DELETE FROM translations WHERE database_name = ?", (database,))
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    print(f"Error clearing translation cache: {e}")
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "persistent": self._db is not None,
+                **self.stats
+            }
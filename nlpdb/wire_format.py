@@ -0,0 +1,103 @@
+"""Encodings for result rows in API responses.
+
+By default rows are sent as a list of dicts, which repeats every column
+name in every row. Clients can ask for the compact columnar form instead
+(column names once, rows as arrays), optionally packed with MessagePack
+when the msgpack package is installed. Large responses are compressed
+with brotli (when installed) or gzip, as negotiated by Accept-Encoding.
+"""
+import datetime
+import decimal
+import gzip
+import os
+
+from werkzeug.http import parse_accept_header
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from flask import Response
+
+from metrics import span
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", 1024))
+COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", 6))
+
+MSGPACK_MIMETYPE = 'application/msgpack'
+FORMATS = ('json', 'columnar', 'msgpack', 'ndjson')
+
+
+def format_from(body=None, query_format=None, accept=''):
+    """Response format asked for in the JSON body, the query string or the Accept header"""
+    fmt = (body or {}).get('format') or query_format
+    if fmt in FORMATS:
+        return fmt
+    if MSGPACK_MIMETYPE in (accept or ''):
+        return 'msgpack'
+    return 'json'
+
+
+def requested_format(request):
+    body = request.get_json(silent=True) if request.is_json else None
+    return format_from(body, request.args.get('format'), request.headers.get('Accept', ''))
+
+
+def is_columnar(fmt):
+    return fmt in ('columnar', 'msgpack')
+
+
+def rows_payload(columns, rows, columnar, key='output'):
+    """Rows under key as a list of dicts, or as {"columns", "rows"} when columnar"""
+    if columnar:
+        return {"columns": list(columns), "rows": [list(row) for row in rows]}
+    return {key: [dict(zip(columns, row)) for row in rows]}
+
+
+def _msgpack_default(value):
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (decimal.Decimal, datetime.timedelta)):
+        return str(value)
+    if isinstance(value, set):
+        return list(value)
+    raise TypeError(f"Cannot pack {type(value).__name__}")
+
+
+def make_response(app, payload, status=200, fmt='json'):
+    """Encode a payload as MessagePack when asked for and available, JSON otherwise"""
+    with span('serialize'):
+        if fmt == 'msgpack' and msgpack is not None:
+            body = msgpack.packb(payload, default=_msgpack_default, use_bin_type=True)
+            return Response(body, status=status, mimetype=MSGPACK_MIMETYPE)
+        response = app.json.response(payload)
+        response.status_code = status
+        return response
+
+
+def compress_response(accept_encoding, response):
+    """Compress a buffered response body if the Accept-Encoding header allows it"""
+    if (response.is_streamed or response.direct_passthrough or response.status_code < 200
+            or 'Content-Encoding' in response.headers):
+        return response
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_BYTES:
+        return response
+
+    accepted = parse_accept_header(accept_encoding or '')
+    if brotli is not None and accepted['br']:
+        response.set_data(brotli.compress(body, quality=min(COMPRESS_LEVEL, 11)))
+        response.headers['Content-Encoding'] = 'br'
+    elif accepted['gzip']:
+        response.set_data(gzip.compress(body, compresslevel=min(COMPRESS_LEVEL, 9)))
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        return response
+    response.vary.add('Accept-Encoding')
+    return response